@@ -0,0 +1,20 @@
+# ASGI entry point (optional), alongside the WSGI one in index.py
+# Serve with an ASGI server from the project root, e.g.:
+#   uvicorn api.asgi:app --port 5000
+
+import sys
+import os
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_path = os.path.join(project_root, 'src')
+sys.path.insert(0, src_path)
+
+# Change working directory to src so templates/static are found
+os.chdir(src_path)
+
+# Import the ASGI application (native async API routes, Flask for the rest)
+from asgi import application
+
+app = application
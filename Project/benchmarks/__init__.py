@@ -0,0 +1,8 @@
+"""
+Benchmark suite for Snowmark.
+
+The tests/ suite checks correctness; this package measures how the hot paths
+scale with the size of a user's gradebook. By default everything runs against
+the local SQLite backend (db_local.py) on a scratch database file, so no MySQL
+access is needed. See benchmarks/README.md for usage.
+"""
@@ -0,0 +1,120 @@
+"""
+Synthetic gradebook generator.
+
+Creates a user with a configurable number of subjects, categories and
+assessments, writing straight to the database with bulk inserts so that even
+50,000-row gradebooks are created in a couple of seconds.
+"""
+
+import random
+
+from crud import create_user, user_exists, _connect, TABLE_NAME, CATEGORIES_TABLE, SUBJECTS_TABLE
+
+BENCH_PASSWORD = "bench-password"
+
+
+def subject_names(count):
+    """Deterministic subject names: 'Subject 01', 'Subject 02', ..."""
+    return [f"Subject {i + 1:02d}" for i in range(count)]
+
+
+def category_names(count):
+    """Deterministic category names: 'Category 1', 'Category 2', ..."""
+    return [f"Category {i + 1}" for i in range(count)]
+
+
+def generate_gradebook(username, rows, subjects=5, categories=4, graded_fraction=0.8,
+                       prediction_fraction=0.05, seed=0):
+    """
+    Create `username` (if missing) and fill their gradebook with `rows` assessments
+    spread round-robin over `subjects` x `categories`.
+
+    Roughly `graded_fraction` of the rows get a grade, `prediction_fraction` are
+    prediction rows and the rest are ungraded. Weights are split evenly per
+    category exactly like recalculate_and_update_weights() would.
+
+    Returns a summary dict describing what was generated.
+    """
+    rng = random.Random(seed)
+
+    if not user_exists(username):
+        create_user(username, BENCH_PASSWORD)
+
+    subjects_list = subject_names(subjects)
+    categories_list = category_names(categories)
+    # Each subject's category weights add up to 100
+    total_weight = 100 / categories
+
+    # Assign rows to (subject, category) pairs round-robin
+    pairs = [(s, c) for s in subjects_list for c in categories_list]
+    counts = {pair: 0 for pair in pairs}
+    assignments = []
+    for i in range(rows):
+        pair = pairs[i % len(pairs)]
+        counts[pair] += 1
+        assignments.append(pair)
+
+    grade_rows = []
+    for position, (subject, category) in enumerate(assignments):
+        study_time = round(rng.uniform(0.5, 6.0), 2)
+        roll = rng.random()
+        is_prediction = roll < prediction_fraction
+        if is_prediction or roll < prediction_fraction + graded_fraction:
+            grade = round(rng.uniform(50, 100), 1)
+        else:
+            grade = None
+        predicted_grade = grade if is_prediction else None
+        weight = total_weight / counts[(subject, category)]
+        grade_rows.append((
+            username, subject, category, study_time, f"{category} {position + 1}",
+            grade, weight, is_prediction, predicted_grade, position,
+        ))
+
+    conn = _connect()
+    try:
+        cur = conn.cursor()
+        cur.executemany(
+            f"INSERT INTO {SUBJECTS_TABLE} (username, name) VALUES (%s, %s)",
+            [(username, s) for s in subjects_list]
+        )
+        cur.executemany(
+            f"""INSERT INTO {CATEGORIES_TABLE} (username, Subject, CategoryName, TotalWeight, DefaultName)
+                VALUES (%s, %s, %s, %s, %s)""",
+            [(username, s, c, total_weight, f"{c} #") for s in subjects_list for c in categories_list]
+        )
+        if grade_rows:
+            cur.executemany(
+                f"""INSERT INTO {TABLE_NAME}
+                    (username, Subject, Category, StudyTime, AssignmentName, Grade, Weight,
+                     IsPrediction, PredictedGrade, Position)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                grade_rows
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    return {
+        'username': username,
+        'rows': rows,
+        'subjects': subjects,
+        'categories': categories,
+        'subject_names': subjects_list,
+        'category_names': categories_list,
+    }
+
+
+def grade_ids(username):
+    """Return the user's grade ids in display order."""
+    conn = _connect()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SELECT id FROM {TABLE_NAME} WHERE username = %s ORDER BY Position ASC, id ASC", (username,))
+        return [row[0] for row in cur.fetchall()]
+    finally:
+        cur.close()
+        conn.close()
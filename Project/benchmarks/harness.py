@@ -0,0 +1,154 @@
+"""
+Timing and query-counting helpers shared by the benchmark scripts.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(PROJECT_DIR, 'src')
+
+
+def setup_environment(db_file, backend='sqlite'):
+    """
+    Select the storage backend (and SQLite file) to benchmark. Must run before
+    crud/app are imported, because the backend is chosen at import time.
+    """
+    if backend == 'sqlite' and db_file == ':memory:':
+        backend = 'memory'
+    os.environ['DB_BACKEND'] = backend
+    if db_file:
+        os.environ['LOCAL_DB_FILE'] = db_file
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+
+
+class QueryCounter:
+    """
+    Counts statements sent to the active storage backend while active.
+
+    SQLite: every execute/executemany on the db_local cursor wrapper.
+    MySQL: every PyMySQL Cursor.execute (executemany batches through execute,
+    so this counts round trips).
+
+    Usage:
+        with QueryCounter() as qc:
+            do_work()
+        print(qc.count)
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._originals = []
+        self._lock = threading.Lock()  # page renders may query from several threads
+
+    def _targets(self):
+        from crud import storage
+        if storage.name == 'mysql':
+            import pymysql.cursors
+            return [(pymysql.cursors.Cursor, 'execute')]
+        import db_local
+        return [(db_local.SQLiteCursor, 'execute'), (db_local.SQLiteCursor, 'executemany')]
+
+    def __enter__(self):
+        counter = self
+        for cls, name in self._targets():
+            original = getattr(cls, name)
+            self._originals.append((cls, name, original))
+
+            def counted(cursor, *args, _original=original, **kwargs):
+                with counter._lock:
+                    counter.count += 1
+                return _original(cursor, *args, **kwargs)
+
+            setattr(cls, name, counted)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for cls, name, original in reversed(self._originals):
+            setattr(cls, name, original)
+        self._originals = []
+        return False
+
+
+def add_query_latency(latency_ms):
+    """
+    Make every SQLite statement sleep `latency_ms` first, to approximate the
+    network round trip of a remote MySQL server. The sleep releases the GIL,
+    so concurrent queries overlap the way they would against a real server.
+    """
+    import db_local
+    delay = latency_ms / 1000
+    for name in ('execute', 'executemany'):
+        original = getattr(db_local.SQLiteCursor, name)
+
+        def delayed(cursor, *args, _original=original, **kwargs):
+            time.sleep(delay)
+            return _original(cursor, *args, **kwargs)
+
+        setattr(db_local.SQLiteCursor, name, delayed)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize_latencies(samples_ms):
+    """Reduce a list of latencies (ms) to the stats stored in the results file."""
+    ordered = sorted(samples_ms)
+    return {
+        'min': round(ordered[0], 3),
+        'median': round(percentile(ordered, 50), 3),
+        'mean': round(sum(ordered) / len(ordered), 3),
+        'p95': round(percentile(ordered, 95), 3),
+        'max': round(ordered[-1], 3),
+    }
+
+
+def measure(fn, repeat=5, setup=None, warmup=1):
+    """
+    Time `fn` `repeat` times and count the queries it issues.
+
+    If `setup` is given it is called (untimed, uncounted) before every run and
+    its return value is passed to `fn`.
+    """
+    for _ in range(warmup):
+        fn(setup() if setup else None)
+
+    latencies = []
+    query_counts = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        with QueryCounter() as qc:
+            start = time.perf_counter()
+            fn(arg)
+            elapsed = time.perf_counter() - start
+        latencies.append(elapsed * 1000)
+        query_counts.append(qc.count)
+
+    query_counts.sort()
+    return {
+        'latency_ms': summarize_latencies(latencies),
+        'queries': query_counts[len(query_counts) // 2],
+        'repeat': repeat,
+    }
+
+
+def git_commit():
+    """Short hash of the checked-out commit, or 'unknown' outside a git checkout."""
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        )
+        return result.stdout.strip()
+    except Exception:
+        return 'unknown'
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Load-test harness that replays realistic user sessions against the app.
+
+Virtual users log in and then loop over a weighted mix of actions (browse a
+subject, open the dashboard, add and edit assessments, run predictions,
+reorder rows) for a fixed duration. Latency percentiles and requests per second
+are reported per route for each worker count.
+
+Two modes:
+    client    - in-process, one Flask test client per virtual user thread
+    gunicorn  - starts `gunicorn app:app --workers N` on a scratch SQLite file
+                and drives it over HTTP (requires gunicorn to be installed)
+
+Examples (from the Project/ directory):
+    python3 -m benchmarks.loadtest --workers 1 2 4 --duration 10
+    python3 -m benchmarks.loadtest --mode gunicorn --workers 1 2 4 8 --users 16
+"""
+
+import argparse
+import contextlib
+import http.cookiejar
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmarks.harness import setup_environment, percentile, git_commit, SRC_DIR
+
+# Relative frequency of each action in a session (roughly what the frontend
+# sends during a study session: mostly browsing and predictions, fewer writes)
+SESSION_MIX = [
+    ('browse_subject', 35),
+    ('dashboard', 10),
+    ('predict', 20),
+    ('predict_subject', 5),
+    ('update', 15),
+    ('add', 10),
+    ('reorder', 5),
+]
+
+ROUTE_PATTERNS = [
+    (re.compile(r'^/update/\d+'), '/update/<id>'),
+    (re.compile(r'^/subject/.*'), '/subject/<name>'),
+    (re.compile(r'^/delete_multiple.*'), '/delete_multiple'),
+]
+
+
+def route_name(path):
+    """Collapse ids and names in a path so results group per route."""
+    for pattern, name in ROUTE_PATTERNS:
+        if pattern.match(path):
+            return name
+    return path.split('?', 1)[0]
+
+
+class Recorder:
+    """Thread-safe collection of (route, latency, ok) samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, path, elapsed_ms, ok):
+        route = route_name(path)
+        with self._lock:
+            self.samples.setdefault(route, []).append(elapsed_ms)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+class TestClientSession:
+    """Virtual-user transport backed by the Flask test client."""
+
+    def __init__(self, app, recorder):
+        self.client = app.test_client()
+        self.recorder = recorder
+
+    def request(self, method, path, data=None, json_body=None):
+        start = time.perf_counter()
+        try:
+            response = self.client.open(path, method=method, data=data, json=json_body)
+            status = response.status_code
+            body = response.get_json(silent=True)
+        except Exception:
+            status, body = 599, None
+        self.recorder.record(path, (time.perf_counter() - start) * 1000, status < 400)
+        return status, body
+
+
+class HttpSession:
+    """Virtual-user transport over real HTTP with a cookie jar."""
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, method, path, data=None, json_body=None):
+        headers = {}
+        payload = None
+        if json_body is not None:
+            payload = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            payload = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        req = urllib.request.Request(self.base_url + urllib.parse.quote(path, safe='/?=&'),
+                                     data=payload, headers=headers, method=method)
+        start = time.perf_counter()
+        body = None
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                status = response.status
+                raw = response.read()
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        except Exception:
+            status, raw = 599, b''
+        self.recorder.record(path, (time.perf_counter() - start) * 1000, status < 400)
+        if raw[:1] in (b'{', b'['):
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                body = None
+        return status, body
+
+
+class VirtualUser:
+    """Replays one user's session: log in, then weighted random actions until the deadline."""
+
+    def __init__(self, session, book, ids, seed):
+        self.session = session
+        self.book = book
+        self.ids = list(ids)
+        self.rng = random.Random(seed)
+        self.actions = [name for name, _ in SESSION_MIX]
+        self.weights = [weight for _, weight in SESSION_MIX]
+
+    def login(self):
+        from benchmarks.generator import BENCH_PASSWORD
+        self.session.request('POST', '/login', data={'username': self.book['username'], 'password': BENCH_PASSWORD})
+
+    def run(self, login_recorder, barrier, window):
+        """Log in (recorded separately), wait for every user, then loop until the window closes."""
+        recorder = self.session.recorder
+        self.session.recorder = login_recorder
+        self.login()
+        self.session.recorder = recorder
+        barrier.wait()
+        while time.perf_counter() < window['deadline']:
+            action = self.rng.choices(self.actions, self.weights)[0]
+            getattr(self, action)()
+
+    def _subject(self):
+        return self.rng.choice(self.book['subject_names'])
+
+    def _category(self):
+        return self.rng.choice(self.book['category_names'])
+
+    def browse_subject(self):
+        self.session.request('GET', f'/subject/{self._subject()}')
+
+    def dashboard(self):
+        self.session.request('GET', '/home')
+
+    def predict(self):
+        self.session.request('POST', '/predict', data={
+            'subject': self._subject(), 'category': self._category(),
+            'weight': str(self.rng.choice([2, 5, 10, 25])), 'hours': str(self.rng.randint(1, 8)),
+        })
+
+    def predict_subject(self):
+        self.session.request('POST', '/predict_subject', data={
+            'subject': self._subject(), 'study_time': str(self.rng.randint(5, 40)),
+        })
+
+    def add(self):
+        subject = self._subject()
+        _, body = self.session.request('POST', '/add', data={
+            'subject': subject, 'category': self._category(), 'assignment_name': 'Load test',
+            'study_time': str(self.rng.randint(1, 6)), 'grade': str(self.rng.randint(55, 100)),
+            'current_filter': subject,
+        })
+        if body and body.get('log', {}).get('id'):
+            self.ids.append(body['log']['id'])
+
+    def update(self):
+        if not self.ids:
+            return
+        subject = self._subject()
+        self.session.request('POST', f'/update/{self.rng.choice(self.ids)}', data={
+            'subject': subject, 'category': self._category(), 'assignment_name': 'Load test edit',
+            'study_time': str(self.rng.randint(1, 6)), 'grade': str(self.rng.randint(55, 100)),
+            'current_filter': subject,
+        })
+
+    def reorder(self):
+        if len(self.ids) < 2:
+            return
+        order = list(self.ids)
+        self.rng.shuffle(order)
+        self.session.request('POST', '/api/assignments/reorder', json_body={'order': order})
+
+
+def summarize(recorder, wall_seconds):
+    """Per-route count, errors, p50/p95/p99 latency and requests/second."""
+    routes = {}
+    for route, samples in sorted(recorder.samples.items()):
+        ordered = sorted(samples)
+        routes[route] = {
+            'requests': len(ordered),
+            'errors': recorder.errors.get(route, 0),
+            'rps': round(len(ordered) / wall_seconds, 2),
+            'p50_ms': round(percentile(ordered, 50), 2),
+            'p95_ms': round(percentile(ordered, 95), 2),
+            'p99_ms': round(percentile(ordered, 99), 2),
+        }
+    total = sum(len(s) for s in recorder.samples.values())
+    return {
+        'requests': total,
+        'errors': sum(recorder.errors.values()),
+        'rps': round(total / wall_seconds, 2),
+        'routes': routes,
+    }
+
+
+def drive(make_session, books, ids_by_user, users, duration, seed):
+    """
+    Run `users` virtual users concurrently for `duration` seconds.
+
+    Logins happen before the measured window (password hashing would otherwise
+    dominate short runs) and are reported separately under 'login'.
+    """
+    recorder = Recorder()
+    login_recorder = Recorder()
+    window = {}
+
+    def open_window():
+        window['start'] = time.perf_counter()
+        window['deadline'] = window['start'] + duration
+
+    barrier = threading.Barrier(users, action=open_window)
+    threads = []
+    for i in range(users):
+        book = books[i % len(books)]
+        vu = VirtualUser(make_session(recorder), book, ids_by_user[book['username']], seed + i)
+        t = threading.Thread(target=vu.run, args=(login_recorder, barrier, window), daemon=True)
+        threads.append(t)
+        t.start()
+    for t in threads:
+        t.join()
+
+    result = summarize(recorder, time.perf_counter() - window['start'])
+    logins = sorted(login_recorder.samples.get('/login', []))
+    result['login'] = {
+        'requests': len(logins),
+        'errors': login_recorder.errors.get('/login', 0),
+        'p50_ms': round(percentile(logins, 50), 2) if logins else None,
+        'p99_ms': round(percentile(logins, 99), 2) if logins else None,
+    }
+    return result
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def gunicorn_server(workers, worker_class, threads):
+    """Start gunicorn on the scratch database and yield its base URL."""
+    executable = shutil.which('gunicorn')
+    if not executable:
+        raise SystemExit("gunicorn is not installed; use --mode client or `pip install gunicorn`.")
+    port = _free_port()
+    cmd = [executable, 'app:app', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+           '--worker-class', worker_class, '--threads', str(threads), '--log-level', 'warning']
+    proc = subprocess.Popen(cmd, cwd=SRC_DIR, env=dict(os.environ),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base_url + '/login', timeout=1).read()
+                break
+            except Exception:
+                if proc.poll() is not None:
+                    raise SystemExit("gunicorn exited during startup.")
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def print_report(report):
+    for run in report['runs']:
+        print(f"\nworkers={run['workers']} users={run['users']}  "
+              f"total {run['requests']} req, {run['rps']} req/s, {run['errors']} errors "
+              f"(login p50 {run['login']['p50_ms']} ms)")
+        header = f"  {'route':28} {'req':>6} {'err':>4} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        print(header)
+        print('  ' + '-' * (len(header) - 2))
+        for route, r in run['routes'].items():
+            print(f"  {route:28} {r['requests']:>6} {r['errors']:>4} {r['rps']:>8.2f} "
+                  f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay concurrent user sessions against Snowmark.")
+    parser.add_argument('--mode', choices=['client', 'gunicorn'], default='client')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help="Worker counts to test (gunicorn workers, or concurrent threads in client mode).")
+    parser.add_argument('--users', type=int,
+                        help="Concurrent virtual users per run (default: 2 x workers).")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per worker count.")
+    parser.add_argument('--rows', type=int, default=200, help="Assessments per generated user.")
+    parser.add_argument('--subjects', type=int, default=5)
+    parser.add_argument('--categories', type=int, default=4)
+    parser.add_argument('--worker-class', default='sync', help="gunicorn worker class (gunicorn mode).")
+    parser.add_argument('--threads', type=int, default=1, help="gunicorn threads per worker (gunicorn mode).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Optional JSON file for the report.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tmp_dir = tempfile.TemporaryDirectory(prefix='snowmark-load-')
+    setup_environment(os.path.join(tmp_dir.name, 'load.db'))
+
+    import app as app_module
+    from benchmarks.generator import generate_gradebook, grade_ids
+
+    max_users = max(args.users or 2 * w for w in args.workers)
+    runs = []
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            app_module._ensure_schema()
+            books = [
+                generate_gradebook(f"load_user_{i}", args.rows, subjects=args.subjects,
+                                   categories=args.categories, seed=args.seed + i)
+                for i in range(max_users)
+            ]
+            ids_by_user = {book['username']: grade_ids(book['username']) for book in books}
+
+            for workers in args.workers:
+                users = args.users or 2 * workers
+                if args.mode == 'gunicorn':
+                    with gunicorn_server(workers, args.worker_class, args.threads) as base_url:
+                        result = drive(lambda rec: HttpSession(base_url, rec), books, ids_by_user,
+                                       users, args.duration, args.seed)
+                else:
+                    app_module.app.config['TESTING'] = True
+                    result = drive(lambda rec: TestClientSession(app_module.app, rec), books, ids_by_user,
+                                   users, args.duration, args.seed)
+                runs.append({'workers': workers, 'users': users, **result})
+                print(f"workers={workers} done", file=sys.stderr)
+    finally:
+        tmp_dir.cleanup()
+
+    report = {
+        'meta': {'commit': git_commit(), 'mode': args.mode, 'duration_s': args.duration,
+                 'rows_per_user': args.rows, 'mix': dict(SESSION_MIX)},
+        'runs': runs,
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Compare the memory and build time of grade rows as dicts vs GradeRecord.
+
+"dict" is the previous row path (DictCursor row -> lowercase-keyed dict per
+row); "record" is the current one (tuple cursor row -> GradeRecord). Both run
+the same SELECT against a generated gradebook. Memory is measured with
+tracemalloc: `retained` is what the finished list keeps alive, `peak` also
+counts the cursor's intermediate rows.
+
+Examples (from the Project/ directory):
+    python3 -m benchmarks.records
+    python3 -m benchmarks.records --rows 1000 10000 50000 --repeat 20
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import tracemalloc
+
+from benchmarks.harness import setup_environment, measure, git_commit, BENCH_DIR
+
+DEFAULT_ROWS = [1000, 10000]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark grade row representations.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="Gradebook sizes (assessments per user).")
+    parser.add_argument('--repeat', type=int, default=10, help="Timed runs per representation.")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/records-<commit>.json).")
+    return parser.parse_args(argv)
+
+
+def _dict_from_row(row):
+    return {
+        'id': row['id'],
+        'subject': row['Subject'],
+        'category': row['Category'],
+        'study_time': row['StudyTime'],
+        'assignment_name': row['AssignmentName'],
+        'grade': row['Grade'],
+        'weight': row['Weight'],
+        'is_prediction': bool(row['IsPrediction']),
+        'predicted_grade': row['PredictedGrade'],
+        'position': row['Position'],
+    }
+
+
+def fetch_dicts(username):
+    import crud
+    conn = crud._connect()
+    try:
+        curs = crud._get_dict_cursor(conn)
+        curs.execute(f"SELECT {crud.GRADE_COLUMNS} FROM {crud.TABLE_NAME} WHERE username = %s "
+                     "ORDER BY Position, id", (username,))
+        return [_dict_from_row(row) for row in curs.fetchall()]
+    finally:
+        curs.close()
+        conn.close()
+
+
+def fetch_records(username):
+    import crud
+    return crud.get_grades(username)
+
+
+def measure_memory(fetch, username):
+    """(retained, peak) bytes allocated by one fetch."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        rows = fetch(username)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del rows
+    return retained, peak
+
+
+def run(args):
+    from benchmarks.generator import generate_gradebook
+    import crud
+
+    crud.init_db()
+    results = []
+    for rows in args.rows:
+        username = f"bench_records_{rows}"
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            generate_gradebook(username, rows)
+        for name, fetch in [('dict', fetch_dicts), ('record', fetch_records)]:
+            retained, peak = measure_memory(fetch, username)
+            measurement = measure(lambda _, f=fetch: f(username), repeat=args.repeat)
+            results.append({
+                'representation': name,
+                'rows': rows,
+                'retained_bytes': retained,
+                'peak_bytes': peak,
+                'latency_ms': measurement['latency_ms'],
+            })
+    return {'meta': {'commit': git_commit()}, 'results': results}
+
+
+def print_table(report):
+    header = f"{'rows':>7} {'repr':7} {'retained KB':>12} {'peak KB':>9} {'median ms':>10} {'p95 ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in report['results']:
+        print(f"{r['rows']:>7} {r['representation']:7} {r['retained_bytes'] / 1024:>12.0f} "
+              f"{r['peak_bytes'] / 1024:>9.0f} {r['latency_ms']['median']:>10.2f} {r['latency_ms']['p95']:>9.2f}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_environment(':memory:')
+    report = run(args)
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"records-{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_table(report)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Run the Snowmark benchmark suite and store the results as JSON.
+
+Examples (from the Project/ directory):
+    python3 -m benchmarks.run
+    python3 -m benchmarks.run --rows 10 1000 50000 --subjects 20 --repeat 10
+    python3 -m benchmarks.run --rows 10000 --subjects 1 10 50 --only render_subject_view
+    python3 -m benchmarks.run --compare benchmarks/results/abc1234.json
+    python3 -m benchmarks.run --rows 1000 --db-latency 2 --parallel-fetch on --only render_subject_view
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+
+from benchmarks.harness import setup_environment, add_query_latency, measure, git_commit, BENCH_DIR
+
+DEFAULT_ROWS = [10, 100, 1000, 10000]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Snowmark hot paths against a storage backend.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="Gradebook sizes (assessments per user) to benchmark.")
+    parser.add_argument('--subjects', type=int, nargs='+', default=[5],
+                        help="Subjects per user (several values sweep the subject count).")
+    parser.add_argument('--categories', type=int, default=4, help="Categories per subject.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per scenario.")
+    parser.add_argument('--only', nargs='+', help="Only run scenarios with these names.")
+    parser.add_argument('--db-file', help="SQLite file to use (default: a fresh temp file).")
+    parser.add_argument('--backend', choices=['sqlite', 'memory', 'mysql'], default='sqlite',
+                        help="Storage backend to benchmark (mysql uses the server in src/.env).")
+    parser.add_argument('--memory', action='store_true',
+                        help="Shorthand for --backend memory.")
+    parser.add_argument('--db-latency', type=float, default=0,
+                        help="Milliseconds added to every SQLite statement to simulate a remote server.")
+    parser.add_argument('--parallel-fetch', choices=['on', 'off', 'auto'],
+                        help="Override PARALLEL_FETCH (concurrent page queries, see src/parallel.py).")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/<commit>.json).")
+    parser.add_argument('--compare', help="Previous results file to compare against.")
+    return parser.parse_args(argv)
+
+
+def run(args):
+    """Generate one gradebook per size, run every scenario on it and return the results dict."""
+    # Imported here: the backend must be configured before crud/app load
+    import app as app_module
+    import parallel
+    from benchmarks.generator import generate_gradebook
+    from benchmarks.scenarios import build_scenarios, login
+
+    app_module.app.config['TESTING'] = True
+    parallel_fetch = 'on' if parallel.ENABLED else 'off'
+    results = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        app_module._ensure_schema()
+        for rows, subjects in [(r, n) for r in args.rows for n in args.subjects]:
+            username = f"bench_{rows}_{subjects}x{args.categories}"
+            book = generate_gradebook(username, rows, subjects=subjects, categories=args.categories)
+            if args.db_latency and not results:
+                # After the (latency-free) data generation
+                add_query_latency(args.db_latency)
+            client = app_module.app.test_client()
+            login(client, username)
+            for name, fn, setup in build_scenarios(app_module, client, book):
+                if args.only and name not in args.only:
+                    continue
+                measurement = measure(fn, repeat=args.repeat, setup=setup)
+                results.append({
+                    'scenario': name,
+                    'rows': rows,
+                    'subjects': subjects,
+                    'categories': args.categories,
+                    **measurement,
+                })
+                print(f"{name} rows={rows} subjects={subjects} done", file=sys.stderr)
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'backend': args.backend,
+            'db_latency_ms': args.db_latency,
+            'parallel_fetch': parallel_fetch,
+        },
+        'results': results,
+    }
+
+
+def _key(result):
+    return (result['scenario'], result['rows'], result['subjects'], result['categories'])
+
+
+def print_table(report, baseline=None):
+    """Print median latency and query counts, with the baseline alongside when given."""
+    previous = {_key(r): r for r in (baseline or {}).get('results', [])}
+    header = f"{'scenario':28} {'rows':>7} {'subj':>5} {'median ms':>10} {'p95 ms':>9} {'queries':>8}"
+    if baseline:
+        header += f" {'base ms':>9} {'ratio':>6} {'base q':>7}"
+    print(header)
+    print('-' * len(header))
+    for result in report['results']:
+        line = (f"{result['scenario']:28} {result['rows']:>7} {result['subjects']:>5} "
+                f"{result['latency_ms']['median']:>10.2f} "
+                f"{result['latency_ms']['p95']:>9.2f} {result['queries']:>8}")
+        old = previous.get(_key(result))
+        if old:
+            ratio = result['latency_ms']['median'] / old['latency_ms']['median'] if old['latency_ms']['median'] else 0
+            line += f" {old['latency_ms']['median']:>9.2f} {ratio:>6.2f} {old['queries']:>7}"
+        print(line)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.memory:
+        args.backend = 'memory'
+
+    tmp_dir = None
+    db_file = ':memory:' if args.backend == 'memory' else args.db_file
+    if not db_file and args.backend == 'sqlite':
+        tmp_dir = tempfile.TemporaryDirectory(prefix='snowmark-bench-')
+        db_file = os.path.join(tmp_dir.name, 'bench.db')
+    setup_environment(db_file, args.backend)
+    if args.parallel_fetch:
+        os.environ['PARALLEL_FETCH'] = args.parallel_fetch
+
+    try:
+        report = run(args)
+    finally:
+        if tmp_dir:
+            tmp_dir.cleanup()
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark scenarios for the hot paths of the app.
+
+Each scenario is a (name, fn, setup) triple consumed by harness.measure().
+Route scenarios go through the Flask test client as a logged-in user, so they
+include the cost of load_user, the context processor and JSON serialization.
+"""
+
+from benchmarks.generator import BENCH_PASSWORD, grade_ids
+
+
+def login(client, username):
+    """Log the test client in as `username`."""
+    response = client.post('/login', data={'username': username, 'password': BENCH_PASSWORD})
+    if response.status_code not in (200, 302):
+        raise RuntimeError(f"Login failed for {username}: {response.status_code}")
+
+
+def _check(response, name):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{name} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def build_scenarios(app_module, client, book):
+    """Return the scenario list for one generated gradebook."""
+    from crud import add_grade
+
+    username = book['username']
+    subject = book['subject_names'][0]
+    category = book['category_names'][0]
+
+    ids = grade_ids(username)
+    # A row we can update repeatedly without changing the gradebook's shape
+    update_id = ids[0] if ids else None
+
+    def subject_view(_):
+        # render_subject_view() for a single subject (plus load_user + context processor)
+        _check(client.get(f'/subject/{subject}'), 'subject view')
+
+    def dashboard_view(_):
+        # render_subject_view('all') - the dashboard
+        _check(client.get('/home'), 'dashboard')
+
+    def stats(_):
+        app_module.calculate_stats(username)
+
+    def predict(_):
+        _check(client.post('/predict', data={
+            'subject': subject, 'category': category, 'weight': '5', 'hours': '3',
+        }), '/predict')
+
+    def predict_subject(_):
+        _check(client.post('/predict_subject', data={
+            'subject': subject, 'study_time': '10',
+        }), '/predict_subject')
+
+    def add(_):
+        _check(client.post('/add', data={
+            'subject': subject, 'category': category, 'assignment_name': 'Bench add',
+            'study_time': '2', 'grade': '80', 'current_filter': subject,
+        }), '/add')
+
+    def update(_):
+        _check(client.post(f'/update/{update_id}', data={
+            'subject': subject, 'category': category, 'assignment_name': 'Bench update',
+            'study_time': '2.5', 'grade': '85', 'current_filter': subject,
+        }), '/update')
+
+    def delete_setup():
+        return [add_grade(username, subject, category, 1.0, 'Bench delete', 70, 1) for _ in range(5)]
+
+    def delete_multiple(ids_to_delete):
+        _check(client.post(f'/delete_multiple?current_filter={subject}', json={'ids': ids_to_delete}),
+               '/delete_multiple')
+
+    def grades_page(_):
+        _check(client.get(f'/api/grades?subject={subject}'), '/api/grades')
+
+    def grades_last_page_setup():
+        # Cursor for the final page of the whole gradebook
+        from crud import get_grades_page
+        _page, after = get_grades_page(username, max(len(ids) - 50, 1))
+        return app_module._encode_cursor(after) if after else ''
+
+    def grades_last_page(cursor):
+        _check(client.get(f'/api/grades?cursor={cursor}'), '/api/grades[last]')
+
+    reorder_state = {'reverse': False}
+
+    def reorder_setup():
+        order = grade_ids(username)
+        reorder_state['reverse'] = not reorder_state['reverse']
+        return order[::-1] if reorder_state['reverse'] else order
+
+    def reorder(order):
+        _check(client.post('/api/assignments/reorder', json={'order': order}), '/api/assignments/reorder')
+
+    scenarios = [
+        ('render_subject_view', subject_view, None),
+        ('render_subject_view[all]', dashboard_view, None),
+        ('calculate_stats', stats, None),
+        ('/predict', predict, None),
+        ('/predict_subject', predict_subject, None),
+        ('/api/grades', grades_page, None),
+        ('/api/grades[last]', grades_last_page, grades_last_page_setup),
+        ('/add', add, None),
+        ('/delete_multiple', delete_multiple, delete_setup),
+        ('/api/assignments/reorder', reorder, reorder_setup),
+    ]
+    if update_id is not None:
+        scenarios.insert(8, ('/update', update, None))
+    return scenarios
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Compare JSON serialization of gradebook-sized payloads.
+
+Builds the payload a mutation route returns ({'updated_assignments': rows,
+...}) from a generated gradebook and times Flask's stdlib provider against
+FastJSONProvider (orjson), for both dumps() and a full jsonify() response.
+
+Examples (from the Project/ directory):
+    python3 -m benchmarks.serialization
+    python3 -m benchmarks.serialization --rows 1000 10000 50000 --repeat 20
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+from benchmarks.harness import setup_environment, measure, git_commit, BENCH_DIR
+
+DEFAULT_ROWS = [1000, 10000]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization of gradebook payloads.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="Gradebook sizes (assessments per user).")
+    parser.add_argument('--repeat', type=int, default=10, help="Timed runs per serializer.")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/serialization-<commit>.json).")
+    return parser.parse_args(argv)
+
+
+def build_payload(rows):
+    """Mutation-route response body for a generated gradebook of `rows` assessments."""
+    from benchmarks.generator import generate_gradebook
+    from crud import get_all_grades
+
+    username = f"bench_json_{rows}"
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        generate_gradebook(username, rows)
+    # Plain dicts, so Flask's own provider can serialize the rows too
+    return {
+        'status': 'success',
+        'message': 'Assessment updated!',
+        'summary': {'total_hours': 120.5, 'average_grade': 81.2, 'total_weight': 64.0},
+        'updated_assignments': [row.to_json() for row in get_all_grades(username)],
+    }
+
+
+def run(args):
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    from json_provider import FastJSONProvider
+    import crud
+
+    crud.init_db()
+    app = Flask(__name__)
+    providers = [('stdlib', DefaultJSONProvider(app))]
+    fast = FastJSONProvider(app)
+    if fast.use_orjson:
+        providers.append(('orjson', fast))
+    else:
+        print("orjson is not installed; only the stdlib provider is measured", file=sys.stderr)
+
+    results = []
+    for rows in args.rows:
+        payload = build_payload(rows)
+        size = len(providers[0][1].dumps(payload))
+        for name, provider in providers:
+            for operation, fn in [
+                ('dumps', lambda _, p=provider: p.dumps(payload)),
+                ('response', lambda _, p=provider: p.response(payload).get_data()),
+            ]:
+                measurement = measure(fn, repeat=args.repeat)
+                results.append({
+                    'serializer': name,
+                    'operation': operation,
+                    'rows': rows,
+                    'bytes': size,
+                    'latency_ms': measurement['latency_ms'],
+                })
+    return {'meta': {'commit': git_commit()}, 'results': results}
+
+
+def print_table(report):
+    header = f"{'serializer':10} {'operation':9} {'rows':>7} {'KB':>8} {'median ms':>10} {'p95 ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in report['results']:
+        print(f"{r['serializer']:10} {r['operation']:9} {r['rows']:>7} {r['bytes'] / 1024:>8.0f} "
+              f"{r['latency_ms']['median']:>10.2f} {r['latency_ms']['p95']:>9.2f}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_environment(':memory:')
+    report = run(args)
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"serialization-{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_table(report)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
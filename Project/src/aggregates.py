@@ -0,0 +1,65 @@
+# Grade aggregation
+#
+# Per-(subject, category), per-subject and overall totals, built from
+# crud.get_grade_totals() (which does the grouping in SQL). Used by
+# render_subject_view so it doesn't rescan the rows once per subject or
+# category. Totals is also what GradeColumns.totals returns.
+
+
+class Totals:
+    """Running totals for a group of grade rows."""
+    __slots__ = ('count', 'graded_count', 'study_time', 'graded_weight', 'weighted_grade')
+
+    def __init__(self, count=0, graded_count=0, study_time=0.0, graded_weight=0.0, weighted_grade=0.0):
+        self.count = count
+        self.graded_count = graded_count
+        self.study_time = study_time
+        self.graded_weight = graded_weight
+        self.weighted_grade = weighted_grade
+
+    def merge(self, other):
+        self.count += other.count
+        self.graded_count += other.graded_count
+        self.study_time += other.study_time
+        self.graded_weight += other.graded_weight
+        self.weighted_grade += other.weighted_grade
+
+    @property
+    def average_grade(self):
+        """Weight-weighted average of the graded rows, or None without graded weight."""
+        if self.graded_weight > 0:
+            return self.weighted_grade / self.graded_weight
+        return None
+
+
+class GradeAggregate:
+    """
+    Totals by (subject, category), by subject and overall.
+
+    Build with from_totals() (the per-category dict returned by
+    crud.get_grade_totals()); subject and overall totals are rolled up from
+    the category groups.
+    """
+
+    def __init__(self, categories=None):
+        self.categories = categories or {}
+        self.subjects = {}
+        self.overall = Totals()
+        for (subject, _category), totals in self.categories.items():
+            subject_totals = self.subjects.get(subject)
+            if subject_totals is None:
+                subject_totals = self.subjects[subject] = Totals()
+            subject_totals.merge(totals)
+            self.overall.merge(totals)
+
+    @classmethod
+    def from_totals(cls, grade_totals):
+        return cls({key: Totals(**values) for key, values in grade_totals.items()})
+
+    def subject(self, name):
+        """Totals for one subject (empty totals if it has no rows)."""
+        return self.subjects.get(name) or Totals()
+
+    def category(self, subject, name):
+        """Totals for one (subject, category) group (empty totals if it has no rows)."""
+        return self.categories.get((subject, name)) or Totals()
@@ -1,14 +1,17 @@
-from flask import Flask, render_template, request, url_for, jsonify, session, redirect, flash
+from flask import Flask, render_template, request, url_for, jsonify, session, redirect, flash, g
+import base64
+from array import array
 import json
 import math
 import sys
+import threading
 import os
 
 # Get the directory where app.py is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, BASE_DIR)
 
-from collections import Counter, defaultdict
+from collections import Counter
 from dotenv import load_dotenv
 
 # Load .env file if it exists
@@ -18,31 +21,37 @@ if os.path.exists(env_path):
 else:
     load_dotenv()
 
-# Database imports - wrapped in try/except for better error messages
-try:
-    from db import (_connect, SUBJECTS_TABLE, USERS_TABLE, init_db, ensure_position_column, 
-                    ensure_prediction_run_count_column, increment_prediction_run_count, get_prediction_run_count,
-                    ensure_subject_prediction_count_column, increment_subject_prediction_count, get_subject_prediction_counts)
-except Exception as e:
-    print(f"Error importing db module: {e}")
-    raise
-
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
-
-_schema_ready = False
+from json_provider import FastJSONProvider
+from compression import Compressor
+from aggregates import GradeAggregate
+from columns import SortedColumn
+from parallel import fetch_all
+from jobs import get_job, submit as submit_job, runs_in_background as jobs_run_in_background
+from prediction_cache import prediction_cache, prediction_counts
+from storage import backend_name
 
 # Add current directory to path for imports
 
 # Import database functions
 try:
-    from crud import (get_all_grades, get_all_categories, get_categories_as_dict, add_grade, update_grade,
+    from crud import (get_all_grades, get_grades, get_grades_page, GRADE_SORT_KEYS, get_grade_totals,
+                      get_grade_by_id, get_grades_by_ids, get_grade_columns,
+                      get_prediction_targets, set_predicted_grades,
+                      get_all_categories, get_categories_as_dict, add_grade, update_grade,
                       delete_grade, delete_grades_bulk, recalculate_and_update_weights, add_category,
                       update_category, delete_category, get_total_weight_for_subject,
-                      get_all_subjects, add_subject as crud_add_subject, delete_subject as crud_delete_subject,
+                      get_all_subjects, add_subject as crud_add_subject, delete_subject_in_background,
+                      resume_subject_deletes,
                       rename_subject as crud_rename_subject,
                       get_subject_by_name, get_retired_subjects,
-                      get_category_by_id, update_assignment_names_for_category,
-                      create_user, verify_user, user_exists, TABLE_NAME, ensure_schema)
+                      get_category_by_id,
+                      create_user, verify_user, user_exists, init_db,
+                      get_user_by_id, get_user_by_username, get_subject_names, reorder_grades,
+                      retire_subject, unretire_subject, set_subject_term, close_term,
+                      get_prediction_run_count, get_subject_prediction_counts,
+                      get_grade_lock_preferences as crud_get_grade_lock_preferences,
+                      set_grade_lock_preference as crud_set_grade_lock_preference)
 except Exception as e:
     print(f"Error importing crud module: {e}")
     raise
@@ -52,6 +61,19 @@ app = Flask(__name__,
             template_folder=os.path.join(BASE_DIR, 'templates'),
             static_folder=os.path.join(BASE_DIR, 'static'))
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a-very-secret-key')
+# jsonify/tojson go through orjson when installed (see json_provider.py)
+app.json = FastJSONProvider(app)
+# gzip/brotli responses for clients that accept them (see compression.py)
+app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_RESPONSES', 'true').lower() != 'false'
+Compressor(app)
+
+
+# Stored system predictions (PredictedGrade) are refreshed after grade
+# changes on a background job, or inline in the request; serverless hosts
+# (jobs.JOB_MODE) and the in-memory backend (tests) default to inline. See
+# schedule_prediction_refresh.
+PREDICTION_REFRESH = os.environ.get('PREDICTION_REFRESH') or \
+    ('background' if jobs_run_in_background() and backend_name() != 'memory' else 'inline')
 
 
 login_manager = LoginManager()
@@ -59,32 +81,20 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 class User(UserMixin):
-    def __init__(self, user_id: int, username: str):
+    def __init__(self, user_id: int, username: str, data_version: int = 0):
         self.id = str(user_id)
         self.username = username
+        self.data_version = data_version  # as of this request (see prediction_cache.py)
 
 # -------------------------------
 # (4) user loader
 # -------------------------------
 @login_manager.user_loader
 def load_user(user_id: str):
-    conn = _connect()
-    cur = conn.cursor()
-    try:
-        cur.execute(f"SELECT id, username FROM {USERS_TABLE} WHERE id = %s", (int(user_id),))
-        row = cur.fetchone()
-        if not row:
-            return None
-        return User(user_id=row[0], username=row[1])
-    finally:
-        try:
-            cur.close()
-        except:
-            pass
-        try:
-            conn.close()
-        except:
-            pass
+    row = get_user_by_id(user_id)
+    if not row:
+        return None
+    return User(user_id=row['id'], username=row['username'], data_version=row['data_version'])
 
 
 # Database-only architecture - all data comes from database (no in-memory dicts)
@@ -96,39 +106,36 @@ def recalculate_weights(username, subject, category_name):
     except Exception as e:
         print(f"Warning: Failed to recalculate weights in database: {e}")
 
-def calculate_summary(username, subject, include_predictions=False):
+def calculate_summary(username, subject, include_predictions=False, include_archived=False):
     """Calculate summary statistics for a subject (now using database)."""
     if not subject or subject == 'all':
         return None
     
-    study_data = get_all_grades(username)
-    # Filter by subject
-    subject_items = [log for log in study_data if log['subject'] == subject]
-    
-    # Filter predictions if not included
-    if not include_predictions:
-        subject_items = [log for log in subject_items if not log.get('is_prediction', False)]
-        
-    if not subject_items:
+    columns = get_grade_columns(username, subject=subject, include_predictions=include_predictions,
+                                include_archived=include_archived)
+
+    if not len(columns):
         return None
-        
-    graded_items = [log for log in subject_items if log.get('grade') is not None]
-    
-    total_hours = sum(log['study_time'] for log in subject_items)
-    total_weight = sum(log['weight'] for log in graded_items)
-    
-    weighted_grade_sum = sum(log['grade'] * log['weight'] for log in graded_items)
-    average_grade = weighted_grade_sum / total_weight if total_weight > 0 else 0
-    
+
+    totals = columns.totals(columns.rows())
     return {
-        'total_hours': total_hours,
-        'average_grade': average_grade,
-        'total_weight': total_weight
+        'total_hours': totals.study_time,
+        'average_grade': totals.average_grade or 0,
+        'total_weight': totals.graded_weight
     }
 
 
 
-def estimate_k(hours_list, grades_list, weights_list, max_grade=100, debug=False):
+# Prediction settings: a scope (category, subject) gets full weight in the
+# blended k once it has this many graded assessments (see blend_k), and
+# trimmed_k drops this share of the lowest k samples. backtest.py replays
+# users' histories to compare other values.
+SUBJECT_THRESHOLD = 5
+CATEGORY_THRESHOLD = 5
+K_TRIM_FRACTION = 0.2
+
+
+def estimate_k(hours_list, grades_list, weights_list, max_grade=100, debug=False, trim=K_TRIM_FRACTION):
     """
     Estimate learning efficiency from the relationship between study time and grades.
     Higher k = more efficient learner (gets better grades with less time)
@@ -160,12 +167,35 @@ def estimate_k(hours_list, grades_list, weights_list, max_grade=100, debug=False
         except (ValueError, ZeroDivisionError):
             continue
     
+    return trimmed_k(k_values, debug=debug, trim=trim)
+
+
+def estimate_k_columns(columns, rows, max_grade=100, debug=False, trim=K_TRIM_FRACTION):
+    """estimate_k() over rows of a GradeColumns (k samples computed column-wise)."""
+    return trimmed_k(columns.k_values(rows, max_grade), debug=debug, trim=trim)
+
+
+def scope_rows(columns, subject, category=None, by_category=False):
+    """
+    GradeColumns rows for a prediction scope. A missing subject (or category,
+    when by_category) matches nothing, like comparing each row against None.
+    """
+    if subject is None or (by_category and category is None):
+        return []
+    return columns.rows(subject=subject, category=category if by_category else None)
+
+
+def trimmed_k(k_values, debug=False, trim=K_TRIM_FRACTION):
+    """
+    Combine per-assessment k samples into one k (0.3 when there are none),
+    dropping the lowest `trim` share of them (at least one; none if trim is 0).
+    """
     if not k_values:
         return 0.3  # Default moderate efficiency
     
     # Use trimmed mean: remove bottom 10% outliers, then average
     # This allows high performers to pull predictions up while still filtering noise
-    k_values.sort()
+    k_values = sorted(k_values)
     if debug:
         print(f'    All k values (sorted): {[round(k, 4) for k in k_values]}')
     
@@ -175,7 +205,7 @@ def estimate_k(hours_list, grades_list, weights_list, max_grade=100, debug=False
         result = sum(k_values) / n
     else:
         # Remove bottom 20% (low performers might be outliers/bad days)
-        trim_count = max(1, n // 5)
+        trim_count = max(1, int(n * trim + 1e-9)) if trim > 0 else 0
         trimmed = k_values[trim_count:]  # Remove lowest values
         result = sum(trimmed) / len(trimmed)
     
@@ -184,6 +214,42 @@ def estimate_k(hours_list, grades_list, weights_list, max_grade=100, debug=False
     return result
 
 
+def blend_k(k_all, k_subject, k_category, n_subject, n_category,
+            subject_threshold=SUBJECT_THRESHOLD, category_threshold=CATEGORY_THRESHOLD):
+    """
+    Blend the per-scope k estimates by how much data backs them: the
+    category's k into the subject's, then that into the overall k, each
+    weighted by its row count up to the threshold (a scope needs 2+ rows to
+    count). Returns (k, scope), scope being the most specific one used:
+    'category', 'subject' or 'all'.
+    """
+    # Sigmoid-like weighting function (simplified for clear cut-off)
+    # The weight increases linearly up to the threshold, then stays at 1.0
+    
+    # Category Weight (blends Category k with Subject k)
+    # Weight goes from 0 (n_cat=0) to 1.0 (n_cat >= category_threshold)
+    category_weight = min(1.0, n_category / category_threshold)
+    
+    if n_category >= 2:
+        k_blended_subject = (category_weight * k_category) + ((1 - category_weight) * k_subject)
+        scope = 'category'
+    elif n_subject >= 2:
+        k_blended_subject = k_subject
+        scope = 'subject'
+    else:
+        k_blended_subject = k_all
+        scope = 'all'
+
+    # Subject Weight (blends Subject/Category k with All k)
+    # Weight goes from 0 (n_sub=0) to 1.0 (n_sub >= subject_threshold)
+    subject_weight = min(1.0, n_subject / subject_threshold)
+    
+    if n_subject >= 2:
+        return (subject_weight * k_blended_subject) + ((1 - subject_weight) * k_all), scope
+    # Fallback: Only use All k
+    return k_all, scope
+
+
 def predict_grade(hours, weight, k, max_grade=100):
     """
     Predict grade based on study hours using exponential learning curve.
@@ -225,62 +291,145 @@ def calculate_system_prediction(username, subject, category, study_time, weight,
     if study_time is None or study_time <= 0:
         return None
     
-    # Fetch historical data (excluding the current assignment if updating)
-    all_grades = get_all_grades(username)
-    if exclude_id:
-        all_grades = [g for g in all_grades if g['id'] != exclude_id]
-    
-    # Filter to only graded, non-prediction entries
-    graded_data = [log for log in all_grades if log.get('grade') is not None and not log.get('is_prediction', False)]
-    
-    if not graded_data:
-        return None  # No historical data to base prediction on
-    
-    # Get subject and category specific data
-    subject_data = [log for log in graded_data if log['subject'] == subject]
-    category_data = [log for log in subject_data if log['category'] == category]
-    
-    n_all = len(graded_data)
-    n_subject = len(subject_data)
-    n_category = len(category_data)
-    
-    # Estimate k for each scope
-    def get_k(data, max_grade=100):
-        if len(data) < 1:
-            return 0.3
-        hours = [log['study_time'] for log in data]
-        grades = [log['grade'] for log in data]
-        weights = [log['weight'] / 100 for log in data]
-        return estimate_k(hours, grades, weights, max_grade)
-    
-    k_all = get_k(graded_data)
-    k_subject = get_k(subject_data) if n_subject >= 1 else k_all
-    k_category = get_k(category_data) if n_category >= 1 else k_subject
-    
-    # Blend k values based on data availability (same logic as /predict route)
-    SUBJECT_THRESHOLD = 5
-    CATEGORY_THRESHOLD = 5
-    
-    category_weight_factor = min(1.0, n_category / CATEGORY_THRESHOLD)
-    subject_weight_factor = min(1.0, n_subject / SUBJECT_THRESHOLD)
+    # Fetch graded, non-prediction history (excluding the current assignment if updating)
+    columns = get_grade_columns(username, graded_only=True, include_predictions=False,
+                                exclude_id=exclude_id or None)
     
-    if n_category >= 2:
-        k_blended_subject = (category_weight_factor * k_category) + ((1 - category_weight_factor) * k_subject)
-    elif n_subject >= 2:
-        k_blended_subject = k_subject
-    else:
-        k_blended_subject = k_all
-    
-    if n_subject >= 2:
-        k_final = (subject_weight_factor * k_blended_subject) + ((1 - subject_weight_factor) * k_all)
+    return SystemPredictor(columns)(subject, category, study_time, weight)
+
+
+# Similar past assessments attached to predictions
+SIMILAR_EXAMPLES = 3
+
+
+class SystemPredictor:
+    """
+    predict(subject, category, study_time, weight, exclude_id=None) over one
+    graded history (a GradeColumns), as calculate_system_prediction computes
+    it. The blended k of each (subject, category) is estimated once, and its
+    similar-assessment index (ScopeExamples) sorted once on first use, so
+    many assessments can be predicted and given examples from a single
+    fetch; exclude_id leaves one history row out (a graded assessment
+    predicted without its own grade).
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self._blended = {}
+        self._examples = {}
+
+    def _scopes(self, subject, category, exclude_id=None):
+        """Rows of the all / subject / category scopes."""
+        columns = self.columns
+        scopes = (columns.rows(), scope_rows(columns, subject),
+                  scope_rows(columns, subject, category, by_category=True))
+        if exclude_id is not None:
+            scopes = tuple(array('l', [i for i in rows if columns.ids[i] != exclude_id]) for rows in scopes)
+        return scopes
+
+    def blended_k(self, subject, category, exclude_id=None):
+        key = (subject, category)
+        if exclude_id is None and key in self._blended:
+            return self._blended[key]
+
+        # Get subject and category specific data
+        all_rows, subject_rows, category_rows = self._scopes(subject, category, exclude_id)
+        n_all = len(all_rows)
+        n_subject = len(subject_rows)
+        n_category = len(category_rows)
+        if not n_all:
+            return None  # No historical data to base prediction on
+
+        # Estimate k for each scope
+        columns = self.columns
+        k_all = estimate_k_columns(columns, all_rows)
+        k_subject = estimate_k_columns(columns, subject_rows) if n_subject >= 1 else k_all
+        k_category = estimate_k_columns(columns, category_rows) if n_category >= 1 else k_subject
+
+        # Blend k values based on data availability (same logic as /predict route)
+        k_final, _ = blend_k(k_all, k_subject, k_category, n_subject, n_category)
+
+        if exclude_id is None:
+            self._blended[key] = k_final
+        return k_final
+
+    def __call__(self, subject, category, study_time, weight, exclude_id=None):
+        if study_time is None or study_time <= 0:
+            return None
+        k_final = self.blended_k(subject, category, exclude_id)
+        if k_final is None:
+            return None
+        # Calculate prediction
+        weight_decimal = weight / 100
+        predicted = predict_grade(study_time, weight_decimal, k_final, max_grade=100)
+        return round(predicted, 2)
+
+    def examples(self, subject, category):
+        """
+        ScopeExamples of the scope /predict draws its examples from: the
+        category, else the subject, else everything (first with 2+ rows).
+        """
+        key = (subject, category)
+        if key not in self._examples:
+            all_rows, subject_rows, category_rows = self._scopes(subject, category)
+            if len(category_rows) >= 2:
+                rows = category_rows
+            elif len(subject_rows) >= 2:
+                rows = subject_rows
+            else:
+                rows = all_rows
+            self._examples[key] = ScopeExamples.from_columns(self.columns, rows)
+        return self._examples[key]
+
+    def similar(self, subject, category, study_time, n=SIMILAR_EXAMPLES):
+        """Up to n past assessments with study time similar to study_time, closest first."""
+        return find_similar_assignment(self.examples(subject, category), study_time, n)
+
+    def confidence(self, subject, category, study_time, weight):
+        """calculate_confidence of a prediction for these inputs."""
+        return calculate_confidence(self.examples(subject, category), study_time, weight)
+
+
+def refresh_system_predictions(username, grade_id=None, progress=None):
+    """
+    Store the system prediction (PredictedGrade) of every assessment that
+    needs one (crud.get_prediction_targets) from a single fetch of the user's
+    graded history. Ungraded assessments are refreshed, so that entering
+    their grade later only has to keep the stored value; the graded row
+    `grade_id` gets it computed without its own grade.
+    Returns the number of rows whose prediction changed.
+    """
+    targets = get_prediction_targets(username, grade_id)
+    if not targets:
+        return 0
+    predict = SystemPredictor(get_grade_columns(username, graded_only=True, include_predictions=False))
+    changed = []
+    for row in targets:
+        exclude_id = row['id'] if row['grade'] is not None else None
+        predicted = predict(row['subject'], row['category'], row['study_time'], row['weight'], exclude_id)
+        if predicted != row['predicted_grade']:
+            changed.append((row['id'], predicted))
+    set_predicted_grades(username, changed)
+    if progress:
+        progress(len(targets), len(targets))
+    return len(changed)
+
+
+def schedule_prediction_refresh(username, grade_id=None):
+    """
+    Refresh the user's stored system predictions after their grades changed
+    (and that of the graded row `grade_id`, see refresh_system_predictions):
+    on a background job (coalesced per user), or right away when
+    PREDICTION_REFRESH is 'inline'. That is the default wherever jobs don't
+    outlive the request (JOB_MODE=inline, e.g. serverless) and on the
+    in-memory backend, so a refresh is never left to a worker that may not run.
+    """
+    if PREDICTION_REFRESH == 'inline':
+        refresh_system_predictions(username, grade_id)
     else:
-        k_final = k_all
-    
-    # Calculate prediction
-    weight_decimal = weight / 100
-    predicted = predict_grade(study_time, weight_decimal, k_final, max_grade=100)
-    
-    return round(predicted, 2)
+        key = username if grade_id is None else (username, grade_id)
+        submit_job('refresh_predictions', refresh_system_predictions, username, grade_id,
+                   owner=username, key=key)
 
 
 def required_hours(target_grade, weight, k, max_grade=100):
@@ -306,20 +455,50 @@ def required_hours(target_grade, weight, k, max_grade=100):
         return float('inf')
 
 
-def calculate_confidence(data, hours_or_target, weight):
+class ScopeExamples:
+    """
+    A prediction scope's past assessments sorted by study time and by grade
+    (columns.SortedColumn), with their mean study time. Built once per scope,
+    it answers any number of similar-assessment and confidence queries.
+    """
+
+    def __init__(self, ids, hours, grades):
+        self.ids = list(ids)
+        self.hours = list(hours)
+        self.grades = list(grades)
+        self.mean_hours = sum(self.hours) / len(self.hours) if self.hours else 0.0
+        self.by_hours = SortedColumn([float(h or 0) for h in self.hours])
+        self.by_grade = SortedColumn([float(g or 0) for g in self.grades])
+
+    @classmethod
+    def from_records(cls, records):
+        return cls([r['id'] for r in records], [r['study_time'] for r in records],
+                   [r['grade'] for r in records])
+
+    @classmethod
+    def from_columns(cls, columns, rows):
+        return cls(columns.values('ids', rows), columns.values('hours', rows), columns.values('grades', rows))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def example(self, i):
+        return {'id': self.ids[i], 'study_time': self.hours[i], 'grade': self.grades[i]}
+
+
+def calculate_confidence(examples, hours_or_target, weight):
     """
     Calculate confidence score based on:
     - Number of data points
     - Similarity to past assignments
     """
-    n = len(data)
+    n = len(examples)
     
     # Base confidence from data quantity
     base_conf = min(80, n * 15)
     
     # Bonus if we have similar examples
-    past_hours = [log['study_time'] for log in data]
-    avg_hours = sum(past_hours) / len(past_hours)
+    avg_hours = examples.mean_hours
     
     # Reduce confidence if prediction is far from past experience
     if abs(hours_or_target - avg_hours) > avg_hours:
@@ -328,45 +507,43 @@ def calculate_confidence(data, hours_or_target, weight):
     return round(base_conf)
 
 
-def find_similar_assignment(data, target_hours):
-    """Find assignment with similar study time for reference"""
-    if not data:
-        return None
-    
-    # Find closest by study time
-    closest = min(data, key=lambda x: abs(x['study_time'] - target_hours))
-    
+def find_similar_assignment(examples, target_hours, n=1):
+    """Up to n past assessments with similar study time (within 50%), closest first"""
     # Only return if reasonably similar (within 50%)
-    if abs(closest['study_time'] - target_hours) / max(target_hours, 0.1) < 0.5:
-        return closest
-    
-    return None
+    within = 0.5 * max(target_hours, 0.1)
+    return [examples.example(i) for i in examples.by_hours.nearest(target_hours, n, within)]
 
 
-def find_similar_grade(data, target_grade):
-    """Find assignment with similar grade for reference"""
-    if not data:
-        return None
-    
-    # Find closest by grade
-    closest = min(data, key=lambda x: abs(x['grade'] - target_grade))
-    
-    # Only return if reasonably similar (within 10 points)
-    if abs(closest['grade'] - target_grade) < 10:
-        return closest
-    
-    return None
+def find_similar_grade(examples, target_grade, n=1):
+    """Up to n past assessments with similar grade (within 10 points), closest first"""
+    return [examples.example(i) for i in examples.by_grade.nearest(target_grade, n, within=10)]
+
+
+def similar_response(similar):
+    """/predict response fields for similar past assessments (closest first)."""
+    if not similar:
+        return {}
+    closest = similar[0]
+    return {
+        'similar_example': f"Previously: {closest['study_time']:.1f}h → {closest['grade']}%",
+        'similar_assessments': similar,
+    }
 
 @app.context_processor
 def inject_subjects():
     if not current_user.is_authenticated:
         return dict(subjects=[], retired_subjects=[])
+    # Pages that already fetched the subject lists (render_subject_view) leave
+    # them in g; otherwise fetch both here
+    prefetched = g.pop('subject_lists', None)
+    if prefetched is None:
+        username = current_user.username
+        prefetched = fetch_all(all_subjects=lambda: get_all_subjects(username),
+                               retired=lambda: get_retired_subjects(username))
     # Get active subjects (excludes retired)
-    all_subjects = get_all_subjects(current_user.username)
-    unique_subjects = sorted([s['name'] for s in all_subjects])
+    unique_subjects = sorted([s['name'] for s in prefetched['all_subjects']])
     # Get retired subjects
-    retired = get_retired_subjects(current_user.username)
-    retired_subject_names = sorted([s['name'] for s in retired])
+    retired_subject_names = sorted([s['name'] for s in prefetched['retired']])
     return dict(subjects=unique_subjects, retired_subjects=retired_subject_names)
 
 
@@ -401,53 +578,65 @@ def display_subject(subject_name):
             app.logger.warning(f"Subject '{subject_name}' not found, redirecting to home")
             return redirect(url_for('display_table'))
         
-        # Check if this subject is retired
-        retired = get_retired_subjects(current_user.username)
-        retired_names = [s['name'] for s in retired]
-        is_retired_subject = subject_name in retired_names
+        # Check if this subject is retired (and whether its rows are in the archive tables)
+        retired = {s['name']: s for s in get_retired_subjects(current_user.username)}
+        is_retired_subject = subject_name in retired
+        is_archived_subject = is_retired_subject and retired[subject_name]['is_archived']
         
-        return render_subject_view(subject_name, is_retired_subject=is_retired_subject)
+        return render_subject_view(subject_name, is_retired_subject=is_retired_subject,
+                                   is_archived_subject=is_archived_subject)
     except Exception as e:
         app.logger.error(f"Error in display_subject: {e}")
         return redirect(url_for('display_table'))
 
-def render_subject_view(filter_subject, is_retired_subject=False):
+def render_subject_view(filter_subject, is_retired_subject=False, is_archived_subject=False):
     """Helper to render the main view with a specific subject filter."""
     filter_category = request.args.get('category')
     username = current_user.username
-
-    # Fetch data from database
-    study_data_db = get_all_grades(username)
-    weight_categories_db = get_categories_as_dict(username)
-
-    # Get subjects from subjects table (already injected, but needed for logic)
-    all_subjects = get_all_subjects(username)
-    unique_subjects = sorted([s['name'] for s in all_subjects])
+    is_dashboard = filter_subject == 'all'
+    # Archived subjects' rows live in the archive tables; the dashboard's
+    # overall totals count them too
+    archived = is_archived_subject or is_dashboard
 
     # Filter data for display
-    data_to_display = study_data_db
     if filter_subject and filter_subject != 'all':
-        data_to_display = [log for log in study_data_db if log['subject'] == filter_subject]
-        if filter_category and filter_category != 'all':
-            data_to_display = [log for log in data_to_display if log['category'] == filter_category]
+        category_filter = filter_category if filter_category and filter_category != 'all' else None
+        fetch_rows = lambda: get_grades(username, subject=filter_subject, category=category_filter,
+                                        include_archived=is_archived_subject)
     else:
         # On "All Subjects" dashboard: show only ungraded assignments (no predictions, no graded items)
-        data_to_display = [
-            log for log in study_data_db 
-            if not log.get('is_prediction', False) and log.get('grade') is None
-        ]
+        fetch_rows = lambda: get_grades(username, ungraded_only=True, include_predictions=False)
+
+    # Everything the page needs from the database: only the rows on screen,
+    # per-category totals, the summary and the subject lists (also used by the
+    # context processor). The queries are independent, so fetch_all can run
+    # them concurrently.
+    fetched = fetch_all(
+        categories=lambda: get_categories_as_dict(username, include_archived=is_archived_subject),
+        totals=lambda: get_grade_totals(username, include_archived=archived),
+        all_subjects=lambda: get_all_subjects(username),
+        retired=lambda: get_retired_subjects(username),
+        rows=fetch_rows,
+        summary=lambda: calculate_summary(username, filter_subject, include_archived=is_archived_subject),
+    )
+    weight_categories_db = fetched['categories']
+    aggregate = GradeAggregate.from_totals(fetched['totals'])
+    data_to_display = fetched['rows']
+    summary_data = fetched['summary']
+    g.subject_lists = {'all_subjects': fetched['all_subjects'], 'retired': fetched['retired']}
 
-    # Calculate summary
-    summary_data = calculate_summary(username, filter_subject)
+    # Get subjects from subjects table (also injected by the context processor)
+    unique_subjects = sorted([s['name'] for s in fetched['all_subjects']])
 
     # Add num_assessments to categories (count from database)
-    temp_weight_categories = json.loads(json.dumps(weight_categories_db))
+    # Copy each category dict so weight_categories_json below stays without the counts
+    temp_weight_categories = {
+        subject: [dict(category) for category in categories]
+        for subject, categories in weight_categories_db.items()
+    }
     for subject, categories in temp_weight_categories.items():
         for category in categories:
-            category['num_assessments'] = sum(
-                1 for log in study_data_db
-                if log['subject'] == subject and log['category'] == category['name']
-            )
+            category['num_assessments'] = aggregate.category(subject, category['name']).count
 
     # Create subject-categories mapping
     subject_categories_map = {
@@ -458,12 +647,11 @@ def render_subject_view(filter_subject, is_retired_subject=False):
     # Calculate chart data - only include subjects with actual study time
     chart_data = {}
     for s in unique_subjects:
-        total_hours = sum(log['study_time'] for log in study_data_db if log['subject'] == s)
+        total_hours = aggregate.subject(s).study_time
         if total_hours > 0:  # Only include subjects with study time
             chart_data[s] = total_hours
             
     page_title = "Dashboard" if filter_subject == 'all' else filter_subject
-    is_dashboard = filter_subject == 'all'
 
     # Dashboard overview stats (only for the all-subjects dashboard)
     dashboard_stats = None
@@ -472,18 +660,14 @@ def render_subject_view(filter_subject, is_retired_subject=False):
         total_subjects = len(unique_subjects)
 
         # Total study hours across all subjects
-        total_study_hours = sum(log.get('study_time', 0) for log in study_data_db)
+        total_study_hours = aggregate.overall.study_time
 
         # Compute per-subject average grade (weighted by weight) where grades exist
         subject_avg_grades = {}
         for s in unique_subjects:
-            items = [log for log in study_data_db if log['subject'] == s and log.get('grade') is not None]
-            if not items:
-                continue
-            weighted_sum = sum(it['grade'] * it.get('weight', 0) for it in items)
-            total_w = sum(it.get('weight', 0) for it in items)
-            if total_w > 0:
-                subject_avg_grades[s] = weighted_sum / total_w
+            average = aggregate.subject(s).average_grade
+            if average is not None:
+                subject_avg_grades[s] = average
 
         # Average GPA across subjects (treat average grade as percentage -> GPA mapping optional)
         avg_grade = None
@@ -495,11 +679,9 @@ def render_subject_view(filter_subject, is_retired_subject=False):
         if subject_avg_grades:
             best_subject = max(subject_avg_grades.items(), key=lambda kv: kv[1])[0]
 
-        total_assessments = len(study_data_db)
-
         dashboard_stats = {
             'total_subjects': total_subjects,
-            'total_assessments': total_assessments,
+            'total_assessments': aggregate.overall.count,
             'avg_grade': round(avg_grade, 2) if avg_grade is not None else None,
             'total_study_hours': round(total_study_hours, 1),
             'best_subject': best_subject
@@ -515,9 +697,9 @@ def render_subject_view(filter_subject, is_retired_subject=False):
         chart_labels=json.dumps(list(chart_data.keys())),
         chart_values=json.dumps(list(chart_data.values())),
         subject_categories_map_py=subject_categories_map,
-        subject_categories_map_json=json.dumps(subject_categories_map),
+        subject_categories_map_json=app.json.dumps(subject_categories_map),
         weight_categories_py=temp_weight_categories,
-        weight_categories_json=json.dumps(weight_categories_db),
+        weight_categories_json=app.json.dumps(weight_categories_db),
         page_title=page_title,
         username=username,
         is_retired_subject=is_retired_subject,
@@ -542,9 +724,11 @@ def about():
 
 def calculate_stats(username):
     """Aggregate study data into high-level statistics for the Stats page."""
-    study_data = get_all_grades(username)
+    prediction_counts.flush()  # so the prediction counts below are current
+    # Archived subjects count towards the stats like any other retired subject
+    columns = get_grade_columns(username, include_archived=True)
     stats = {
-        'has_data': bool(study_data),
+        'has_data': len(columns) > 0,
         'has_actuals': False,
         'has_grades': False,
         'overall': {
@@ -578,7 +762,7 @@ def calculate_stats(username):
         'graded_scores': []
     }
 
-    if not study_data:
+    if not len(columns):
         # Even with no study data, get prediction run count and per-subject counts
         stats['predictions']['total'] = get_prediction_run_count(username)
         # Get per-subject prediction counts from database
@@ -591,10 +775,9 @@ def calculate_stats(username):
             }
         return stats
 
-    actual_entries = [row for row in study_data if not row.get('is_prediction')]
-    prediction_entries = [row for row in study_data if row.get('is_prediction')]
+    actual_rows = columns.rows(include_predictions=False)
 
-    stats['overall']['assignment_count'] = len(actual_entries)
+    stats['overall']['assignment_count'] = len(actual_rows)
     # Use actual prediction run count from database, not just open predictions
     stats['predictions']['total'] = get_prediction_run_count(username)
 
@@ -607,62 +790,28 @@ def calculate_stats(username):
             'count': top_subject[1]
         }
 
-    if not actual_entries:
+    if not actual_rows:
         return stats
 
     stats['has_actuals'] = True
 
-    subject_hours = defaultdict(float)
-    subject_weighted_sum = defaultdict(float)
-    subject_weight_total = defaultdict(float)
-    subject_grades = defaultdict(list)
-    category_totals = defaultdict(lambda: {'weighted_sum': 0.0, 'weight_sum': 0.0, 'grades': []})
-
-    overall_weighted_sum = 0.0
-    overall_weight_total = 0.0
-    overall_grades = []
-
-    for entry in actual_entries:
-        subject = entry.get('subject')
-        if not subject:
-            continue
-
-        hours = float(entry.get('study_time') or 0)
-        subject_hours[subject] += hours
-
-        grade = entry.get('grade')
-        if grade is None:
-            continue
-
-        grade = float(grade)
-        weight = float(entry.get('weight') or 0)
-        subject_grades[subject].append(grade)
-
-        if weight > 0:
-            weighted_grade = grade * weight
-            subject_weighted_sum[subject] += weighted_grade
-            subject_weight_total[subject] += weight
-            overall_weighted_sum += weighted_grade
-            overall_weight_total += weight
-
-        overall_grades.append(grade)
-
-        category = entry.get('category') or 'Uncategorized'
-        category_stats = category_totals[(subject, category)]
-        category_stats['grades'].append(grade)
-        if weight > 0:
-            category_stats['weighted_sum'] += grade * weight
-            category_stats['weight_sum'] += weight
+    # Per-subject and per-(subject, category) totals, one grouped pass each.
+    # Rows without a subject only count towards the overall figures below.
+    subject_hours = {subj: hours for subj, hours in columns.group_sum('hours', actual_rows).items() if subj}
+    subject_grades = {subj: group for subj, group in columns.group_grades(actual_rows).items() if subj}
+    category_totals = {key: group for key, group in columns.group_grades(actual_rows, by='category').items()
+                       if key[0]}
 
     total_hours = sum(subject_hours.values())
     stats['overall']['total_hours'] = total_hours
 
     # Strong/weak result rates
-    graded_entries = [e for e in actual_entries if e.get('grade') is not None]
-    if graded_entries:
-        strong_count = sum(1 for e in graded_entries if float(e['grade']) >= 90)
-        needs_work_count = sum(1 for e in graded_entries if float(e['grade']) < 70)
-        total_graded = len(graded_entries)
+    graded_rows = columns.rows(graded_only=True, include_predictions=False)
+    graded_scores = columns.values('grades', graded_rows)
+    if graded_scores:
+        strong_count = sum(1 for grade in graded_scores if grade >= 90)
+        needs_work_count = sum(1 for grade in graded_scores if grade < 70)
+        total_graded = len(graded_scores)
         stats['strong_scores'] = {
             'count': strong_count,
             'pct': (strong_count / total_graded) * 100 if total_graded else None
@@ -671,33 +820,34 @@ def calculate_stats(username):
             'count': needs_work_count,
             'pct': (needs_work_count / total_graded) * 100 if total_graded else None
         }
-        stats['graded_scores'] = [float(e['grade']) for e in graded_entries]
+        stats['graded_scores'] = graded_scores
 
     if stats['overall']['assignment_count'] > 0:
         stats['hours_per_assignment'] = total_hours / stats['overall']['assignment_count']
 
-    if overall_weight_total > 0:
-        overall_avg = overall_weighted_sum / overall_weight_total
-    elif overall_grades:
-        overall_avg = sum(overall_grades) / len(overall_grades)
-    else:
-        overall_avg = None
+    # Weighted average of a group from columns.group_grades(), falling back
+    # to the plain mean when none of its grades carry weight
+    def group_average(group):
+        if group['weight_sum'] > 0:
+            return group['weighted_sum'] / group['weight_sum']
+        if group['count']:
+            return group['grade_sum'] / group['count']
+        return None
+
+    overall_avg = group_average({
+        field: sum(group[field] for group in subject_grades.values())
+        for field in ('count', 'grade_sum', 'weight_sum', 'weighted_sum')
+    })
 
     stats['has_grades'] = overall_avg is not None
     stats['overall']['gpa'] = overall_avg
     if overall_avg is not None and total_hours > 0:
         stats['overall']['grade_per_hour'] = overall_avg / total_hours
 
-    # Helper to calculate subject average
-    def subject_average(subject):
-        if subject_weight_total[subject] > 0:
-            return subject_weighted_sum[subject] / subject_weight_total[subject]
-        if subject_grades[subject]:
-            return sum(subject_grades[subject]) / len(subject_grades[subject])
-        return None
-
-    subjects_seen = set(subject_hours.keys()) | set(subject_grades.keys())
-    subject_averages = {subj: subject_average(subj) for subj in subjects_seen}
+    subject_averages = {
+        subj: group_average(subject_grades[subj]) if subj in subject_grades else None
+        for subj in subject_hours
+    }
 
     # Top studied subjects
     stats['top_hours_subjects'] = [
@@ -712,20 +862,14 @@ def calculate_stats(username):
 
     # Best performing category across all subjects
     best_category = None
-    for (subject, category), values in category_totals.items():
-        if not values['grades']:
-            continue
-        if values['weight_sum'] > 0:
-            avg_grade = values['weighted_sum'] / values['weight_sum']
-        else:
-            avg_grade = sum(values['grades']) / len(values['grades'])
-
+    for (subject, category), group in category_totals.items():
+        avg_grade = group_average(group)
         if best_category is None or avg_grade > best_category['average']:
             best_category = {
                 'subject': subject,
                 'category': category,
                 'average': avg_grade,
-                'samples': len(values['grades'])
+                'samples': group['count']
             }
     stats['best_category'] = best_category
 
@@ -738,7 +882,7 @@ def calculate_stats(username):
             'subject': subject,
             'average': avg_grade,
             'hours': subject_hours.get(subject, 0),
-            'assignments': len(subject_grades[subject])
+            'assignments': subject_grades[subject]['count']
         }
         if focus_candidate is None or avg_grade < focus_candidate['average']:
             focus_candidate = candidate
@@ -761,23 +905,14 @@ def calculate_stats(username):
 
     # Prediction accuracy: compare system's predicted grade to actual grade
     # Only considers entries where we have both a predicted_grade and an actual grade
-    errors = []
-    for entry in graded_entries:
-        predicted = entry.get('predicted_grade')
-        actual = entry.get('grade')
-        
-        # Only include entries where system made a prediction and there's an actual grade
-        if predicted is not None and actual is not None:
-            error = abs(float(predicted) - float(actual))
-            errors.append({
-                'subject': entry.get('subject'),
-                'predicted': predicted,
-                'actual': actual,
-                'error': error
-            })
+    errors = [
+        abs(columns.predicted[i] - columns.grades[i])
+        for i in graded_rows
+        if columns.predicted[i] == columns.predicted[i]  # NaN: no prediction recorded
+    ]
 
     if errors:
-        mae = sum(e['error'] for e in errors) / len(errors)
+        mae = sum(errors) / len(errors)
         # Accuracy as "how close on average" capped between 0 and 100
         accuracy = max(0, min(100, 100 - mae))
         stats['prediction_accuracy'] = {
@@ -787,17 +922,17 @@ def calculate_stats(username):
         }
 
     # --- add raw rows so charts can filter by subject ---
+    subject_names = columns.subjects
     # All graded items as {subject, score}
     stats["all_grades"] = [
-        {"subject": e.get("subject"), "score": float(e["grade"])}
-        for e in actual_entries
-        if e.get("grade") is not None
+        {"subject": subject_names[columns.subject_codes[i]], "score": columns.grades[i]}
+        for i in graded_rows
     ]
 
     # All study logs (actuals) as {subject, hours}
     stats["all_study_logs"] = [
-        {"subject": e.get("subject"), "hours": float(e.get("study_time") or 0)}
-        for e in actual_entries
+        {"subject": subject_names[columns.subject_codes[i]], "hours": columns.hours[i]}
+        for i in actual_rows
     ]
 
     return stats
@@ -818,15 +953,7 @@ def stats():                      # <-- was: def stats(username):
         return redirect(url_for('display_table'))
 
     # sidebar subjects for this user
-    conn = _connect(); cur = conn.cursor()
-    try:
-        cur.execute(f"SELECT name FROM {SUBJECTS_TABLE} WHERE username = %s ORDER BY name", (username,))
-        subjects = [r[0] for r in cur.fetchall()]
-    finally:
-        try: cur.close()
-        except: pass
-        try: conn.close()
-        except: pass
+    subjects = get_subject_names(username)
 
     return render_template('stats.html',
                            page_title="Statistics",
@@ -889,6 +1016,12 @@ def process_form_data(form):
     except Exception as e:
         return None, f"Error processing form data: {str(e)}"
 
+def get_filtered_assignments(username, current_filter):
+    """Assignments shown for the page's subject filter ('all' or empty = every subject)."""
+    if current_filter and current_filter != 'all':
+        return get_grades(username, subject=current_filter)
+    return get_all_grades(username)
+
 @app.route('/add', methods=['POST'])
 @login_required
 def add_log():
@@ -902,26 +1035,15 @@ def add_log():
     
     username = current_user.username
 
-    # Calculate system prediction for accuracy tracking
+    # System prediction for accuracy tracking
     # For predictions: store what the system predicted so we can compare later
-    # For actual grades: store the prediction at the time of entry
+    # For actual assignments: stored by refresh_system_predictions after the
+    # insert (schedule_prediction_refresh below), not computed in the request
     system_predicted_grade = None
-    if log_data['grade'] is not None:
+    if log_data['grade'] is not None and log_data['is_prediction']:
         # If this is a prediction row, the grade IS the prediction - store it
-        if log_data['is_prediction']:
-            system_predicted_grade = log_data['grade']
-            print(f'Storing prediction grade: {system_predicted_grade}')
-        else:
-            # For actual assignments, calculate what system would have predicted
-            system_predicted_grade = calculate_system_prediction(
-                username=username,
-                subject=log_data['subject'],
-                category=log_data['category'],
-                study_time=log_data['study_time'],
-                weight=log_data['weight']
-            )
-            if system_predicted_grade is not None:
-                print(f'System predicted: {system_predicted_grade}, Actual: {log_data["grade"]}')
+        system_predicted_grade = log_data['grade']
+        print(f'Storing prediction grade: {system_predicted_grade}')
 
     # Write to database
     try:
@@ -946,21 +1068,17 @@ def add_log():
     if not log_data['is_prediction']:
         recalculate_weights(username, log_data['subject'], log_data['category'])
         print('Weights recalculated')
+        # Snapshot this assessment's system prediction and refresh the others'
+        schedule_prediction_refresh(username, db_id if log_data['grade'] is not None else None)
     else:
         print('Skipping weight recalculation for prediction row')
 
     summary = calculate_summary(username, request.form.get('current_filter'))
 
     # Fetch fresh data from database
-    assignments_to_return = get_all_grades(username)
-    print(f'Fetched {len(assignments_to_return)} assignments from database')
-    print('First 3 assignments:', assignments_to_return[:3] if len(assignments_to_return) >= 3 else assignments_to_return)
-    print('Last 3 assignments:', assignments_to_return[-3:] if len(assignments_to_return) >= 3 else assignments_to_return)
-
     current_subject_filter = request.form.get('current_filter')
-    if current_subject_filter and current_subject_filter != 'all':
-        assignments_to_return = [log for log in assignments_to_return if log['subject'] == current_subject_filter]
-        print(f'Filtered to {len(assignments_to_return)} assignments for subject: {current_subject_filter}')
+    assignments_to_return = get_filtered_assignments(username, current_subject_filter)
+    print(f'Fetched {len(assignments_to_return)} assignments for filter: {current_subject_filter}')
 
     # Find the newly added prediction and log its weight
     new_prediction = next((a for a in assignments_to_return if a['id'] == log_data['id']), None)
@@ -975,8 +1093,7 @@ def add_log():
 def update_log(log_id):
     username = current_user.username
     # PHASE 5 FIX: Check database instead of in-memory dict
-    all_assignments = get_all_grades(username)
-    old_log = next((log for log in all_assignments if log['id'] == log_id), None)
+    old_log = get_grade_by_id(username, log_id)
 
     if not old_log:
         return jsonify({'status': 'error', 'message': 'Assessment not found.'}), 404
@@ -998,25 +1115,21 @@ def update_log(log_id):
     print(f'  new_is_prediction: {updated_data.get("is_prediction")}')
 
     # Handle system prediction for accuracy tracking
-    # The predicted_grade is set when the prediction is created
-    # We preserve it through updates - it should NOT be recalculated
+    # The predicted_grade is snapshotted when the assessment is created (and
+    # kept current by refresh_system_predictions while it is ungraded), so
+    # entering the grade just keeps it - no recompute here
     original_predicted_grade = old_log.get('predicted_grade')
     
-    # Only calculate a new prediction if:
-    # 1. This is a brand new grade entry (old_grade was None, new grade is not None)
-    # 2. AND there's no stored prediction yet (wasn't a prediction row before)
-    if old_grade is None and updated_data['grade'] is not None and original_predicted_grade is None:
-        print(f'  --> No stored prediction, calculating fresh...')
-        original_predicted_grade = calculate_system_prediction(
-            username=username,
-            subject=updated_data['subject'],
-            category=updated_data['category'],
-            study_time=updated_data['study_time'],
-            weight=old_log.get('weight', 0),
-            exclude_id=log_id
-        )
-        if original_predicted_grade is not None:
-            print(f'  --> Calculated prediction: {original_predicted_grade}, Actual: {updated_data["grade"]}')
+    # A snapshot taken for other inputs doesn't count: clear it and let the
+    # refresh below compute it for the assessment as entered
+    inputs_changed = (old_subject, old_category, old_log.get('study_time')) != \
+        (updated_data['subject'], updated_data['category'], updated_data['study_time'])
+    refresh_id = None
+    if old_grade is None and updated_data['grade'] is not None and not old_log.get('is_prediction') \
+            and inputs_changed:
+        print(f'  --> Inputs changed since the stored prediction, refreshing')
+        original_predicted_grade = None
+        refresh_id = log_id
     else:
         print(f'  --> Using stored prediction: {original_predicted_grade}')
 
@@ -1040,13 +1153,18 @@ def update_log(log_id):
     if old_subject != updated_data['subject'] or old_category != updated_data['category']:
         recalculate_weights(username, old_subject, old_category)
     recalculate_weights(username, updated_data['subject'], updated_data['category'])
+    # Entering or correcting a grade leaves every stored prediction valid for
+    # its inputs; inline, that stays a single-row update and the other
+    # assessments' predictions take the grade in at the next refresh
+    grade_only = not inputs_changed and \
+        bool(updated_data['is_prediction']) == bool(old_log.get('is_prediction'))
+    if not (grade_only and PREDICTION_REFRESH == 'inline'):
+        schedule_prediction_refresh(username, refresh_id)
 
     # Fetch fresh data from database instead of using in-memory dict
-    assignments_to_return = get_all_grades(username)
     current_subject_filter = request.form.get('current_filter')
+    assignments_to_return = get_filtered_assignments(username, current_subject_filter)
     summary = calculate_summary(username, current_subject_filter)
-    if current_subject_filter and current_subject_filter != 'all':
-        assignments_to_return = [log for log in assignments_to_return if log['subject'] == current_subject_filter]
 
     return jsonify({'status': 'success', 'message': 'Assessment updated!', 'log': updated_data, 'summary': summary, 'updated_assignments': assignments_to_return})
 
@@ -1057,8 +1175,7 @@ def delete_log(log_id):
     username = current_user.username
 
     # PHASE 5 FIX: Check database instead of in-memory dict
-    all_assignments = get_all_grades(username)
-    log_to_delete = next((log for log in all_assignments if log['id'] == log_id), None)
+    log_to_delete = get_grade_by_id(username, log_id)
 
     if not log_to_delete:
         return jsonify({'status': 'error', 'message': 'Assessment not found.'}), 404
@@ -1073,12 +1190,11 @@ def delete_log(log_id):
         return jsonify({'status': 'error', 'message': f'Failed to delete assessment: {str(e)}'}), 500
 
     recalculate_weights(username, subject, category)
+    schedule_prediction_refresh(username)
     summary = calculate_summary(username, current_filter)
 
     # Fetch fresh data from database
-    assignments_to_return = get_all_grades(username)
-    if current_filter and current_filter != 'all':
-        assignments_to_return = [log for log in assignments_to_return if log['subject'] == current_filter]
+    assignments_to_return = get_filtered_assignments(username, current_filter)
 
     message = 'Prediction deleted!' if is_prediction else 'Assessment deleted!'
     return jsonify({'status': 'success', 'message': message, 'summary': summary, 'updated_assignments': assignments_to_return})
@@ -1100,8 +1216,7 @@ def convert_prediction():
         return jsonify({'status': 'error', 'message': 'Invalid assessment ID.'}), 400
     
     # Get the assignment from database
-    all_assignments = get_all_grades(username)
-    assignment = next((a for a in all_assignments if a['id'] == assignment_id), None)
+    assignment = get_grade_by_id(username, assignment_id)
     
     if not assignment:
         return jsonify({'status': 'error', 'message': 'Assessment not found.'}), 404
@@ -1128,12 +1243,11 @@ def convert_prediction():
         )
     except Exception as e:
         return jsonify({'status': 'error', 'message': f'Failed to convert prediction: {str(e)}'}), 500
+    schedule_prediction_refresh(username)
     
     # Fetch fresh data from database
-    assignments_to_return = get_all_grades(username)
+    assignments_to_return = get_filtered_assignments(username, current_filter)
     summary = calculate_summary(username, current_filter)
-    if current_filter and current_filter != 'all':
-        assignments_to_return = [log for log in assignments_to_return if log['subject'] == current_filter]
     
     return jsonify({
         'status': 'success',
@@ -1154,8 +1268,7 @@ def delete_multiple():
         return jsonify({'status': 'error', 'message': 'No assessments selected.'}), 400
 
     # Get assignments that will be deleted to track subjects/categories for weight recalc
-    all_assignments = get_all_grades(username)
-    assignments_to_delete = [a for a in all_assignments if a['id'] in ids_to_delete]
+    assignments_to_delete = get_grades_by_ids(username, ids_to_delete)
     subjects_to_recalc = set((a['subject'], a['category']) for a in assignments_to_delete)
 
     # Delete from database (bulk operation)
@@ -1164,19 +1277,16 @@ def delete_multiple():
     except Exception as e:
         return jsonify({'status': 'error', 'message': f'Failed to delete assessments: {str(e)}'}), 500
 
-    # Fetch fresh data from database instead of using in-memory dict
-    assignments_to_return = get_all_grades(username)
     # Recalculate weights for affected subjects/categories
     for subject, category in subjects_to_recalc:
         recalculate_weights(username, subject, category)
+    schedule_prediction_refresh(username)
 
     # Calculate summary
     summary = calculate_summary(username, current_filter)
 
     # Fetch updated assignments from database
-    assignments_to_return = get_all_grades(username)
-    if current_filter and current_filter != 'all':
-        assignments_to_return = [log for log in assignments_to_return if log['subject'] == current_filter]
+    assignments_to_return = get_filtered_assignments(username, current_filter)
 
     return jsonify({
         'status': 'success',
@@ -1255,18 +1365,19 @@ def update_category_route(cat_id):
         if current_total_weight + new_weight > 100:
             return jsonify({'status': 'error', 'message': f'Updating to {new_weight}% would exceed 100% for this subject.'}), 400
 
-        # Update in database
-        rows_affected = update_category(username, cat_id, subject, category_name, new_weight, default_name)
-
-        if rows_affected == 0:
-            return jsonify({'status': 'error', 'message': 'Category not found.'}), 404
-
-        # Update assignment names if requested and the naming pattern changed
+        # Update in database; if requested and the naming pattern changed, the
+        # assignments are renamed in the same transaction
         assignments_updated = 0
         if update_assignments and old_default_name and default_name and old_default_name != default_name:
-            assignments_updated = update_assignment_names_for_category(
-                username, subject, category_name, old_default_name, default_name
+            rows_affected, assignments_updated = update_category(
+                username, cat_id, subject, category_name, new_weight, default_name,
+                rename_from=old_default_name
             )
+        else:
+            rows_affected = update_category(username, cat_id, subject, category_name, new_weight, default_name)
+
+        if rows_affected == 0:
+            return jsonify({'status': 'error', 'message': 'Category not found.'}), 404
 
         updated_category = {"id": cat_id, "name": category_name, "total_weight": new_weight, "default_name": default_name}
         message = 'Category updated!'
@@ -1303,18 +1414,13 @@ def login():
         password = (request.form.get('password') or '').strip()
 
         if verify_user(username, password):
-            conn = _connect(); cur = conn.cursor()
-            try:
-                cur.execute(f"SELECT id, username FROM {USERS_TABLE} WHERE username=%s", (username,))
-                row = cur.fetchone()
-                if not row:
-                    flash('Account problem. Please contact support.', 'error')
-                    return render_template('login.html')
-                user = User(user_id=row[0], username=row[1])
-                login_user(user, remember=True)
-                flash(f"Hello, {username}!", "greeting")
-            finally:
-                cur.close(); conn.close()
+            row = get_user_by_username(username)
+            if not row:
+                flash('Account problem. Please contact support.', 'error')
+                return render_template('login.html')
+            user = User(user_id=row['id'], username=row['username'])
+            login_user(user, remember=True)
+            flash(f"Hello, {username}!", "greeting")
 
             nxt = request.args.get('next')
             return redirect(nxt or url_for('display_table'))
@@ -1373,14 +1479,10 @@ def predict():
     print(f'=== /PREDICT CALLED ===')
     print(f'  subject: {subject}, category: {category}, hours: {hours}')
     
-    # Increment prediction run counters (total and per-subject)
+    # Count the prediction run (total and per-subject); buffered, so a cache
+    # hit doesn't write to the database
     username = current_user.username
-    try:
-        increment_prediction_run_count(username)
-        if subject:
-            increment_subject_prediction_count(username, subject)
-    except Exception as e:
-        print(f"Warning: Failed to increment prediction count: {e}")
+    prediction_counts.add(username, subject)
     
     # Convert exclude_id to int if provided
     if exclude_id:
@@ -1396,22 +1498,41 @@ def predict():
             'message': 'Values cannot be negative.'
         }), 400
 
+    # Repeat requests are served from the prediction cache; the user's data
+    # version in the key drops their entries whenever a grade changes. It was
+    # loaded with the session's user row, so a hit runs no query at all.
+    cache_key = (username, current_user.data_version, subject, category, weight,
+                 float(hours) if hours else None, float(target_grade) if target_grade else None,
+                 grade_lock, max_grade, exclude_id or None, include_predictions)
+    cached = prediction_cache.get(cache_key)
+    if cached is not None:
+        body, status = cached
+        response = app.response_class(body, status=status, mimetype='application/json')
+        response.headers['X-Prediction-Cache'] = 'hit'
+        return response
+
+    response = app.make_response(compute_prediction(
+        username, subject, category, weight, hours, target_grade, max_grade, exclude_id, include_predictions))
+    if response.status_code < 500:
+        prediction_cache.put(cache_key, (response.get_data(), response.status_code))
+    response.headers['X-Prediction-Cache'] = 'miss'
+    return response
+
+
+def compute_prediction(username, subject, category, weight, hours, target_grade, max_grade, exclude_id,
+                       include_predictions):
+    """The /predict response for validated inputs (uncached)."""
     # --- 1. Filter Data Sets ---
     # Fetch from database
-    username = current_user.username
-    all_grades = get_all_grades(username)
-    
+
     # Exclude current row if specified (for re-predictions on same row)
     if exclude_id:
-        all_grades = [g for g in all_grades if g['id'] != exclude_id]
         print(f'  Excluding row ID {exclude_id}')
-    
-    # Filter to graded entries - include predictions only if include_predictions is True
+
+    # Graded entries - include predictions only if include_predictions is True
     # (used by subject predictor with "show predictions" enabled)
-    if include_predictions:
-        graded_data = [log for log in all_grades if log.get('grade') is not None]
-    else:
-        graded_data = [log for log in all_grades if log.get('grade') is not None and not log.get('is_prediction')]
+    graded_data = get_grades(username, graded_only=True, include_predictions=bool(include_predictions),
+                             exclude_id=exclude_id or None)
 
     all_data = graded_data
     subject_data = [log for log in all_data if log['subject'] == subject]
@@ -1454,46 +1575,23 @@ def predict():
     print(f'  Computing k for category data:')
     k_category, past_hours, past_grades, past_weights = get_k_and_data(category_data, debug=True)
 
-    # --- 3. Determine Blended k using confidence-based weighting ---
-    
-    # Thresholds for 'full' confidence in a scope
-    SUBJECT_THRESHOLD = 5
-    CATEGORY_THRESHOLD = 5
-    
-    # Sigmoid-like weighting function (simplified for clear cut-off)
-    # The weight increases linearly up to the threshold, then stays at 1.0
-    
-    # 3a. Category Weight (blends Category k with Subject k)
-    # Weight goes from 0 (n_cat=0) to 1.0 (n_cat >= CATEGORY_THRESHOLD)
+    # --- 3. Determine Blended k using confidence-based weighting (blend_k) ---
+    k_final, scope = blend_k(k_all, k_subject, k_category, n_subject, n_category)
     category_weight = min(1.0, n_category / CATEGORY_THRESHOLD)
-    
-    if n_category >= 2:
-        # Blend Category k with Subject k
-        k_blended_subject = (category_weight * k_category) + ((1 - category_weight) * k_subject)
+    subject_weight = min(1.0, n_subject / SUBJECT_THRESHOLD)
+
+    if scope == 'category':
         data_source = f"{subject} - {category} (Blended with Subject)"
-        filtered_data = category_data # Use most specific data for confidence/examples
-    elif n_subject >= 2:
-        k_blended_subject = k_subject
+    elif scope == 'subject':
         data_source = f"{subject} (Pure Subject)"
-        filtered_data = subject_data
     else:
-        k_blended_subject = k_all
         data_source = f"All Subjects (Pure General)"
-        filtered_data = all_data
 
-    # 3b. Subject Weight (blends Subject/Category k with All k)
-    # Weight goes from 0 (n_sub=0) to 1.0 (n_sub >= SUBJECT_THRESHOLD)
-    subject_weight = min(1.0, n_subject / SUBJECT_THRESHOLD)
-    
     if n_subject >= 2:
-        # Final Blend: Blended-Subject-k with All-k
-        k_final = (subject_weight * k_blended_subject) + ((1 - subject_weight) * k_all)
         data_source_detail = f"Subject Weight: {subject_weight:.0%}"
         if n_category >= 2:
              data_source_detail += f", Category Weight: {category_weight:.0%}"
     else:
-        # Fallback: Only use All k
-        k_final = k_all
         data_source_detail = "Only All Data (General)"
     
     k = k_final # The final blended k value
@@ -1517,6 +1615,8 @@ def predict():
     past_hours = [log['study_time'] for log in data_for_context]
     past_grades = [log['grade'] for log in data_for_context]
     past_weights = [log['weight'] / 100 for log in data_for_context]
+    # Sorted once for the confidence and similar-assessment lookups
+    examples = ScopeExamples.from_records(data_for_context)
     
     # --- 4. Make Prediction (rest of the original logic) ---
     
@@ -1532,11 +1632,11 @@ def predict():
         print(f'  PREDICTION RESULT: {predicted_grade}')
         
         # Calculate confidence based on data points and similarity (using the best available data)
-        base_confidence = calculate_confidence(data_for_context, hours, weight)
+        base_confidence = calculate_confidence(examples, hours, weight)
         adjusted_confidence = round(base_confidence) # Keep original confidence logic
         
         # Find similar assignments for context
-        similar = find_similar_assignment(data_for_context, hours)
+        similar = find_similar_assignment(examples, hours, SIMILAR_EXAMPLES)
         
         # Show more precision for grades very close to max
         if predicted_grade >= max_grade - 1:
@@ -1558,8 +1658,7 @@ def predict():
         if predicted_grade >= max_grade - 0.5:
             response['note_about_grade'] = f"Grade is very close to maximum ({max_grade}% is theoretically unreachable)"
         
-        if similar:
-            response['similar_example'] = f"Previously: {similar['study_time']:.1f}h → {similar['grade']}%"
+        response.update(similar_response(similar))
         
         return jsonify(response)
     
@@ -1599,11 +1698,11 @@ def predict():
             }), 400
         
         # Calculate confidence
-        base_confidence = calculate_confidence(data_for_context, required, weight)
+        base_confidence = calculate_confidence(examples, required, weight)
         adjusted_confidence = round(base_confidence)
         
         # Find similar grade for context
-        similar = find_similar_grade(data_for_context, target_grade)
+        similar = find_similar_grade(examples, target_grade, SIMILAR_EXAMPLES)
         
         response = {
             'mode': 'hours_from_grade',
@@ -1619,8 +1718,7 @@ def predict():
         if adjusted_target_note:
             response['calculation_note'] = adjusted_target_note
         
-        if similar:
-            response['similar_example'] = f"Previously: {similar['study_time']:.1f}h → {similar['grade']}%"
+        response.update(similar_response(similar))
         
         # Warning if significantly more than usual (but not an error)
         if required > avg_past_hours * 2 and avg_past_hours > 0:
@@ -1638,6 +1736,7 @@ def predict():
 @login_required
 def add_subject():
     subject_name = request.form.get('subject_name', '').strip()
+    term = request.form.get('term', '').strip() or None
     username = current_user.username
 
     if not subject_name:
@@ -1650,7 +1749,7 @@ def add_subject():
 
     # Add subject to database
     try:
-        subject_id = crud_add_subject(username, subject_name)
+        subject_id = crud_add_subject(username, subject_name, term=term)
         return jsonify({'status': 'success', 'subject': subject_name, 'id': subject_id})
     except Exception as e:
         return jsonify({'status': 'error', 'message': f'Failed to add subject: {str(e)}'}), 500
@@ -1664,15 +1763,22 @@ def delete_subject():
     if not subject_name:
         return jsonify({'status': 'error', 'message': 'Subject name cannot be empty.'}), 400
 
-    # Get subject by name, then delete by ID (cascade deletes assignments/categories)
+    # Get subject by name, then delete by ID (cascade deletes assignments/categories).
+    # The subject is hidden straight away; its rows are removed in batches by a
+    # background job whose progress can be polled at /api/jobs/<job_id> (on
+    # serverless hosts the job runs inline and is finished when this returns).
     try:
         subject = get_subject_by_name(username, subject_name)
         if not subject:
             return jsonify({'status': 'error', 'message': f'Subject "{subject_name}" not found.'}), 404
 
-        rows_deleted = crud_delete_subject(username, subject['id'])
-        if rows_deleted > 0:
-            return jsonify({'status': 'success', 'message': f'Subject "{subject_name}" deleted successfully.'})
+        job = delete_subject_in_background(username, subject['id'])
+        if job is not None and job.status == 'failed':
+            # Inline job: the subject stays hidden and is resumed on the next startup
+            return jsonify({'status': 'error', 'message': f'Failed to delete subject: {job.error}'}), 500
+        if job is not None:
+            return jsonify({'status': 'success', 'message': f'Subject "{subject_name}" deleted successfully.',
+                            'job_id': job.id})
         else:
             return jsonify({'status': 'error', 'message': f'Failed to delete subject "{subject_name}".'}), 500
     except Exception as e:
@@ -1703,16 +1809,17 @@ def rename_subject_route():
 @app.route('/retire_subject', methods=['POST'])
 @login_required
 def retire_subject_route():
-    """Mark a subject as retired."""
+    """Mark a subject as retired (archive=true also moves its rows to the archive tables)."""
     subject_name = request.form.get('subject_name')
+    archive = request.form.get('archive')
     username = current_user.username
 
     if not subject_name:
         return jsonify({'status': 'error', 'message': 'Subject name is required.'}), 400
 
     try:
-        from db import retire_subject
-        success = retire_subject(username, subject_name)
+        success = retire_subject(username, subject_name,
+                                 archive=None if archive is None else archive.lower() == 'true')
         if success:
             return jsonify({'status': 'success', 'message': f'Subject "{subject_name}" has been retired.'})
         else:
@@ -1731,7 +1838,6 @@ def unretire_subject_route():
         return jsonify({'status': 'error', 'message': 'Subject name is required.'}), 400
 
     try:
-        from db import unretire_subject
         success = unretire_subject(username, subject_name)
         if success:
             return jsonify({'status': 'success', 'message': f'Subject "{subject_name}" has been restored.'})
@@ -1740,6 +1846,43 @@ def unretire_subject_route():
     except Exception as e:
         return jsonify({'status': 'error', 'message': f'Failed to restore subject: {str(e)}'}), 500
 
+@app.route('/set_subject_term', methods=['POST'])
+@login_required
+def set_subject_term_route():
+    """Tag a subject with a term (an empty term clears it)."""
+    subject_name = request.form.get('subject_name')
+    term = request.form.get('term', '').strip()
+    username = current_user.username
+
+    if not subject_name:
+        return jsonify({'status': 'error', 'message': 'Subject name is required.'}), 400
+
+    try:
+        if set_subject_term(username, subject_name, term):
+            return jsonify({'status': 'success', 'message': f'Subject "{subject_name}" moved to term "{term}".' if term
+                            else f'Subject "{subject_name}" has no term.'})
+        return jsonify({'status': 'error', 'message': f'Subject "{subject_name}" not found.'}), 404
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': f'Failed to set term: {str(e)}'}), 500
+
+@app.route('/close_term', methods=['POST'])
+@login_required
+def close_term_route():
+    """Retire (and archive, unless archive=false) every subject of a term in one go."""
+    term = request.form.get('term', '').strip()
+    archive = request.form.get('archive', 'true').lower() == 'true'
+    username = current_user.username
+
+    if not term:
+        return jsonify({'status': 'error', 'message': 'Term is required.'}), 400
+
+    try:
+        subjects = close_term(username, term, archive=archive)
+        return jsonify({'status': 'success', 'subjects': subjects,
+                        'message': f'Term "{term}" closed: {len(subjects)} subject(s) retired.'})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': f'Failed to close term: {str(e)}'}), 500
+
 @app.route('/predict_subject', methods=['POST'])
 @login_required
 def predict_subject():
@@ -1751,13 +1894,8 @@ def predict_subject():
     study_time_str = request.form.get('study_time')
     username = current_user.username
     
-    # Increment prediction run counters (total and per-subject)
-    try:
-        increment_prediction_run_count(username)
-        if subject:
-            increment_subject_prediction_count(username, subject)
-    except Exception as e:
-        print(f"Warning: Failed to increment prediction count: {e}")
+    # Count the prediction run (total and per-subject, buffered)
+    prediction_counts.add(username, subject)
     
     if not subject:
         return jsonify({'status': 'error', 'message': 'Subject is required.'}), 400
@@ -1784,31 +1922,20 @@ def predict_subject():
         })
 
     # Fetch data for k estimation
-    all_grades = get_all_grades(username)
-    subject_data = [log for log in all_grades if log['subject'] == subject]
-    
     # Include predictions in k estimation ONLY if use_predictions is True (subject predictor with "Show Predictions" on)
-    if use_predictions:
-        graded_items = [log for log in subject_data if log.get('grade') is not None]
-    else:
-        graded_items = [log for log in subject_data if log.get('grade') is not None and not log.get('is_prediction')]
+    graded_items = get_grade_columns(username, subject=subject, graded_only=True,
+                                     include_predictions=bool(use_predictions))
 
     # Estimate k for the subject
     def get_k(data):
         if len(data) < 2: return 0.3 # Default
-        hours = [log['study_time'] for log in data]
-        grades = [log['grade'] for log in data]
-        weights = [log['weight'] / 100 for log in data]
-        return estimate_k(hours, grades, weights)
+        return estimate_k_columns(data, data.rows())
 
     if len(graded_items) >= 2:
         k = get_k(graded_items)
     else:
         # Fallback to all data
-        if use_predictions:
-            all_graded = [log for log in all_grades if log.get('grade') is not None]
-        else:
-            all_graded = [log for log in all_grades if log.get('grade') is not None and not log.get('is_prediction')]
+        all_graded = get_grade_columns(username, graded_only=True, include_predictions=bool(use_predictions))
         k = get_k(all_graded)
 
     response_data = {
@@ -1879,6 +2006,91 @@ def predict_subject():
 
     return jsonify(response_data)
 
+# /api/grades page sizes
+GRADES_PAGE_SIZE = 50
+GRADES_MAX_PAGE_SIZE = 200
+
+def _encode_cursor(after):
+    """Opaque page token for a (sort value, id) keyset position."""
+    return base64.urlsafe_b64encode(json.dumps(list(after)).encode()).decode()
+
+def _decode_cursor(token):
+    """Inverse of _encode_cursor; raises ValueError on a malformed token."""
+    try:
+        after = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise ValueError('invalid cursor')
+    if (not isinstance(after, list) or len(after) != 2 or not isinstance(after[1], int)
+            or not isinstance(after[0], (int, float, str))):
+        raise ValueError('invalid cursor')
+    return tuple(after)
+
+@app.get("/api/grades")
+@login_required
+def api_grades():
+    """
+    Keyset-paginated gradebook rows.
+
+    Query params: subject, category, graded=graded|ungraded,
+    include_predictions=true|false, sort=position|name|study_time|weight|grade,
+    order=asc|desc, limit (default 50, max 200), cursor (next_cursor from the
+    previous page). Returns {grades, next_cursor, has_more}.
+    """
+    try:
+        params = grades_page_params(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    grades, next_after = get_grades_page(current_user.username, **params)
+    return jsonify(grades_page_response(grades, next_after))
+
+def grades_page_params(args):
+    """
+    get_grades_page keyword arguments from /api/grades query parameters.
+    Raises ValueError with the message for the 400 response.
+    """
+    try:
+        limit = int(args.get('limit', GRADES_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer.')
+    if limit < 1:
+        raise ValueError('limit must be positive.')
+    limit = min(limit, GRADES_MAX_PAGE_SIZE)
+
+    sort = args.get('sort', 'position')
+    if sort not in GRADE_SORT_KEYS:
+        raise ValueError(f'Unknown sort: {sort}')
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc.')
+    graded = args.get('graded')
+    if graded not in (None, '', 'graded', 'ungraded'):
+        raise ValueError('graded must be graded or ungraded.')
+
+    after = _decode_cursor(args['cursor']) if args.get('cursor') else None
+
+    subject = args.get('subject') or None
+    if subject == 'all':
+        subject = None
+    category = args.get('category') or None
+    if category == 'all':
+        category = None
+
+    return dict(
+        limit=limit, after=after, sort=sort, descending=(order == 'desc'),
+        subject=subject, category=category,
+        graded_only=(graded == 'graded'), ungraded_only=(graded == 'ungraded'),
+        include_predictions=args.get('include_predictions', 'true').lower() != 'false',
+    )
+
+def grades_page_response(grades, next_after):
+    """/api/grades response body for one page."""
+    return {
+        'status': 'success',
+        'grades': grades,
+        'next_cursor': _encode_cursor(next_after) if next_after else None,
+        'has_more': next_after is not None,
+    }
+
 @app.post("/api/assignments/reorder")
 @login_required
 def reorder_assignments():
@@ -1899,50 +2111,30 @@ def reorder_assignments():
 
     username = current_user.username
 
-    conn = _connect()
-    cur = conn.cursor()
     try:
-        # ---------- (1) Optional ownership check ----------
-        # IMPORTANT: build explicit placeholders for IN (...)
-        in_placeholders = ",".join(["%s"] * len(ids))
-        q = f"""
-            SELECT id
-            FROM {TABLE_NAME}
-            WHERE username=%s AND id IN ({in_placeholders})
-        """
-        cur.execute(q, (username, *ids))
-        owned = {row[0] for row in cur.fetchall()}
-        if len(owned) != len(set(ids)):
-            return jsonify({"status": "error",
-                            "message": "contains ids not owned by user"}), 400
-
-        # ---------- (2) Build CASE fragment ----------
-        # CASE id WHEN <id> THEN <pos> ...
-        case_frag = " ".join(["WHEN %s THEN %s"] * len(ids))
-        params = []
-        for pos, _id in enumerate(ids):
-            params.extend([_id, pos])   # id, position
-
-        # ---------- (3) UPDATE with IN (...) placeholders ----------
-        sql = f"""
-            UPDATE {TABLE_NAME}
-            SET Position = CASE id {case_frag} END
-            WHERE username=%s AND id IN ({in_placeholders})
-        """
-        params.extend([username, *ids])
-
-        cur.execute(sql, params)
-        conn.commit()
-        return jsonify({"status": "ok", "updated": cur.rowcount}), 200
-
+        updated = reorder_grades(username, ids)
+        return jsonify({"status": "ok", "updated": updated}), 200
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
-        conn.rollback()
         # log for server console; keeps response terse
         print("Reorder error:", e)
         return jsonify({"status": "error", "message": "server error"}), 500
-    finally:
-        cur.close()
-        conn.close()
+
+@app.get("/api/jobs/<int:job_id>")
+@login_required
+def job_status(job_id):
+    """Progress of one of the user's background jobs (e.g. a subject delete)."""
+    job = get_job(job_id, owner=current_user.username)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found.'}), 404
+    return jsonify({'status': 'success', 'job': job.to_json()})
+
+@app.get("/api/predict_cache")
+@login_required
+def predict_cache_stats():
+    """Hit/miss counters of this process's /predict response cache."""
+    return jsonify({'status': 'success', 'cache': prediction_cache.stats()})
 
 @app.route('/api/grade_lock/get', methods=['GET'])
 @login_required
@@ -1952,8 +2144,7 @@ def get_grade_lock_preferences():
     Returns: {"status": "success", "preferences": {"Math": true, "Science": false, ...}}
     """
     try:
-        from db import get_grade_lock_preferences as get_prefs
-        preferences = get_prefs(current_user.username)
+        preferences = crud_get_grade_lock_preferences(current_user.username)
         return jsonify({
             'status': 'success',
             'preferences': preferences
@@ -1990,8 +2181,7 @@ def set_grade_lock_preference():
                 'message': 'grade_lock is required'
             }), 400
         
-        from db import set_grade_lock_preference as set_pref
-        set_pref(current_user.username, subject, bool(grade_lock))
+        crud_set_grade_lock_preference(current_user.username, subject, bool(grade_lock))
         
         return jsonify({
             'status': 'success',
@@ -2047,22 +2237,27 @@ def serve_static(filename):
 
 
 # --- Bootstrap DB once (Flask 3.x compatible) ---
+# Threaded workers (gunicorn gthread, or gevent with monkey-patched locks) can
+# serve several first requests at once; the lock makes them wait for a single
+# init_db() instead of each running the migrations.
 _schema_initialized = False
+_schema_lock = threading.Lock()
 
 def _ensure_schema():
-    """Ensure database schema is initialized (idempotent)."""
+    """Ensure database schema is initialized (idempotent, once per process)."""
     global _schema_initialized
     if _schema_initialized:
         return
-    try:
-        init_db()                 # creates DB/tables if missing
-        ensure_position_column()  # adds Position + index, backfills
-        ensure_prediction_run_count_column()  # adds prediction_run_count to users table
-        ensure_subject_prediction_count_column()  # adds prediction_count to user_preferences table
-        _schema_initialized = True
-    except Exception as e:
-        app.logger.exception("DB bootstrap failed: %s", e)
-        # Don't raise - let individual routes handle DB errors
+    with _schema_lock:
+        if _schema_initialized:
+            return
+        try:
+            init_db()                 # creates tables if missing and runs column migrations
+            _schema_initialized = True
+            resume_subject_deletes()  # background deletes cut short by a restart
+        except Exception as e:
+            app.logger.exception("DB bootstrap failed: %s", e)
+            # Don't raise - let individual routes handle DB errors
 
 @app.before_request
 def _bootstrap_db_once():
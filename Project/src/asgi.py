@@ -0,0 +1,189 @@
+# ASGI entry point
+#
+# Serves the app from an event loop (uvicorn, hypercorn, gunicorn's uvicorn
+# worker) so one process can keep many requests in flight while they wait on
+# the database:
+#
+#   cd src && uvicorn asgi:application --port 5000
+#
+# The hot JSON endpoints are handled natively with coroutines over
+# async_crud.py. Every other route - pages, forms, predictions, login - is
+# passed to the Flask app through asgiref's WSGI adapter, which runs it on a
+# thread, so the ASGI app behaves exactly like the WSGI one.
+#
+# Native handlers authenticate from the Flask session cookie (the user id
+# flask-login stores there). A request without a valid session is handed to
+# Flask as well, which answers it the usual way (remember-me cookie or the
+# login redirect).
+
+import asyncio
+
+from asgiref.wsgi import WsgiToAsgi
+from itsdangerous import BadSignature
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_accept_header, parse_cookie
+from urllib.parse import parse_qsl
+
+import app as app_module
+import async_crud
+
+flask_app = app_module.app
+wsgi = WsgiToAsgi(flask_app)
+
+
+class Request:
+    """The parts of an ASGI HTTP request the native handlers need."""
+
+    def __init__(self, scope, headers, body, username):
+        self.scope = scope
+        self.headers = headers
+        self.args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+        self.body = body
+        self.username = username
+
+    def get_json(self):
+        """Parsed JSON body, or None if it isn't valid JSON."""
+        try:
+            return flask_app.json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+
+# --- native handlers ------------------------------------------------------------
+
+async def api_grades(request):
+    """Async GET /api/grades (see app.api_grades)."""
+    try:
+        params = app_module.grades_page_params(request.args)
+    except ValueError as e:
+        return {'status': 'error', 'message': str(e)}, 400
+    grades, next_after = await async_crud.get_grades_page(request.username, **params)
+    return app_module.grades_page_response(grades, next_after), 200
+
+
+async def get_grade_lock_preferences(request):
+    """Async GET /api/grade_lock/get (see app.get_grade_lock_preferences)."""
+    try:
+        preferences = await async_crud.get_grade_lock_preferences(request.username)
+        return {'status': 'success', 'preferences': preferences}, 200
+    except Exception as e:
+        print(f"Error getting grade lock preferences: {e}")
+        return {'status': 'error', 'message': 'Failed to retrieve grade lock preferences'}, 500
+
+
+async def set_grade_lock_preference(request):
+    """Async POST /api/grade_lock/set (see app.set_grade_lock_preference)."""
+    try:
+        data = request.get_json() or {}
+        subject = data.get('subject')
+        grade_lock = data.get('grade_lock')
+        if not subject:
+            return {'status': 'error', 'message': 'Subject is required'}, 400
+        if grade_lock is None:
+            return {'status': 'error', 'message': 'grade_lock is required'}, 400
+        await async_crud.set_grade_lock_preference(request.username, subject, bool(grade_lock))
+        return {'status': 'success', 'message': f'Grade lock for {subject} updated'}, 200
+    except Exception as e:
+        print(f"Error setting grade lock preference: {e}")
+        return {'status': 'error', 'message': 'Failed to update grade lock preference'}, 500
+
+
+# (method, path) -> handler
+ROUTES = {
+    ('GET', '/api/grades'): api_grades,
+    ('GET', '/api/grade_lock/get'): get_grade_lock_preferences,
+    ('POST', '/api/grade_lock/set'): set_grade_lock_preference,
+}
+
+
+# --- plumbing --------------------------------------------------------------------
+
+def _session_user_id(headers):
+    """The flask-login user id in the request's session cookie, or None."""
+    cookie = parse_cookie(headers.get('cookie', '')).get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return None
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        session = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return session.get('_user_id')
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def _replay(body, receive):
+    """A receive callable that hands an already-read body on to the WSGI adapter."""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return await receive()
+
+    return replay
+
+
+async def _send_json(send, headers, obj, status):
+    """Send a JSON response, compressed like the Flask app would (see compression.py)."""
+    body = flask_app.json.dumps(obj).encode() + b"\n"
+    response_headers = [(b'content-type', b'application/json')]
+    compressor = flask_app.extensions.get('compression')
+    if compressor is not None and compressor.config['COMPRESS_ENABLED'] and status == 200:
+        response_headers.append((b'vary', b'Accept-Encoding'))
+        encoding = compressor.choose_encoding(parse_accept_header(headers.get('accept-encoding')))
+        if encoding and len(body) >= compressor.config['COMPRESS_MIN_SIZE']:
+            body = compressor.compress(body, encoding)
+            response_headers.append((b'content-encoding', encoding.encode()))
+    response_headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await async_crud.open_pool()
+            except Exception as e:
+                # Like the schema bootstrap, don't fail startup: the pool is
+                # opened again by the first native request
+                flask_app.logger.exception("Async DB pool failed to open: %s", e)
+            await asyncio.to_thread(app_module._ensure_schema)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_crud.close_pool()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI callable: native handlers for ROUTES, the Flask app for the rest."""
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    handler = ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+    if handler is None:
+        return await wsgi(scope, receive, send)
+
+    if not app_module._schema_initialized:
+        await asyncio.to_thread(app_module._ensure_schema)
+    headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+    body = await _read_body(receive)
+    user_id = _session_user_id(headers)
+    user = await async_crud.get_user_by_id(user_id) if user_id else None
+    if user is None:
+        return await wsgi(scope, _replay(body, receive), send)
+
+    obj, status = await handler(Request(scope, headers, body, user['username']))
+    await _send_json(send, headers, obj, status)
@@ -0,0 +1,140 @@
+# Async CRUD operations for the ASGI entry point (asgi.py)
+#
+# Coroutine versions of the hot crud.py reads (grades, categories, subjects,
+# the user lookup behind the session) and of the grade lock preferences.
+# Grade, category and subject writes stay on the Flask routes and sync
+# crud.py, which also recalculate weights and refresh stored predictions.
+# While one request waits on the database the event loop serves others, so a
+# single process can hold many requests in flight. The SQL, the row
+# conversions and the return values are the ones from crud.py; only the
+# driver differs (see async_storage.py).
+
+import crud
+from crud import (TABLE_NAME, CATEGORIES_TABLE, SUBJECTS_TABLE, USERS_TABLE, USER_PREFERENCES_TABLE,
+                  GRADE_COLUMNS, VISIBLE_SUBJECT)
+from records import GradeRecord
+from async_storage import get_async_storage
+
+storage = get_async_storage()
+
+
+async def open_pool():
+    await storage.open()
+
+
+async def close_pool():
+    await storage.close()
+
+
+# ============================================================================
+# Users
+# ============================================================================
+
+async def get_user_by_id(user_id):
+    """Async crud.get_user_by_id."""
+    row = await storage.fetchone(f"SELECT {crud.USER_COLUMNS} FROM {USERS_TABLE} WHERE id = %s", (int(user_id),))
+    return crud._user_from_row(row)
+
+
+# ============================================================================
+# Grades
+# ============================================================================
+
+async def get_grades(username, subject=None, category=None, graded_only=False, ungraded_only=False,
+                     include_predictions=True, exclude_id=None):
+    """Async crud.get_grades."""
+    conditions, params = crud._grade_filters(username, subject, category, graded_only, ungraded_only,
+                                             include_predictions, exclude_id)
+    rows = await storage.fetchall(
+        f"""SELECT {GRADE_COLUMNS}
+            FROM {TABLE_NAME}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY Position ASC, id ASC""",
+        params
+    )
+    return [GradeRecord.from_row(row) for row in rows]
+
+
+async def get_grades_page(username, limit, after=None, sort='position', descending=False, subject=None,
+                          category=None, graded_only=False, ungraded_only=False, include_predictions=True):
+    """Async crud.get_grades_page; returns (grades, next_after)."""
+    query, params = crud._grades_page_query(username, limit, after, sort, descending, subject, category,
+                                            graded_only, ungraded_only, include_predictions)
+    return crud._grades_page(await storage.fetchall(query, params), limit)
+
+
+async def get_grade_by_id(username, grade_id):
+    """Async crud.get_grade_by_id."""
+    row = await storage.fetchone(
+        f"SELECT {GRADE_COLUMNS} FROM {TABLE_NAME} WHERE id = %s AND username = %s",
+        (grade_id, username)
+    )
+    return GradeRecord.from_row(row) if row else None
+
+
+# ============================================================================
+# Categories
+# ============================================================================
+
+async def get_all_categories(username, subject=None):
+    """Async crud.get_all_categories."""
+    if subject:
+        rows = await storage.fetchall(
+            f"SELECT * FROM {CATEGORIES_TABLE} WHERE username = %s AND Subject = %s ORDER BY CategoryName",
+            (username, subject), dictionary=True)
+    else:
+        rows = await storage.fetchall(
+            f"SELECT * FROM {CATEGORIES_TABLE} WHERE username = %s ORDER BY Subject, CategoryName",
+            (username,), dictionary=True)
+    return [crud._category_from_row(row) for row in rows]
+
+
+async def get_categories_as_dict(username):
+    """Async crud.get_categories_as_dict."""
+    return crud._categories_by_subject(await get_all_categories(username))
+
+
+# ============================================================================
+# Subjects
+# ============================================================================
+
+async def get_all_subjects(username, include_retired=False):
+    """Async crud.get_all_subjects."""
+    if include_retired:
+        query = f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s AND {VISIBLE_SUBJECT} ORDER BY name"
+    else:
+        query = (f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s "
+                 f"AND (is_retired = FALSE OR is_retired IS NULL) AND {VISIBLE_SUBJECT} ORDER BY name")
+    rows = await storage.fetchall(query, (username,), dictionary=True)
+    return [crud._subject_from_row(row) for row in rows]
+
+
+async def get_subject_names(username):
+    """Async crud.get_subject_names."""
+    rows = await storage.fetchall(
+        f"SELECT name FROM {SUBJECTS_TABLE} WHERE username = %s AND {VISIBLE_SUBJECT} ORDER BY name", (username,)
+    )
+    return [row[0] for row in rows]
+
+
+# ============================================================================
+# Preferences
+# ============================================================================
+
+async def get_grade_lock_preferences(username):
+    """Async crud.get_grade_lock_preferences: {subject: grade_lock}."""
+    rows = await storage.fetchall(
+        f"SELECT subject, grade_lock FROM {USER_PREFERENCES_TABLE} WHERE username = %s", (username,)
+    )
+    return {subject: bool(grade_lock) for subject, grade_lock in rows}
+
+
+async def set_grade_lock_preference(username, subject, grade_lock):
+    """Async crud.set_grade_lock_preference."""
+    await storage.execute(
+        crud.storage.upsert_sql(USER_PREFERENCES_TABLE,
+                                ['username', 'subject', 'grade_lock'],
+                                ['username', 'subject'],
+                                {'grade_lock': crud.storage.excluded('grade_lock')}),
+        (username, subject, grade_lock)
+    )
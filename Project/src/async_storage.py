@@ -0,0 +1,239 @@
+# Async storage backends for the ASGI entry point
+#
+# async_crud.py talks to the database through the backend returned by
+# get_async_storage(), the async counterpart of storage.get_storage():
+#   mysql          - aiomysql connection pool against the db.py server
+#   sqlite/memory  - aiosqlite connections to the db_local.py database, the
+#                    local stand-in for development and tests
+# The backend follows DB_BACKEND like the sync one, and the SQL is the same
+# portable %s-placeholder SQL that crud.py uses (SQLite placeholders are
+# translated by db_local._translate).
+#
+# Pools belong to the event loop that created them; the ASGI app opens one at
+# lifespan startup and closes it at shutdown. A pool created on another loop
+# (e.g. a second asyncio.run()) is replaced on first use. Settings:
+#
+#   ASYNC_DB_POOL_SIZE  connections per process (default 10)
+#
+# Connections run in autocommit mode, so a pooled connection never holds a
+# stale read snapshot between requests. On the in-memory database every
+# borrowed connection holds db_local._memory_lock, like a sync unit of work.
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+
+try:
+    import aiomysql
+except ImportError:  # optional dependency
+    aiomysql = None
+
+try:
+    import aiosqlite
+except ImportError:  # optional dependency
+    aiosqlite = None
+
+from storage import backend_name
+
+POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "10"))
+
+
+class AsyncStorage(ABC):
+    """
+    Interface shared by the async backends.
+
+    fetchall/fetchone/execute each borrow a pooled connection for a single
+    statement. Subclasses implement the pool and connection methods.
+    """
+    name = None
+
+    def __init__(self, pool_size=POOL_SIZE):
+        self.pool_size = pool_size
+        self._pool = None
+        self._loop = None
+        self._pool_lock = None
+
+    @abstractmethod
+    async def _open_pool(self):
+        """Create this backend's connection pool."""
+
+    @abstractmethod
+    async def _close_pool(self, pool):
+        """Close every connection of `pool`."""
+
+    async def open(self):
+        """Create the pool for the running event loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._pool is not None and self._loop is loop:
+            return self._pool
+        if self._loop is not loop:
+            self._pool, self._loop, self._pool_lock = None, loop, asyncio.Lock()
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await self._open_pool()
+        return self._pool
+
+    async def close(self):
+        """Close the pool (the next query opens a new one)."""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            await self._close_pool(pool)
+
+    @abstractmethod
+    def connection(self):
+        """Async context manager borrowing one connection from the pool."""
+
+    # --- single statements ------------------------------------------------------
+
+    async def fetchall(self, query, params=(), dictionary=False):
+        async with self.connection() as conn:
+            return await conn.fetchall(query, params, dictionary)
+
+    async def fetchone(self, query, params=(), dictionary=False):
+        async with self.connection() as conn:
+            return await conn.fetchone(query, params, dictionary)
+
+    async def execute(self, query, params=()):
+        """Run a write; returns (rowcount, lastrowid)."""
+        async with self.connection() as conn:
+            return await conn.execute(query, params)
+
+
+class _MySQLConnection:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def fetchall(self, query, params, dictionary):
+        cursor_class = aiomysql.DictCursor if dictionary else aiomysql.Cursor
+        async with self.conn.cursor(cursor_class) as curs:
+            await curs.execute(query, params)
+            return await curs.fetchall()
+
+    async def fetchone(self, query, params, dictionary):
+        cursor_class = aiomysql.DictCursor if dictionary else aiomysql.Cursor
+        async with self.conn.cursor(cursor_class) as curs:
+            await curs.execute(query, params)
+            return await curs.fetchone()
+
+    async def execute(self, query, params):
+        async with self.conn.cursor() as curs:
+            await curs.execute(query, params)
+            return curs.rowcount, curs.lastrowid
+
+
+class AsyncMySQLStorage(AsyncStorage):
+    name = 'mysql'
+
+    async def _open_pool(self):
+        if aiomysql is None:
+            raise RuntimeError("the async MySQL backend needs aiomysql (pip install aiomysql)")
+        import db
+        return await aiomysql.create_pool(
+            host=db.DB_HOST, user=db.DB_USER, password=db.DB_PASS, db=db.DB_NAME,
+            minsize=1, maxsize=self.pool_size, autocommit=True,
+        )
+
+    async def _close_pool(self, pool):
+        pool.close()
+        await pool.wait_closed()
+
+    @asynccontextmanager
+    async def connection(self):
+        pool = await self.open()
+        async with pool.acquire() as conn:
+            yield _MySQLConnection(conn)
+
+
+class _SQLiteConnection:
+    def __init__(self, conn, translate):
+        self.conn = conn
+        self.translate = translate
+
+    async def fetchall(self, query, params, dictionary):
+        async with self.conn.execute(self.translate(query), tuple(params)) as curs:
+            rows = await curs.fetchall()
+            if dictionary:
+                names = [col[0] for col in curs.description]
+                return [dict(zip(names, row)) for row in rows]
+            return rows
+
+    async def fetchone(self, query, params, dictionary):
+        async with self.conn.execute(self.translate(query), tuple(params)) as curs:
+            row = await curs.fetchone()
+            if dictionary and row is not None:
+                return dict(zip([col[0] for col in curs.description], row))
+            return row
+
+    async def execute(self, query, params):
+        async with self.conn.execute(self.translate(query), tuple(params)) as curs:
+            return curs.rowcount, curs.lastrowid
+
+
+class AsyncSQLiteStorage(AsyncStorage):
+    """
+    aiosqlite stand-in for local development and tests.
+
+    Each aiosqlite connection runs its statements on its own thread, so a pool
+    of them still lets requests overlap. The in-memory database gets a single
+    connection: its shared-cache table locks fail instead of waiting, so it
+    also takes db_local._memory_lock while borrowed. That lock is re-entrant
+    and owned by a thread, so it is acquired and released on one helper thread.
+    """
+    name = 'sqlite'
+
+    async def _open_pool(self):
+        if aiosqlite is None:
+            raise RuntimeError("the async SQLite backend needs aiosqlite (pip install aiosqlite)")
+        import db_local
+        size = 1 if db_local.IN_MEMORY else self.pool_size
+        pool = asyncio.Queue()
+        for _ in range(size):
+            if db_local.IN_MEMORY:
+                conn = await aiosqlite.connect(db_local.MEMORY_DB_URI, uri=True,
+                                               timeout=db_local.BUSY_TIMEOUT, isolation_level=None)
+            else:
+                conn = await aiosqlite.connect(db_local.DB_FILE, timeout=db_local.BUSY_TIMEOUT,
+                                               isolation_level=None)
+                for name, value in db_local.SQLITE_PRAGMAS:
+                    await conn.execute(f"PRAGMA {name}={value}")
+            pool.put_nowait(conn)
+        pool.connections = size
+        pool.lock_thread = ThreadPoolExecutor(1, thread_name_prefix='memory-lock') if db_local.IN_MEMORY else None
+        return pool
+
+    async def _close_pool(self, pool):
+        for _ in range(pool.connections):
+            conn = await pool.get()
+            await conn.close()
+        if pool.lock_thread is not None:
+            pool.lock_thread.shutdown()
+
+    @asynccontextmanager
+    async def connection(self):
+        import db_local
+        pool = await self.open()
+        conn = await pool.get()
+        try:
+            if pool.lock_thread is None:
+                yield _SQLiteConnection(conn, db_local._translate)
+                return
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(pool.lock_thread, db_local._memory_lock.acquire)
+            try:
+                yield _SQLiteConnection(conn, db_local._translate)
+            finally:
+                await loop.run_in_executor(pool.lock_thread, db_local._memory_lock.release)
+        finally:
+            pool.put_nowait(conn)
+
+
+def get_async_storage(name=None):
+    """Create the async backend called `name` (default: from the environment)."""
+    name = name or backend_name()
+    if name == 'mysql':
+        return AsyncMySQLStorage()
+    if name in ('sqlite', 'memory'):
+        return AsyncSQLiteStorage()
+    raise ValueError(f"Unknown DB_BACKEND '{name}' (expected mysql, sqlite or memory)")
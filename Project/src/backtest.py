@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Prediction backtest
+#
+# Measures prediction quality across all users. Each user's graded
+# assessments are replayed in the order they were entered: every assessment
+# is predicted from the ones before it, with the k estimation (trimmed_k) and
+# scope blending (blend_k) that /predict uses, and compared with the grade it
+# got. Errors are reported as MAE and bias (mean of predicted - actual) for
+# every combination of the settings below, overall and by the scope the
+# prediction came from (category, subject or all data). Users are spread over
+# a process pool; it reads a SQLite snapshot of the database, never the live one,
+# and opens it read-only (no journal files are created next to it).
+#
+#   python3 src/backtest.py snapshot.db                     # current settings
+#   python3 src/backtest.py snapshot.db --subject-thresholds 3 5 8 \
+#       --category-thresholds 3 5 8 --trims 0 0.1 0.2 0.3 --processes 4
+#   python3 src/backtest.py snapshot.db --users alice bob
+#
+#   BACKTEST_PROCESSES   default pool size (default: CPU count, at most 8)
+#
+# The in-memory backend lives in one process, so it always runs inline.
+
+import argparse
+import multiprocessing
+import os
+import sys
+from array import array
+from bisect import insort
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product, repeat
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if __name__ == "__main__":
+    # Snapshots are SQLite files: pick the backend before crud is imported
+    # (worker processes inherit the environment)
+    os.environ["DB_BACKEND"] = "sqlite"
+
+import crud
+from app import (SUBJECT_THRESHOLD, CATEGORY_THRESHOLD, K_TRIM_FRACTION, trimmed_k, blend_k,
+                 predict_grade)
+
+BACKTEST_PROCESSES = int(os.getenv("BACKTEST_PROCESSES", str(min(8, os.cpu_count() or 1))))
+SCOPES = ('category', 'subject', 'all')
+
+
+def _init_worker(db_file, read_only):
+    """Point a worker at the snapshot (it may have been switched with use_database)."""
+    if db_file:
+        crud.storage.module.use_database(db_file, read_only=read_only)
+
+
+def backtest_user(username, settings):
+    """
+    Replay one user's history. `settings` is a list of (subject_threshold,
+    category_threshold, trim) tuples. Returns {(setting, scope): [count,
+    sum of |error|, sum of error]} where error = predicted - actual grade.
+    """
+    columns = crud.get_grade_columns(username, graded_only=True, include_predictions=False,
+                                     include_archived=True)
+    by_trim = {}
+    for setting in settings:
+        by_trim.setdefault(setting[2], []).append(setting)
+
+    samples = {}        # scope key -> sorted k samples of the history so far
+    counts = Counter()  # scope key -> graded assessments in the history so far
+    results = {}
+    # ids grow as assessments are entered (Position is the display order)
+    for i in sorted(range(len(columns)), key=lambda i: columns.ids[i]):
+        subject, category = columns.categories[columns.category_codes[i]]
+        keys = ('all', ('subject', subject), ('category', subject, category))
+        hours, grade, weight = columns.hours[i], columns.grades[i], columns.weights[i]
+
+        if counts['all'] and hours > 0:
+            n_subject, n_category = counts[keys[1]], counts[keys[2]]
+            for trim, trim_settings in by_trim.items():
+                k_all, k_subject, k_category = (trimmed_k(samples.get(key, []), trim=trim) for key in keys)
+                for setting in trim_settings:
+                    k, scope = blend_k(k_all, k_subject, k_category, n_subject, n_category,
+                                       subject_threshold=setting[0], category_threshold=setting[1])
+                    error = predict_grade(hours, weight / 100, k) - grade
+                    totals = results.setdefault((setting, scope), [0, 0.0, 0.0])
+                    totals[0] += 1
+                    totals[1] += abs(error)
+                    totals[2] += error
+
+        # The assessment joins the history of the ones after it
+        sample = columns.k_values(array('l', [i]))
+        for key in keys:
+            counts[key] += 1
+            if sample:
+                insort(samples.setdefault(key, []), sample[0])
+    return results
+
+
+def backtest(settings, usernames=None, processes=None):
+    """
+    Backtest every user in `usernames` (default: everyone with graded
+    assessments) under each of `settings`. Returns {(setting, scope):
+    [count, sum of |error|, sum of error]} summed over the users.
+    """
+    if usernames is None:
+        usernames = crud.get_graded_users(include_archived=True)
+    if processes is None:
+        processes = BACKTEST_PROCESSES
+    processes = min(processes, len(usernames))
+    in_memory = getattr(crud.storage.module, 'IN_MEMORY', False)
+    if processes <= 1 or in_memory:
+        per_user = [backtest_user(username, settings) for username in usernames]
+    else:
+        db_file, read_only = None, False
+        if crud.storage.name == 'sqlite':
+            db_file, read_only = crud.storage.module.DB_FILE, crud.storage.module.READ_ONLY
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(db_file, read_only)) as pool:
+            chunksize = max(1, len(usernames) // (processes * 4))
+            per_user = list(pool.map(backtest_user, usernames, repeat(settings), chunksize=chunksize))
+
+    results = {}
+    for user_results in per_user:
+        for key, (count, abs_sum, err_sum) in user_results.items():
+            totals = results.setdefault(key, [0, 0.0, 0.0])
+            totals[0] += count
+            totals[1] += abs_sum
+            totals[2] += err_sum
+    return results
+
+
+def summarize(results, settings):
+    """
+    One row per setting, best MAE first: {'setting', 'count', 'mae', 'bias',
+    'scopes': {scope: {'count', 'mae', 'bias'}}}.
+    """
+    def stats(count, abs_sum, err_sum):
+        return {'count': count, 'mae': abs_sum / count if count else None,
+                'bias': err_sum / count if count else None}
+
+    rows = []
+    for setting in settings:
+        scopes = {scope: results[(setting, scope)] for scope in SCOPES if (setting, scope) in results}
+        total = [sum(values[n] for values in scopes.values()) for n in range(3)]
+        rows.append(dict(stats(*total), setting=setting,
+                         scopes={scope: stats(*values) for scope, values in scopes.items()}))
+    rows.sort(key=lambda row: float('inf') if row['mae'] is None else row['mae'])
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay users' grade histories and report prediction error.")
+    parser.add_argument('snapshot', help="SQLite snapshot of the database.")
+    parser.add_argument('--users', nargs='+', help="Only these users (default: everyone with graded assessments).")
+    parser.add_argument('--subject-thresholds', nargs='+', type=float, default=[SUBJECT_THRESHOLD],
+                        help=f"SUBJECT_THRESHOLD values to try (default {SUBJECT_THRESHOLD}).")
+    parser.add_argument('--category-thresholds', nargs='+', type=float, default=[CATEGORY_THRESHOLD],
+                        help=f"CATEGORY_THRESHOLD values to try (default {CATEGORY_THRESHOLD}).")
+    parser.add_argument('--trims', nargs='+', type=float, default=[K_TRIM_FRACTION],
+                        help=f"Trim fractions for the k samples (default {K_TRIM_FRACTION}).")
+    parser.add_argument('--processes', type=int, help=f"Worker processes (default {BACKTEST_PROCESSES}).")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.snapshot):
+        parser.error(f"no such file: {args.snapshot}")
+    crud.storage.module.use_database(args.snapshot, read_only=True)
+    settings = list(product(args.subject_thresholds, args.category_thresholds, args.trims))
+    current = (SUBJECT_THRESHOLD, CATEGORY_THRESHOLD, K_TRIM_FRACTION)
+
+    rows = summarize(backtest(settings, args.users, args.processes), settings)
+    print(f"{'subject':>8} {'category':>9} {'trim':>5}  {'scope':<9} {'n':>7} {'MAE':>7} {'bias':>7}")
+    for row in rows:
+        subject_threshold, category_threshold, trim = row['setting']
+        marker = '*' if row['setting'] == current else ' '
+        lines = [('total', row)] + list(row['scopes'].items())
+        for scope, values in lines:
+            mae = f"{values['mae']:7.2f}" if values['count'] else f"{'-':>7}"
+            bias = f"{values['bias']:+7.2f}" if values['count'] else f"{'-':>7}"
+            print(f"{subject_threshold:>8g} {category_threshold:>9g} {trim:>5g}{marker} {scope:<9} "
+                  f"{values['count']:>7} {mae} {bias}")
+    print(f"✓ Backtested {len(settings)} setting(s); * marks the current ones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+# Columnar grade data
+#
+# GradeColumns holds a list of grade records as typed column buffers
+# (array.array: hours, grades, weights, predicted grades, prediction flags)
+# plus integer-coded subject and (subject, category) columns, built in one
+# pass. Statistics and k estimation then work on the columns with group-by
+# helpers instead of re-walking dicts and coercing every value with
+# float(x or 0). When numpy is installed the helpers run vectorized over
+# zero-copy views of the same buffers; otherwise they are plain loops.
+#
+# crud.get_grade_columns() builds one straight from the cursor's tuple rows;
+# from_records() converts GradeRecords a route has already fetched. Missing
+# grades and predicted grades are stored as NaN; rows() selections are arrays
+# of row indices.
+#
+# SortedColumn keeps one column of a selection sorted, so the rows nearest a
+# value (similar past assessments) are found by bisection instead of a scan.
+
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+from aggregates import Totals
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+NAN = float('nan')
+FLOAT_COLUMNS = ('hours', 'grades', 'weights', 'predicted')
+
+
+def _index_view(rows):
+    """A row selection as a numpy index array (zero-copy for array('l'), any sequence accepted)."""
+    if isinstance(rows, array) and rows.typecode == 'l':
+        return np.frombuffer(rows, dtype='l')
+    return np.asarray(rows, dtype=np.intp)
+
+
+class GradeColumns:
+    """Column buffers for a list of grade records (see the module comment)."""
+
+    def __init__(self, ids=(), subjects=(), categories=(), hours=(), grades=(), weights=(),
+                 is_prediction=(), predicted=()):
+        self.subjects = []      # subject code -> subject name
+        self.categories = []    # category code -> (subject, category)
+        subject_index = {}
+        category_index = {}
+        subject_rows = []       # subject code -> row indices
+        category_rows = []      # category code -> row indices
+        subject_codes = array('l')
+        category_codes = array('l')
+        for i, (subject, category) in enumerate(zip(subjects, categories)):
+            key = (subject, category or 'Uncategorized')
+            category_code = category_index.get(key)
+            if category_code is None:
+                subject_code = subject_index.get(subject)
+                if subject_code is None:
+                    subject_code = subject_index[subject] = len(self.subjects)
+                    self.subjects.append(subject)
+                    subject_rows.append(array('l'))
+                category_code = category_index[key] = len(self.categories)
+                self.categories.append(key)
+                category_rows.append(array('l'))
+            else:
+                subject_code = subject_index[subject]
+            subject_codes.append(subject_code)
+            category_codes.append(category_code)
+            subject_rows[subject_code].append(i)
+            category_rows[category_code].append(i)
+
+        self.ids = array('q', ids)
+        self.hours = array('d', [float(h or 0) for h in hours])
+        self.grades = array('d', [NAN if g is None else float(g) for g in grades])
+        self.weights = array('d', [float(w or 0) for w in weights])
+        self.predicted = array('d', [NAN if p is None else float(p) for p in predicted])
+        self.is_prediction = array('b', [bool(flag) for flag in is_prediction])
+        self.subject_codes = subject_codes
+        self.category_codes = category_codes
+        self._subject_index = subject_index
+        self._category_index = category_index
+        self._subject_rows = subject_rows
+        self._category_rows = category_rows
+        self._all_rows = array('l', range(len(self.ids)))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from tuple rows in crud.GRADE_COLUMNS order (see crud.get_grade_columns)."""
+        if not rows:
+            return cls()
+        (ids, subjects, categories, hours, _names, grades, weights,
+         is_prediction, predicted, _positions) = zip(*rows)
+        return cls(ids, subjects, categories, hours, grades, weights, is_prediction, predicted)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from GradeRecord objects (e.g. rows already fetched for display)."""
+        return cls(
+            [r.id for r in records],
+            [r.subject for r in records],
+            [r.category for r in records],
+            [r.study_time for r in records],
+            [r.grade for r in records],
+            [r.weight for r in records],
+            [r.is_prediction for r in records],
+            [r.predicted_grade for r in records],
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- row selection --------------------------------------------------------
+
+    def rows(self, subject=None, category=None, graded_only=False, include_predictions=True):
+        """
+        Indices of the rows matching the filters (same meaning as crud.get_grades).
+
+        Unfiltered selections share the column object's own index arrays, so
+        treat the result as read-only.
+        """
+        if subject is None:
+            rows = self._all_rows
+        elif category is None:
+            code = self._subject_index.get(subject)
+            rows = self._subject_rows[code] if code is not None else array('l')
+        else:
+            code = self._category_index.get((subject, category))
+            rows = self._category_rows[code] if code is not None else array('l')
+        if not graded_only and include_predictions:
+            return rows
+        if np is not None and rows:
+            idx = _index_view(rows)
+            mask = np.ones(len(idx), dtype=bool)
+            if graded_only:
+                mask &= ~np.isnan(np.frombuffer(self.grades, dtype='d')[idx])
+            if not include_predictions:
+                mask &= np.frombuffer(self.is_prediction, dtype='b')[idx] == 0
+            return array('l', idx[mask].tobytes())
+        grades = self.grades
+        is_prediction = self.is_prediction
+        return array('l', [
+            i for i in rows
+            if (not graded_only or grades[i] == grades[i])  # NaN != NaN
+            and (include_predictions or not is_prediction[i])
+        ])
+
+    def values(self, column, rows):
+        """Values of one float column for the selected rows, as a list."""
+        data = getattr(self, column)
+        return [data[i] for i in rows]
+
+    # --- aggregation ----------------------------------------------------------
+
+    def _group_codes(self, by):
+        if by == 'subject':
+            return self.subject_codes, self.subjects
+        if by == 'category':
+            return self.category_codes, self.categories
+        raise ValueError(f"Unknown grouping '{by}'")
+
+    def group_sum(self, column, rows, by='subject'):
+        """{group: sum of `column`} over the selected rows, in group code order."""
+        if column not in FLOAT_COLUMNS:
+            raise ValueError(f"Unknown column '{column}'")
+        codes, names = self._group_codes(by)
+        data = getattr(self, column)
+        if np is not None and rows:
+            idx = _index_view(rows)
+            code_view = np.frombuffer(codes, dtype='l')[idx]
+            sums = np.bincount(code_view, weights=np.frombuffer(data, dtype='d')[idx],
+                               minlength=len(names))
+            return {names[code]: float(sums[code]) for code in np.unique(code_view)}
+        sums = {}
+        for i in rows:
+            code = codes[i]
+            sums[code] = sums.get(code, 0.0) + data[i]
+        return {names[code]: sums[code] for code in sorted(sums)}
+
+    def group_grades(self, rows, by='subject'):
+        """
+        Grade totals per group for the graded rows among `rows`, in group code order.
+
+        Each group is {'count', 'grade_sum', 'weight_sum', 'weighted_sum'};
+        only positive weights count towards the weighted sums.
+        """
+        codes, names = self._group_codes(by)
+        if np is not None and rows:
+            idx = _index_view(rows)
+            grades = np.frombuffer(self.grades, dtype='d')[idx]
+            graded = ~np.isnan(grades)
+            grades = grades[graded]
+            weights = np.frombuffer(self.weights, dtype='d')[idx][graded]
+            weights = np.where(weights > 0, weights, 0.0)
+            code_view = np.frombuffer(codes, dtype='l')[idx][graded]
+            n = len(names)
+            counts = np.bincount(code_view, minlength=n)
+            grade_sums = np.bincount(code_view, weights=grades, minlength=n)
+            weight_sums = np.bincount(code_view, weights=weights, minlength=n)
+            weighted_sums = np.bincount(code_view, weights=grades * weights, minlength=n)
+            return {
+                names[code]: {
+                    'count': int(counts[code]),
+                    'grade_sum': float(grade_sums[code]),
+                    'weight_sum': float(weight_sums[code]),
+                    'weighted_sum': float(weighted_sums[code]),
+                }
+                for code in np.unique(code_view)
+            }
+        groups = {}
+        for i in rows:
+            grade = self.grades[i]
+            if grade != grade:  # NaN: ungraded
+                continue
+            group = groups.get(codes[i])
+            if group is None:
+                group = groups[codes[i]] = {'count': 0, 'grade_sum': 0.0, 'weight_sum': 0.0, 'weighted_sum': 0.0}
+            group['count'] += 1
+            group['grade_sum'] += grade
+            weight = self.weights[i]
+            if weight > 0:
+                group['weight_sum'] += weight
+                group['weighted_sum'] += grade * weight
+        return {names[code]: groups[code] for code in sorted(groups)}
+
+    def totals(self, rows):
+        """Totals over the selected rows (as crud.get_grade_totals() sums them)."""
+        if np is not None and rows:
+            idx = _index_view(rows)
+            grades = np.frombuffer(self.grades, dtype='d')[idx]
+            graded = ~np.isnan(grades)
+            weights = np.frombuffer(self.weights, dtype='d')[idx][graded]
+            return Totals(len(idx), int(graded.sum()), float(np.frombuffer(self.hours, dtype='d')[idx].sum()),
+                          float(weights.sum()), float((grades[graded] * weights).sum()))
+        hours, grades, weights = self.hours, self.grades, self.weights
+        totals = Totals(count=len(rows))
+        for i in rows:
+            totals.study_time += hours[i]
+            grade = grades[i]
+            if grade == grade:  # NaN: ungraded
+                totals.graded_count += 1
+                totals.graded_weight += weights[i]
+                totals.weighted_grade += grade * weights[i]
+        return totals
+
+    # --- k estimation ---------------------------------------------------------
+
+    def k_values(self, rows, max_grade=100):
+        """
+        Per-row learning-efficiency samples used by app.estimate_k.
+
+        k_i = -ln(1 - grade/max_grade) * max(0.1, weight/10) / hours for rows
+        with positive hours and grade (grade capped at 99.5% of max_grade),
+        keeping only 0.01 < k_i < 100. Returned in row order.
+        """
+        if np is not None and rows:
+            idx = _index_view(rows)
+            hours = np.frombuffer(self.hours, dtype='d')[idx]
+            grades = np.frombuffer(self.grades, dtype='d')[idx]
+            weights = np.frombuffer(self.weights, dtype='d')[idx]
+            valid = (hours > 0) & (grades > 0)
+            hours, grades, weights = hours[valid], grades[valid], weights[valid]
+            with np.errstate(all='ignore'):
+                capped = np.minimum(grades, max_grade * 0.995)
+                difficulty = np.maximum(0.1, weights / 100 * 10)
+                k = -np.log(1 - capped / max_grade) * difficulty / hours
+            k = k[np.isfinite(k) & (k > 0.01) & (k < 100)]
+            return k.tolist()
+
+        hours, grades, weights = self.hours, self.grades, self.weights
+        cap = max_grade * 0.995
+        log = math.log
+        k_values = []
+        for i in rows:
+            h = hours[i]
+            g = grades[i]
+            if h <= 0 or not g > 0:  # also skips NaN (ungraded)
+                continue
+            try:
+                k_i = -log(1 - min(g, cap) / max_grade) * max(0.1, weights[i] / 100 * 10) / h
+            except (ValueError, ZeroDivisionError):
+                continue
+            if 0.01 < k_i < 100:
+                k_values.append(k_i)
+        return k_values
+
+
+class SortedColumn:
+    """
+    Values sorted for nearest-value lookups; nearest() returns positions in
+    the original sequence. Sorting costs O(n log n) once, after which each
+    lookup is O(log n + count), so build one per scope and reuse it.
+    """
+
+    def __init__(self, values):
+        order = sorted(range(len(values)), key=lambda i: (values[i], i))
+        self.values = array('d', [values[i] for i in order])
+        self.positions = array('l', order)
+
+    def __len__(self):
+        return len(self.values)
+
+    def nearest(self, target, count=1, within=None):
+        """
+        Positions of the `count` values closest to `target`, closest first
+        (ties go to the lower position, as min() over the original order
+        would pick); with `within`, only values less than that far away.
+        """
+        values = self.values
+        found = []
+        right = bisect_left(values, target)
+        left = right - 1
+        while len(found) < count and (left >= 0 or right < len(values)):
+            # Take whole runs of equal values, so ties resolve by position
+            left_run = right_run = None
+            if left >= 0:
+                left_run = (bisect_left(values, values[left], 0, left + 1), left + 1)
+            if right < len(values):
+                right_run = (right, bisect_right(values, values[right], right))
+            left_distance = target - values[left] if left_run else math.inf
+            right_distance = values[right] - target if right_run else math.inf
+            distance = min(left_distance, right_distance)
+            if within is not None and not distance < within:
+                break
+            run = []
+            if left_distance == distance:
+                run.extend(self.positions[left_run[0]:left_run[1]])
+                left = left_run[0] - 1
+            if right_distance == distance:
+                run.extend(self.positions[right_run[0]:right_run[1]])
+                right = right_run[1]
+            found.extend(sorted(run))
+        return found[:count]
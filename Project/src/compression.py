@@ -0,0 +1,204 @@
+# Response compression
+#
+# after_request hook that gzip- (or brotli-, when the optional `brotli`
+# package is installed) compresses HTML, JSON, CSS and JS responses for
+# clients that send Accept-Encoding. Settings live in app.config:
+#
+#   COMPRESS_ENABLED           turn the hook off entirely (default True)
+#   COMPRESS_MIMETYPES         content types that get compressed
+#   COMPRESS_MIN_SIZE          smaller bodies are sent as-is (bytes)
+#   COMPRESS_LEVEL             gzip level 1-9
+#   COMPRESS_BR_QUALITY        brotli quality 0-11
+#   COMPRESS_STREAM_THRESHOLD  bodies at least this big are compressed chunk by
+#                              chunk and sent with chunked transfer encoding
+#   COMPRESS_CACHE_BYTES       budget for cached compressed bodies, keyed by
+#                              ETag (static files); 0 disables the cache
+#
+# Streamed responses (generators) are always compressed incrementally.
+
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+from flask import request
+
+DEFAULT_MIMETYPES = [
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+]
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by (ETag, encoding), bounded by total bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _key, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class Compressor:
+    """Flask extension; use Compressor(app) or compressor.init_app(app)."""
+
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+        app.config.setdefault('COMPRESS_STREAM_THRESHOLD', 1024 * 1024)
+        app.config.setdefault('COMPRESS_CACHE_BYTES', 16 * 1024 * 1024)
+        self.config = app.config
+        self.cache = CompressedBodyCache(app.config['COMPRESS_CACHE_BYTES'])
+        app.extensions['compression'] = self
+        app.after_request(self.after_request)
+
+    # --- negotiation ------------------------------------------------------------
+
+    def choose_encoding(self, accept_encodings):
+        """'br', 'gzip' or None for the client's Accept-Encoding header."""
+        if brotli is not None and accept_encodings['br'] > 0:
+            return 'br'
+        if accept_encodings['gzip'] > 0:
+            return 'gzip'
+        return None
+
+    def _should_compress(self, response):
+        if not self.config['COMPRESS_ENABLED']:
+            return False
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return False
+        if response.mimetype not in self.config['COMPRESS_MIMETYPES']:
+            return False
+        if 'no-transform' in response.headers.get('Cache-Control', ''):
+            return False
+        if response.is_streamed or response.direct_passthrough:
+            return True
+        return response.content_length is None or response.content_length >= self.config['COMPRESS_MIN_SIZE']
+
+    # --- compressors ------------------------------------------------------------
+
+    def compress(self, data, encoding):
+        """Compress a whole body in one go."""
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.config['COMPRESS_BR_QUALITY'])
+        return gzip.compress(data, compresslevel=self.config['COMPRESS_LEVEL'], mtime=0)
+
+    def _stream_compressor(self, encoding):
+        """(compress_chunk, finish) pair for incremental compression."""
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.config['COMPRESS_BR_QUALITY'])
+            return compressor.process, compressor.finish
+        # wbits=31 writes a gzip header and trailer around the deflate stream
+        compressor = zlib.compressobj(self.config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+
+    def compress_iter(self, chunks, encoding):
+        """Compress an iterable of byte chunks lazily, yielding compressed chunks."""
+        compress_chunk, finish = self._stream_compressor(encoding)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            out = compress_chunk(chunk)
+            if out:
+                yield out
+        yield finish()
+
+    # --- hook -------------------------------------------------------------------
+
+    def after_request(self, response):
+        if not self._should_compress(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed and not response.direct_passthrough:
+            # Generator body: compress as it is produced
+            response.response = self.compress_iter(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            # send_file responses stream from disk; read them so they can be compressed
+            response.direct_passthrough = False
+            etag, _weak = response.get_etag()
+            cache_key = (etag, encoding) if etag and self.cache.max_bytes else None
+            body = self.cache.get(cache_key) if cache_key else None
+            if body is not None:
+                # Cache hit: the file body is never read, but must still be closed
+                close = getattr(response.response, 'close', None)
+                if close is not None:
+                    response.call_on_close(close)
+            else:
+                data = response.get_data()
+                if len(data) < self.config['COMPRESS_MIN_SIZE']:
+                    return response
+                if len(data) >= self.config['COMPRESS_STREAM_THRESHOLD'] and not cache_key:
+                    view = memoryview(data)
+                    chunks = (bytes(view[i:i + STREAM_CHUNK_SIZE]) for i in range(0, len(view), STREAM_CHUNK_SIZE))
+                    response.response = self.compress_iter(chunks, encoding)
+                    response.headers.pop('Content-Length', None)
+                    response.headers['Content-Encoding'] = encoding
+                    return response
+                body = self.compress(data, encoding)
+                if cache_key:
+                    self.cache.put(cache_key, body)
+            response.set_data(body)
+
+        response.headers['Content-Encoding'] = encoding
+        if response.headers.get('ETag'):
+            # Compressed bytes differ from the original representation: weaken
+            # the validator (as nginx does) so If-None-Match still matches
+            etag, weak = response.get_etag()
+            if not weak:
+                response.set_etag(etag, weak=True)
+        return response
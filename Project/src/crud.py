@@ -1,46 +1,43 @@
 import sys
 import os
+import re
+from functools import lru_cache
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from dotenv import load_dotenv
 load_dotenv()
 
-# Conditional database import
-if os.getenv("USE_LOCAL_DB", "").lower() == "true":
-    from db_local import init_db, _connect, TABLE_NAME, CATEGORIES_TABLE, SUBJECTS_TABLE, USERS_TABLE
-    # SQLite uses different placeholder syntax
-    PARAM_PLACEHOLDER = "?"
-    DICT_CURSOR = None  # SQLite doesn't use DictCursor
-else:
-    from db import init_db, _connect, TABLE_NAME, CATEGORIES_TABLE, SUBJECTS_TABLE, USERS_TABLE
-    import pymysql
-    from pymysql.cursors import DictCursor as DICT_CURSOR
-    PARAM_PLACEHOLDER = "%s"
+# Storage backend (MySQL, SQLite file or in-memory SQLite) chosen by DB_BACKEND;
+# see storage.py. Dialect-specific SQL lives there, everything here is portable.
+from storage import get_storage
+from records import GradeRecord
+from columns import GradeColumns
+import jobs
+
+storage = get_storage()
+_connect = storage.connect
+init_db = storage.init_db
+TABLE_NAME = storage.TABLE_NAME
+CATEGORIES_TABLE = storage.CATEGORIES_TABLE
+SUBJECTS_TABLE = storage.SUBJECTS_TABLE
+USERS_TABLE = storage.USERS_TABLE
+USER_PREFERENCES_TABLE = storage.USER_PREFERENCES_TABLE
+GRADES_ARCHIVE_TABLE = storage.GRADES_ARCHIVE_TABLE
+CATEGORIES_ARCHIVE_TABLE = storage.CATEGORIES_ARCHIVE_TABLE
+
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Werkzeug hash spec; the test suite lowers the iteration count to stay fast
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+
 
 def _get_dict_cursor(conn):
-    """Get a dictionary cursor compatible with both PyMySQL and SQLite."""
-    if DICT_CURSOR:
-        return conn.cursor(DICT_CURSOR)
-    else:
-        # For SQLite, use row_factory
-        conn.row_factory = lambda c, r: dict(zip([col[0] for col in c.description], r))
-        return conn.cursor()
+    """Get a dictionary cursor for the active backend."""
+    return storage.dict_cursor(conn)
 
 
 def _column_exists(conn, table, col):
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT COUNT(*)
-        FROM information_schema.COLUMNS
-        WHERE TABLE_SCHEMA = DATABASE()
-          AND TABLE_NAME = %s
-          AND COLUMN_NAME = %s
-    """, (table, col))
-    exists = cur.fetchone()[0] > 0
-    cur.close()
-    return exists
+    return storage.column_exists(conn, table, col)
 
 def ensure_schema():
     """Add Position column if missing and backfill it deterministically."""
@@ -53,51 +50,13 @@ def ensure_schema():
             conn.commit()
             cur.close()
 
-        # 2) Backfill per user if everything is zero/unset
-        _backfill_positions(conn)
+        # 2) Renumber users whose positions are unset or out of range
+        #    (set-based, in batches; see Storage.backfill_positions)
+        storage.backfill_positions(conn)
 
     finally:
         conn.close()
 
-def _backfill_positions(conn):
-    """For each username, set Position = 0..n-1 using current id order (stable)."""
-    cur = _get_dict_cursor(conn)
-
-    # Find distinct users
-    cur.execute(f"SELECT DISTINCT username FROM {TABLE_NAME}")
-    users = [r["username"] for r in cur.fetchall()]
-
-    for u in users:
-        # Pull all ids for user ordered by existing Position then fallback to id
-        cur.execute(
-            f"SELECT id FROM {TABLE_NAME} WHERE username=%s ORDER BY Position ASC, id ASC",
-            (u,)
-        )
-        ids = [r["id"] for r in cur.fetchall()]
-        # If Position already looks good (strictly increasing from 0), skip
-        ok = True
-        cur2 = conn.cursor()
-        cur2.execute(
-            f"SELECT COUNT(*) FROM {TABLE_NAME} WHERE username=%s AND Position NOT BETWEEN 0 AND 1000000",
-            (u,)
-        )
-        if cur2.fetchone()[0] > 0:
-            ok = False
-        cur2.close()
-
-        if not ids or ok:
-            continue
-
-        # Rewrite positions 0..n-1
-        upd = conn.cursor()
-        for pos, _id in enumerate(ids):
-            upd.execute(f"UPDATE {TABLE_NAME} SET Position=%s WHERE id=%s AND username=%s",
-                        (pos, _id, u))
-        conn.commit()
-        upd.close()
-
-    cur.close()
-
 def next_position_for_user(username):
     """Return next integer position for a user's new row."""
     conn = _connect()
@@ -119,7 +78,7 @@ def create_user(username, password):
     conn = _connect()
     try:
         curs = conn.cursor()
-        password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
         
         query = f"INSERT INTO {USERS_TABLE} (username, password_hash) VALUES (%s, %s)"
         curs.execute(query, (username, password_hash))
@@ -160,6 +119,119 @@ def user_exists(username):
         curs.close()
         conn.close()
 
+# The data version comes with the user row that flask-login loads on every
+# request, so /predict can key its cache on it without another query
+USER_COLUMNS = "id, username, COALESCE(data_version, 0)"
+
+def _user_from_row(row):
+    """User dict for a row selected with USER_COLUMNS (None stays None)."""
+    return {'id': row[0], 'username': row[1], 'data_version': row[2]} if row else None
+
+def get_user_by_id(user_id):
+    """Return {'id', 'username', 'data_version'} for a user id, or None."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(f"SELECT {USER_COLUMNS} FROM {USERS_TABLE} WHERE id = %s", (int(user_id),))
+        return _user_from_row(curs.fetchone())
+    finally:
+        curs.close()
+        conn.close()
+
+def get_user_by_username(username):
+    """Return {'id', 'username', 'data_version'} for a username, or None."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(f"SELECT {USER_COLUMNS} FROM {USERS_TABLE} WHERE username = %s", (username,))
+        return _user_from_row(curs.fetchone())
+    finally:
+        curs.close()
+        conn.close()
+
+def increment_prediction_run_count(username):
+    """Increment the prediction run count for a user."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            f"UPDATE {USERS_TABLE} SET prediction_run_count = COALESCE(prediction_run_count, 0) + 1 WHERE username = %s",
+            (username,)
+        )
+        conn.commit()
+    finally:
+        curs.close()
+        conn.close()
+
+def add_prediction_counts(run_counts, subject_counts):
+    """
+    Add buffered prediction counts in one transaction: run_counts is
+    {username: n} (prediction_run_count), subject_counts is
+    {(username, subject): n} (per-subject prediction_count).
+    """
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        if run_counts:
+            curs.executemany(
+                f"UPDATE {USERS_TABLE} SET prediction_run_count = COALESCE(prediction_run_count, 0) + %s "
+                f"WHERE username = %s",
+                [(count, username) for username, count in run_counts.items()]
+            )
+        if subject_counts:
+            curs.executemany(
+                storage.upsert_sql(USER_PREFERENCES_TABLE,
+                                   ['username', 'subject', 'prediction_count', 'grade_lock'],
+                                   ['username', 'subject'],
+                                   {'prediction_count':
+                                    f"COALESCE(prediction_count, 0) + {storage.excluded('prediction_count')}"}),
+                [(username, subject, count, True) for (username, subject), count in subject_counts.items()]
+            )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        curs.close()
+        conn.close()
+
+def get_prediction_run_count(username):
+    """Get the prediction run count for a user."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            f"SELECT COALESCE(prediction_run_count, 0) FROM {USERS_TABLE} WHERE username = %s",
+            (username,)
+        )
+        result = curs.fetchone()
+        return result[0] if result else 0
+    finally:
+        curs.close()
+        conn.close()
+
+def get_data_version(username):
+    """
+    The user's data version: bumped by every write that changes their grade
+    rows, so results computed from those rows (e.g. /predict responses) can
+    be cached under it. 0 for a user that doesn't exist.
+    """
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(f"SELECT COALESCE(data_version, 0) FROM {USERS_TABLE} WHERE username = %s", (username,))
+        row = curs.fetchone()
+        return row[0] if row else 0
+    finally:
+        curs.close()
+        conn.close()
+
+BUMP_DATA_VERSION_SQL = f"UPDATE {USERS_TABLE} SET data_version = COALESCE(data_version, 0) + 1 WHERE username = %s"
+
+def _bump_data_version(curs, username):
+    """Bump the user's data version on `curs` (no commit), in the transaction of the grade write."""
+    curs.execute(BUMP_DATA_VERSION_SQL, (username,))
+
 def set_subject_retirement_status(username: str, subject_name: str, is_retired: bool):
     """
     Placeholder for database function to set the 'is_retired' status of a subject
@@ -179,69 +251,297 @@ def set_subject_retirement_status(username: str, subject_name: str, is_retired:
         try: conn.close()
         except: pass
 
+# Column order matches GradeRecord.from_row(), so grade queries use plain
+# tuple cursors and build records without an intermediate dict per row.
+GRADE_COLUMNS = """id, Subject, Category, StudyTime, AssignmentName,
+                    Grade, Weight, IsPrediction, PredictedGrade, Position"""
+
+# Every column of the grades / categories tables, in the order shared with
+# their archive tables (see retire_subject)
+GRADE_TABLE_COLUMNS = """id, username, Subject, Category, StudyTime, AssignmentName,
+                         Grade, Weight, IsPrediction, PredictedGrade, Position"""
+CATEGORY_TABLE_COLUMNS = "id, username, Subject, CategoryName, TotalWeight, DefaultName"
+
+# A subject being deleted is renamed, with its assignments, to this prefix and
+# its id (see _hide_subject), so its name is free for a new subject at once and
+# the purge can't reach rows entered under the name afterwards. Input is
+# stripped and str.strip() removes "\x1f", so no real subject starts with it.
+DELETED_SUBJECT_PREFIX = "\x1fdeleted:"
+DELETED_SUBJECT_PATTERN = DELETED_SUBJECT_PREFIX + "%"
+
+
+def _select_grades(columns, conditions, params, include_archived=False):
+    """
+    SELECT `columns` from the grades table WHERE `conditions`; with
+    include_archived, UNION ALL the same rows of the archive table (an index
+    probe that finds nothing for users without archived subjects).
+    Returns (query, params) without an ORDER BY.
+    """
+    where = ' AND '.join(conditions)
+    query = f"SELECT {columns} FROM {TABLE_NAME} WHERE {where}"
+    if not include_archived:
+        return query, list(params)
+    return (f"{query} UNION ALL SELECT {columns} FROM {GRADES_ARCHIVE_TABLE} WHERE {where}",
+            list(params) * 2)
+
+
+def _grade_filters(username, subject=None, category=None, graded_only=False, ungraded_only=False,
+                   include_predictions=True, exclude_id=None):
+    """WHERE conditions and parameters shared by the grade queries."""
+    conditions = ["username = %s"]
+    params = [username]
+    if subject is not None:
+        conditions.append("Subject = %s")
+        params.append(subject)
+        if category is not None:
+            conditions.append("Category = %s")
+            params.append(category)
+    else:
+        # Skip the assignments of subjects being deleted
+        conditions.append("Subject NOT LIKE %s")
+        params.append(DELETED_SUBJECT_PATTERN)
+    if graded_only:
+        conditions.append("Grade IS NOT NULL")
+    if ungraded_only:
+        conditions.append("Grade IS NULL")
+    if not include_predictions:
+        conditions.append("(IsPrediction = FALSE OR IsPrediction IS NULL)")
+    if exclude_id is not None:
+        conditions.append("id <> %s")
+        params.append(exclude_id)
+    return conditions, params
+
+def get_grades(username, subject=None, category=None, graded_only=False, ungraded_only=False,
+               include_predictions=True, exclude_id=None, include_archived=False):
+    """
+    Get a user's grade records, filtered in SQL.
+
+    subject/category narrow the rows through the (username, Subject, Category)
+    index; graded_only/ungraded_only keep rows with/without a Grade;
+    include_predictions=False drops prediction rows; exclude_id skips one row;
+    include_archived adds the rows of archived subjects.
+    Rows come back in display order (Position, id).
+    """
+    conditions, params = _grade_filters(username, subject, category, graded_only, ungraded_only,
+                                        include_predictions, exclude_id)
+    query, params = _select_grades(GRADE_COLUMNS, conditions, params, include_archived)
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(f"{query} ORDER BY Position ASC, id ASC", params)
+        return [GradeRecord.from_row(row) for row in curs.fetchall()]
+    finally:
+        curs.close()
+        conn.close()
+
+def get_grade_columns(username, subject=None, category=None, graded_only=False, ungraded_only=False,
+                      include_predictions=True, exclude_id=None, include_archived=False):
+    """
+    Same rows as get_grades(), as a GradeColumns for statistics and k estimation.
+
+    Built straight from the tuple rows, without a GradeRecord per row.
+    """
+    conditions, params = _grade_filters(username, subject, category, graded_only, ungraded_only,
+                                        include_predictions, exclude_id)
+    query, params = _select_grades(GRADE_COLUMNS, conditions, params, include_archived)
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(f"{query} ORDER BY Position ASC, id ASC", params)
+        return GradeColumns.from_rows(curs.fetchall())
+    finally:
+        curs.close()
+        conn.close()
+
+# Sort keys accepted by get_grades_page -> SQL expression. Keyset pagination
+# needs a non-NULL key, so ungraded rows sort as grade -1.
+GRADE_SORT_KEYS = {
+    'position': 'Position',
+    'name': 'AssignmentName',
+    'study_time': 'StudyTime',
+    'weight': 'Weight',
+    'grade': 'COALESCE(Grade, -1)',
+}
+
+def get_grades_page(username, limit, after=None, sort='position', descending=False, subject=None,
+                    category=None, graded_only=False, ungraded_only=False, include_predictions=True):
+    """
+    One page of a user's grade records using keyset pagination.
+
+    Rows are ordered by (sort key, id); `after` is the (sort value, id) pair of
+    the last row of the previous page, so each page is an index range scan no
+    matter how deep the client has scrolled. Returns (grades, next_after),
+    where next_after is None on the last page.
+    """
+    query, params = _grades_page_query(username, limit, after, sort, descending, subject, category,
+                                       graded_only, ungraded_only, include_predictions)
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(query, params)
+        rows = curs.fetchall()
+    finally:
+        curs.close()
+        conn.close()
+    return _grades_page(rows, limit)
+
+def _grades_page_query(username, limit, after, sort, descending, subject, category,
+                       graded_only, ungraded_only, include_predictions):
+    """SELECT and parameters for get_grades_page (one row more than `limit`)."""
+    if sort not in GRADE_SORT_KEYS:
+        raise ValueError(f"Unknown sort '{sort}'")
+    key = GRADE_SORT_KEYS[sort]
+    direction = 'DESC' if descending else 'ASC'
+    op = '<' if descending else '>'
+
+    conditions, params = _grade_filters(username, subject, category, graded_only, ungraded_only,
+                                        include_predictions)
+    if after is not None:
+        after_value, after_id = after
+        conditions.append(f"({key} {op} %s OR ({key} = %s AND id {op} %s))")
+        params.extend([after_value, after_value, after_id])
+    query = f"""SELECT {GRADE_COLUMNS}, {key} AS sort_key
+                FROM {TABLE_NAME}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {key} {direction}, id {direction}
+                LIMIT %s"""
+    return query, params + [limit + 1]
+
+def _grades_page(rows, limit):
+    """(grades, next_after) from the rows fetched by _grades_page_query."""
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (rows[-1][-1], rows[-1][0])  # (sort_key, id)
+    return [GradeRecord.from_row(row) for row in rows], next_after
+
+def get_graded_users(include_archived=False):
+    """Usernames with at least one graded assessment (prediction rows don't count)."""
+    conditions = ["Grade IS NOT NULL", "(IsPrediction = FALSE OR IsPrediction IS NULL)", "Subject NOT LIKE %s"]
+    query, params = _select_grades("DISTINCT username", conditions, [DELETED_SUBJECT_PATTERN], include_archived)
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(query, params)
+        return sorted({row[0] for row in curs.fetchall()})
+    finally:
+        curs.close()
+        conn.close()
+
+def get_grade_by_id(username, grade_id):
+    """Get one of a user's grade records by primary key, or None."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            f"SELECT {GRADE_COLUMNS} FROM {TABLE_NAME} WHERE id = %s AND username = %s",
+            (grade_id, username)
+        )
+        row = curs.fetchone()
+        return GradeRecord.from_row(row) if row else None
+    finally:
+        curs.close()
+        conn.close()
+
+def get_grades_by_ids(username, grade_ids):
+    """Get the user's grade records among `grade_ids` (ids owned by others are skipped)."""
+    grade_ids = list(dict.fromkeys(grade_ids))
+    if not grade_ids:
+        return []
+
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        rows = []
+        for start in range(0, len(grade_ids), storage.MAX_IN_PARAMS):
+            chunk = grade_ids[start:start + storage.MAX_IN_PARAMS]
+            placeholders = ','.join(['%s'] * len(chunk))
+            curs.execute(
+                f"""SELECT {GRADE_COLUMNS}
+                    FROM {TABLE_NAME}
+                    WHERE username = %s AND id IN ({placeholders})
+                    ORDER BY Position ASC, id ASC""",
+                (username, *chunk)
+            )
+            rows.extend(curs.fetchall())
+        return [GradeRecord.from_row(row) for row in rows]
+    finally:
+        curs.close()
+        conn.close()
+
 def get_all_grades(username):
     """Get all grade records for a specific user."""
+    return get_grades(username)
+
+def get_grade_totals(username, include_archived=False):
+    """
+    Per (subject, category) totals for a user, computed in SQL:
+    {(subject, category): {'count', 'graded_count', 'study_time', 'graded_weight', 'weighted_grade'}}
+    where the last two only cover rows that have a grade. include_archived
+    adds the rows of archived subjects.
+    """
+    conditions, params = _grade_filters(username)
+    query, params = _select_grades("Subject, Category, StudyTime, Grade, Weight", conditions, params,
+                                   include_archived)
     conn = _connect()
     try:
         curs = _get_dict_cursor(conn)
         curs.execute(
-            f"""SELECT id, Subject, Category, StudyTime, AssignmentName,
-                    Grade, Weight, IsPrediction, PredictedGrade, Position
-                FROM {TABLE_NAME}
-                WHERE username = %s
-                ORDER BY Position ASC, id ASC""",
-            (username,)
+            f"""SELECT Subject, Category,
+                       COUNT(*) AS count,
+                       COUNT(Grade) AS graded_count,
+                       COALESCE(SUM(StudyTime), 0) AS study_time,
+                       COALESCE(SUM(CASE WHEN Grade IS NOT NULL THEN Weight END), 0) AS graded_weight,
+                       COALESCE(SUM(CASE WHEN Grade IS NOT NULL THEN Grade * Weight END), 0) AS weighted_grade
+                FROM ({query}) AS g
+                GROUP BY Subject, Category""",
+            params
         )
-        results = curs.fetchall()
-
-        # Convert to lowercase keys for consistency with Sprint 2A dictionaries
-        return [
-            {
-                'id': row['id'],
-                'subject': row['Subject'],
-                'category': row['Category'],
-                'study_time': row['StudyTime'],
-                'assignment_name': row['AssignmentName'],
-                'grade': row['Grade'],
-                'weight': row['Weight'],
-                'is_prediction': bool(row['IsPrediction']) if 'IsPrediction' in row else False,
-                'predicted_grade': row.get('PredictedGrade'),
-                'position': row['Position'],
+        return {
+            (row['Subject'], row['Category']): {
+                'count': row['count'],
+                'graded_count': row['graded_count'],
+                'study_time': float(row['study_time']),
+                'graded_weight': float(row['graded_weight']),
+                'weighted_grade': float(row['weighted_grade']),
             }
-            for row in results
-        ]
+            for row in curs.fetchall()
+        }
     finally:
         curs.close()
         conn.close()
 
-def get_all_categories(username, subject=None):
-    """Get all category definitions for a user."""
+def get_all_categories(username, subject=None, include_archived=False):
+    """Get all category definitions for a user (include_archived: also those of archived subjects)."""
     conn = _connect()
     try:
         curs = _get_dict_cursor(conn)
 
+        conditions, params = ["username = %s"], [username]
         if subject:
-            curs.execute(f"SELECT * FROM {CATEGORIES_TABLE} WHERE username = %s AND Subject = %s ORDER BY CategoryName", (username, subject))
-        else:
-            curs.execute(f"SELECT * FROM {CATEGORIES_TABLE} WHERE username = %s ORDER BY Subject, CategoryName", (username,))
-
-        results = curs.fetchall()
+            conditions.append("Subject = %s")
+            params.append(subject)
+        tables = [CATEGORIES_TABLE, CATEGORIES_ARCHIVE_TABLE] if include_archived else [CATEGORIES_TABLE]
+        query = ' UNION ALL '.join(
+            f"SELECT {CATEGORY_TABLE_COLUMNS} FROM {table} WHERE {' AND '.join(conditions)}" for table in tables
+        )
+        curs.execute(f"{query} ORDER BY Subject, CategoryName", params * len(tables))
 
-        # Convert to lowercase keys matching Sprint 2A weight_categories format
-        return [
-            {
-                'id': row['id'],
-                'subject': row['Subject'],
-                'name': row['CategoryName'],
-                'total_weight': row['TotalWeight'],
-                'default_name': row['DefaultName'] or ''
-            }
-            for row in results
-        ]
+        return [_category_from_row(row) for row in curs.fetchall()]
     finally:
         curs.close()
         conn.close()
 
+def _category_from_row(row):
+    """Category dict (lowercase keys matching Sprint 2A weight_categories format)."""
+    return {
+        'id': row['id'],
+        'subject': row['Subject'],
+        'name': row['CategoryName'],
+        'total_weight': row['TotalWeight'],
+        'default_name': row['DefaultName'] or ''
+    }
+
 def get_category_by_id(username, category_id):
     """Get a single category by ID for a user."""
     conn = _connect()
@@ -249,24 +549,17 @@ def get_category_by_id(username, category_id):
         curs = _get_dict_cursor(conn)
         curs.execute(f"SELECT * FROM {CATEGORIES_TABLE} WHERE id = %s AND username = %s", (category_id, username))
         row = curs.fetchone()
-        if row:
-            return {
-                'id': row['id'],
-                'subject': row['Subject'],
-                'name': row['CategoryName'],
-                'total_weight': row['TotalWeight'],
-                'default_name': row['DefaultName'] or ''
-            }
-        return None
+        return _category_from_row(row) if row else None
     finally:
         curs.close()
         conn.close()
 
-def get_categories_as_dict(username):
+def get_categories_as_dict(username, include_archived=False):
     """Get categories organized by subject for a user."""
-    categories = get_all_categories(username)
+    return _categories_by_subject(get_all_categories(username, include_archived=include_archived))
 
-    # Organize by subject
+def _categories_by_subject(categories):
+    """Group category dicts by subject (dropping their 'subject' key)."""
     result = {}
     for cat in categories:
         subject = cat['subject']
@@ -279,23 +572,33 @@ def get_categories_as_dict(username):
 
     return result
 
+# The next position is computed inside the INSERT so concurrent adds for the
+# same user can't both read the same MAX(Position). Parameters: the nine
+# column values, then the username again.
+ADD_GRADE_SQL = f"""
+INSERT INTO {TABLE_NAME}
+    (username, Subject, Category, StudyTime, AssignmentName, Grade, Weight, IsPrediction, PredictedGrade, Position)
+SELECT %s, %s, %s, %s, %s, %s, %s, %s, %s, COALESCE(MAX(Position), -1) + 1
+FROM {TABLE_NAME} WHERE username = %s
+"""
+
+# Only updates the row if it belongs to the user
+UPDATE_GRADE_SQL = f"""
+UPDATE {TABLE_NAME}
+SET Subject = %s, Category = %s, StudyTime = %s, AssignmentName = %s, Grade = %s, Weight = %s, IsPrediction = %s, PredictedGrade = %s
+WHERE id = %s AND username = %s
+"""
+
 def add_grade(username, subject, category, study_time, assignment_name, grade, weight, is_prediction=False, predicted_grade=None):
     """Add a new assignment to the database for a user"""
     conn = _connect()
     try:
         curs = conn.cursor()
-
-        curs.execute(f"SELECT COALESCE(MAX(Position), -1) + 1 FROM {TABLE_NAME} WHERE username=%s", (username,))
-        next_pos = curs.fetchone()[0]
-
-        query = f"""
-        INSERT INTO {TABLE_NAME}
-            (username, Subject, Category, StudyTime, AssignmentName, Grade, Weight, IsPrediction, PredictedGrade, Position)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        curs.execute(query, (username, subject, category, study_time, assignment_name, grade, weight, is_prediction, predicted_grade, next_pos))
+        curs.execute(ADD_GRADE_SQL, (username, subject, category, study_time, assignment_name, grade, weight, is_prediction, predicted_grade, username))
+        grade_id = curs.lastrowid
+        _bump_data_version(curs, username)
         conn.commit()
-        return curs.lastrowid  # Return the ID of the inserted record
+        return grade_id  # Return the ID of the inserted record
     except Exception as e:
         conn.rollback()
         raise e
@@ -308,15 +611,88 @@ def update_grade(username, grade_id, subject, category, study_time, assignment_n
     conn = _connect()
     try:
         curs = conn.cursor()
-        # Ensure we only update if it belongs to the user
-        query = f"""
-        UPDATE {TABLE_NAME}
-        SET Subject = %s, Category = %s, StudyTime = %s, AssignmentName = %s, Grade = %s, Weight = %s, IsPrediction = %s, PredictedGrade = %s
-        WHERE id = %s AND username = %s
-        """
-        curs.execute(query, (subject, category, study_time, assignment_name, grade, weight, is_prediction, predicted_grade, grade_id, username))
+        curs.execute(UPDATE_GRADE_SQL, (subject, category, study_time, assignment_name, grade, weight, is_prediction, predicted_grade, grade_id, username))
+        updated = curs.rowcount
+        if updated:
+            _bump_data_version(curs, username)
         conn.commit()
-        return curs.rowcount
+        return updated
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        curs.close()
+        conn.close()
+
+def get_prediction_targets(username, grade_id=None):
+    """
+    A user's assessments whose stored system prediction (PredictedGrade) needs
+    computing: ungraded ones with study time, whose snapshot follows the
+    model's inputs until the grade is entered, and the row `grade_id` (just
+    added with its grade, or its inputs just changed). Other graded rows are
+    never backfilled: today's history would include grades entered after
+    them. Prediction rows are skipped (their grade is the prediction).
+    """
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            f"""SELECT {GRADE_COLUMNS}
+                FROM {TABLE_NAME}
+                WHERE username = %s AND (IsPrediction = FALSE OR IsPrediction IS NULL) AND StudyTime > 0
+                AND (Grade IS NULL OR id = %s) AND Subject NOT LIKE %s
+                ORDER BY Position ASC, id ASC""",
+            (username, grade_id, DELETED_SUBJECT_PATTERN)
+        )
+        return [GradeRecord.from_row(row) for row in curs.fetchall()]
+    finally:
+        curs.close()
+        conn.close()
+
+def set_predicted_grades(username, values):
+    """Store PredictedGrade for a user's (grade_id, predicted_grade) pairs in one batch."""
+    if not values:
+        return 0
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        updated = storage.update_by_id(curs, TABLE_NAME, username, 'PredictedGrade', list(values))
+        conn.commit()
+        return updated
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        curs.close()
+        conn.close()
+
+def reorder_grades(username, grade_ids):
+    """
+    Set Position = 0..n-1 following `grade_ids` (top-to-bottom row order).
+    Raises ValueError if any id does not belong to the user.
+    """
+    if not grade_ids:
+        return 0
+
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        unique_ids = list(dict.fromkeys(grade_ids))
+        owned = set()
+        for start in range(0, len(unique_ids), storage.MAX_IN_PARAMS):
+            chunk = unique_ids[start:start + storage.MAX_IN_PARAMS]
+            placeholders = ','.join(['%s'] * len(chunk))
+            curs.execute(
+                f"SELECT id FROM {TABLE_NAME} WHERE username = %s AND id IN ({placeholders})",
+                (username, *chunk)
+            )
+            owned.update(row[0] for row in curs.fetchall())
+        if len(owned) != len(unique_ids):
+            raise ValueError("contains ids not owned by user")
+
+        updated = storage.update_positions(curs, username, list(grade_ids))
+        conn.commit()
+        return updated
     except Exception as e:
         conn.rollback()
         raise e
@@ -331,8 +707,11 @@ def delete_grade(username, grade_id):
         curs = conn.cursor()
         query = f"DELETE FROM {TABLE_NAME} WHERE id = %s AND username = %s"
         curs.execute(query, (grade_id, username))
+        deleted = curs.rowcount
+        if deleted:
+            _bump_data_version(curs, username)
         conn.commit()
-        return curs.rowcount
+        return deleted
     except Exception as e:
         conn.rollback()
         raise e
@@ -348,14 +727,12 @@ def delete_grades_bulk(username, grade_ids):
     conn = _connect()
     try:
         curs = conn.cursor()
-        placeholders = ','.join(['%s'] * len(grade_ids))
-        # Add username check
-        query = f"DELETE FROM {TABLE_NAME} WHERE id IN ({placeholders}) AND username = %s"
-        # Append username to the end of parameters
-        params = tuple(grade_ids) + (username,)
-        curs.execute(query, params)
+        # storage chunks the IN (...) list and scopes the delete to the user
+        deleted = storage.delete_by_ids(curs, TABLE_NAME, username, grade_ids)
+        if deleted:
+            _bump_data_version(curs, username)
         conn.commit()
-        return curs.rowcount
+        return deleted
     except Exception as e:
         conn.rollback()
         raise e
@@ -402,9 +779,11 @@ def recalculate_and_update_weights(username, subject, category_name):
             WHERE username = %s AND Subject = %s AND Category = %s
         """
         curs.execute(update_query, (new_weight, username, subject, category_name))
+        updated = curs.rowcount
+        _bump_data_version(curs, username)
         conn.commit()
 
-        return curs.rowcount
+        return updated
     except Exception as e:
         conn.rollback()
         raise e
@@ -431,8 +810,16 @@ def add_category(username, subject, category_name, total_weight, default_name=''
         curs.close()
         conn.close()
 
-def update_category(username, category_id, subject, category_name, total_weight, default_name=''):
-    """Update an existing category definition for a user"""
+def update_category(username, category_id, subject, category_name, total_weight, default_name='',
+                    rename_from=None):
+    """
+    Update an existing category definition for a user.
+
+    With rename_from (the previous DefaultName), assignments named after that
+    pattern are renamed to default_name in the same transaction (see
+    update_assignment_names_for_category). Returns the number of category rows
+    updated, or (rows, assignments renamed) when rename_from is given.
+    """
     conn = _connect()
     try:
         curs = conn.cursor()
@@ -442,8 +829,15 @@ def update_category(username, category_id, subject, category_name, total_weight,
         WHERE id = %s AND username = %s
         """
         curs.execute(query, (subject, category_name, total_weight, default_name, category_id, username))
+        rows = curs.rowcount
+        if rename_from is None:
+            conn.commit()
+            return rows
+        renamed = 0
+        if rows:
+            renamed = _rename_assignments(curs, username, subject, category_name, rename_from, default_name)
         conn.commit()
-        return curs.rowcount
+        return rows, renamed
     except Exception as e:
         conn.rollback()
         raise e
@@ -451,6 +845,49 @@ def update_category(username, category_id, subject, category_name, total_weight,
         curs.close()
         conn.close()
 
+@lru_cache(maxsize=256)
+def _name_pattern(pattern):
+    """
+    (compiled regex, prefix, suffix) for a "Quiz #" style naming pattern, where
+    "#" stands for the number; None if the pattern has no fixed text.
+    """
+    parts = pattern.split('#')
+    prefix = parts[0]
+    suffix = parts[1] if len(parts) > 1 else ''
+    if not prefix and not suffix:
+        return None
+    regex = re.compile(f'^{re.escape(prefix)}(\\d+){re.escape(suffix)}$', re.IGNORECASE)
+    return regex, prefix, suffix
+
+def _rename_assignments(curs, username, subject, category_name, old_pattern, new_pattern):
+    """
+    Rename a category's assignments from old_pattern to new_pattern on `curs`
+    (no commit). One SELECT, then one batched UPDATE for all matching rows.
+    """
+    if not old_pattern or not new_pattern:
+        return 0
+    old = _name_pattern(old_pattern)
+    if old is None:
+        return 0
+    regex = old[0]
+    _, new_prefix, new_suffix = _name_pattern(new_pattern) or (None, '', '')
+
+    curs.execute(
+        f"""SELECT id, AssignmentName FROM {TABLE_NAME}
+            WHERE username = %s AND Subject = %s AND Category = %s""",
+        (username, subject, category_name)
+    )
+    renames = []
+    for grade_id, name in curs.fetchall():
+        match = regex.match(name.strip())
+        if match:
+            # The number goes exactly where "#" is in the new pattern
+            renames.append((grade_id, f"{new_prefix}{match.group(1)}{new_suffix}"))
+    if not renames:
+        return 0
+    storage.update_by_id(curs, TABLE_NAME, username, 'AssignmentName', renames)
+    return len(renames)
+
 def update_assignment_names_for_category(username, subject, category_name, old_pattern, new_pattern):
     """
     Update assignment names that match the old naming pattern to use the new pattern.
@@ -460,60 +897,11 @@ def update_assignment_names_for_category(username, subject, category_name, old_p
     
     The pattern uses "#" as a placeholder for the number.
     """
-    import re
     conn = _connect()
     try:
-        # Get all assignments for this category
-        curs = _get_dict_cursor(conn)
-        curs.execute(
-            f"""SELECT id, AssignmentName FROM {TABLE_NAME} 
-                WHERE username = %s AND Subject = %s AND Category = %s""",
-            (username, subject, category_name)
-        )
-        assignments = curs.fetchall()
-        
-        if not assignments or not old_pattern or not new_pattern:
-            return 0
-        
-        # Split old pattern by # to get prefix and suffix
-        old_parts = old_pattern.split('#')
-        old_prefix = old_parts[0] if len(old_parts) > 0 else ''
-        old_suffix = old_parts[1] if len(old_parts) > 1 else ''
-        
-        # Split new pattern by # to get prefix and suffix
-        new_parts = new_pattern.split('#')
-        new_prefix = new_parts[0] if len(new_parts) > 0 else ''
-        new_suffix = new_parts[1] if len(new_parts) > 1 else ''
-        
-        if not old_prefix and not old_suffix:
-            return 0
-        
-        # Create regex pattern to match old naming scheme
-        # Escape special regex characters
-        escaped_old_prefix = re.escape(old_prefix)
-        escaped_old_suffix = re.escape(old_suffix)
-        pattern = re.compile(f'^{escaped_old_prefix}(\\d+){escaped_old_suffix}$', re.IGNORECASE)
-        
-        updated_count = 0
-        update_curs = conn.cursor()
-        
-        for assignment in assignments:
-            match = pattern.match(assignment['AssignmentName'].strip())
-            if match:
-                # Extract the number
-                number = match.group(1)
-                # Create the new name using the new pattern (number goes exactly where # is)
-                new_name = f"{new_prefix}{number}{new_suffix}"
-                
-                # Update the assignment name
-                update_curs.execute(
-                    f"UPDATE {TABLE_NAME} SET AssignmentName = %s WHERE id = %s AND username = %s",
-                    (new_name, assignment['id'], username)
-                )
-                updated_count += update_curs.rowcount
-        
+        curs = conn.cursor()
+        updated_count = _rename_assignments(curs, username, subject, category_name, old_pattern, new_pattern)
         conn.commit()
-        update_curs.close()
         return updated_count
     except Exception as e:
         conn.rollback()
@@ -569,62 +957,224 @@ def get_total_weight_for_subject(username, subject, exclude_category_id=None):
 # PHASE 7: Subject CRUD Operations
 # ============================================================================
 
+# Subjects marked pending_delete are being removed by a background job
+# (delete_subject_in_background) and are hidden everywhere
+VISIBLE_SUBJECT = "(pending_delete = FALSE OR pending_delete IS NULL)"
+
+# Grade rows removed per DELETE (and commit) by delete_subject
+DELETE_BATCH_SIZE = 500
+
+# Whether retire_subject moves a subject's rows to the archive tables when the
+# caller doesn't say
+ARCHIVE_RETIRED = os.getenv("ARCHIVE_RETIRED", "false").lower() == "true"
+
 def get_all_subjects(username, include_retired=False):
     """Get all subjects for a user. By default excludes retired subjects."""
     conn = _connect()
     try:
         curs = _get_dict_cursor(conn)
         if include_retired:
-            curs.execute(f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s ORDER BY name", (username,))
+            curs.execute(f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s AND {VISIBLE_SUBJECT} ORDER BY name", (username,))
         else:
             # Exclude retired subjects (is_retired = FALSE or NULL)
-            curs.execute(f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s AND (is_retired = FALSE OR is_retired IS NULL) ORDER BY name", (username,))
-        results = curs.fetchall()
-
-        return [
-            {
-                'id': row['id'],
-                'name': row['name'],
-                'created_at': row['created_at'],
-                'is_retired': row.get('is_retired', False) or False
-            }
-            for row in results
-        ]
+            curs.execute(f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s AND (is_retired = FALSE OR is_retired IS NULL) AND {VISIBLE_SUBJECT} ORDER BY name", (username,))
+        return [_subject_from_row(row) for row in curs.fetchall()]
     finally:
         curs.close()
         conn.close()
 
+def _subject_from_row(row):
+    """Subject dict for a row of the subjects table."""
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'created_at': row['created_at'],
+        'is_retired': row.get('is_retired', False) or False,
+        'is_archived': bool(row.get('is_archived')),
+        'term': row.get('term')
+    }
+
 def get_retired_subjects(username):
     """Get all retired subjects for a user."""
     conn = _connect()
     try:
         curs = _get_dict_cursor(conn)
-        curs.execute(f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s AND is_retired = TRUE ORDER BY name", (username,))
+        curs.execute(f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s AND is_retired = TRUE AND {VISIBLE_SUBJECT} ORDER BY name", (username,))
         results = curs.fetchall()
 
-        return [
-            {
-                'id': row['id'],
-                'name': row['name'],
-                'created_at': row['created_at'],
-                'is_retired': True
-            }
-            for row in results
-        ]
+        return [dict(_subject_from_row(row), is_retired=True) for row in results]
+    finally:
+        curs.close()
+        conn.close()
+
+def retire_subject(username, subject_name, archive=None):
+    """
+    Mark a subject as retired. Returns True if a subject was updated.
+
+    With archive (default ARCHIVE_RETIRED) its assignments and categories
+    also move to the archive tables, in the same transaction, so the hot
+    tables and their indexes stop carrying them; reads that still need them
+    pass include_archived. unretire_subject moves them back.
+    """
+    if archive is None:
+        archive = ARCHIVE_RETIRED
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            f"UPDATE {SUBJECTS_TABLE} SET is_retired = TRUE WHERE username = %s AND name = %s",
+            (username, subject_name)
+        )
+        retired = curs.rowcount > 0
+        if retired and archive:
+            _move_subject_rows(curs, "username = %s AND Subject = %s", (username, subject_name), to_archive=True)
+            curs.execute(
+                f"UPDATE {SUBJECTS_TABLE} SET is_archived = TRUE WHERE username = %s AND name = %s",
+                (username, subject_name)
+            )
+            _bump_data_version(curs, username)
+        conn.commit()
+        return retired
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        curs.close()
+        conn.close()
+
+def unretire_subject(username, subject_name):
+    """Mark a subject as active again, restoring archived rows. Returns True if a subject was updated."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            f"SELECT is_archived FROM {SUBJECTS_TABLE} WHERE username = %s AND name = %s",
+            (username, subject_name)
+        )
+        row = curs.fetchone()
+        if row is None:
+            return False
+        if row[0]:
+            _move_subject_rows(curs, "username = %s AND Subject = %s", (username, subject_name), to_archive=False)
+            _bump_data_version(curs, username)
+        curs.execute(
+            f"UPDATE {SUBJECTS_TABLE} SET is_retired = FALSE, is_archived = FALSE WHERE username = %s AND name = %s",
+            (username, subject_name)
+        )
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        curs.close()
+        conn.close()
+
+def _move_subject_rows(curs, condition, params, to_archive):
+    """
+    Move the grades and categories matching `condition` between the hot and
+    archive tables (ids kept): one INSERT ... SELECT and one DELETE per table.
+    """
+    pairs = [(TABLE_NAME, GRADES_ARCHIVE_TABLE, GRADE_TABLE_COLUMNS),
+             (CATEGORIES_TABLE, CATEGORIES_ARCHIVE_TABLE, CATEGORY_TABLE_COLUMNS)]
+    for hot, archive, columns in pairs:
+        source, target = (hot, archive) if to_archive else (archive, hot)
+        curs.execute(f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {source} WHERE {condition}", params)
+        curs.execute(f"DELETE FROM {source} WHERE {condition}", params)
+
+# ----------------------------------------------------------------------------
+# Terms: subjects can be tagged with a term (e.g. "F25"); closing the term
+# retires and archives all of them at once (see term_rollover.py for cohorts)
+# ----------------------------------------------------------------------------
+
+def set_subject_term(username, subject_name, term):
+    """Tag a subject with a term (None clears it). Returns True if a subject was updated."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            f"UPDATE {SUBJECTS_TABLE} SET term = %s WHERE username = %s AND name = %s",
+            (term or None, username, subject_name)
+        )
+        conn.commit()
+        return curs.rowcount > 0
+    finally:
+        curs.close()
+        conn.close()
+
+def get_term_users(term):
+    """Usernames with subjects in `term` that are not retired yet."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            f"""SELECT DISTINCT username FROM {SUBJECTS_TABLE}
+                WHERE term = %s AND (is_retired = FALSE OR is_retired IS NULL) AND {VISIBLE_SUBJECT}
+                ORDER BY username""",
+            (term,)
+        )
+        return [row[0] for row in curs.fetchall()]
+    finally:
+        curs.close()
+        conn.close()
+
+def close_term(username, term, archive=True):
+    """
+    Retire every subject of a user's term in one transaction and, with
+    archive, move all their grades and categories to the archive tables with
+    one set-based INSERT ... SELECT and DELETE per table. Returns the names of
+    the subjects retired (subjects already retired are left as they are).
+    """
+    term_subjects = (f"SELECT name FROM {SUBJECTS_TABLE} WHERE username = %s AND term = %s "
+                     f"AND (is_retired = FALSE OR is_retired IS NULL) AND {VISIBLE_SUBJECT}")
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(f"{term_subjects} ORDER BY name", (username, term))
+        names = [row[0] for row in curs.fetchall()]
+        if not names:
+            return []
+        if archive:
+            # Rows move while the subjects still match term_subjects
+            _move_subject_rows(curs, f"username = %s AND Subject IN ({term_subjects})",
+                               (username, username, term), to_archive=True)
+            _bump_data_version(curs, username)
+        curs.execute(
+            f"""UPDATE {SUBJECTS_TABLE} SET is_retired = TRUE, is_archived = %s
+                WHERE username = %s AND term = %s AND (is_retired = FALSE OR is_retired IS NULL)
+                AND {VISIBLE_SUBJECT}""",
+            (bool(archive), username, term)
+        )
+        conn.commit()
+        return names
+    except Exception as e:
+        conn.rollback()
+        raise e
     finally:
         curs.close()
         conn.close()
 
-def add_subject(username, name):
-    """Add a new subject for a user."""
+def get_subject_names(username):
+    """Names of all of a user's subjects (including retired), sorted."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(f"SELECT name FROM {SUBJECTS_TABLE} WHERE username = %s AND {VISIBLE_SUBJECT} ORDER BY name", (username,))
+        return [row[0] for row in curs.fetchall()]
+    finally:
+        curs.close()
+        conn.close()
+
+def add_subject(username, name, term=None):
+    """Add a new subject for a user (optionally tagged with a term)."""
     conn = _connect()
     try:
         curs = conn.cursor()
         query = f"""
-        INSERT INTO {SUBJECTS_TABLE} (username, name)
-        VALUES (%s, %s)
+        INSERT INTO {SUBJECTS_TABLE} (username, name, term)
+        VALUES (%s, %s, %s)
         """
-        curs.execute(query, (username, name))
+        curs.execute(query, (username, name, term or None))
         conn.commit()
         return curs.lastrowid
     except Exception as e:
@@ -634,30 +1184,112 @@ def add_subject(username, name):
         curs.close()
         conn.close()
 
-def delete_subject(username, subject_id):
-    """Delete a subject for a user."""
-    conn = _connect()
-    try:
-        curs = _get_dict_cursor(conn)
+def delete_subject(username, subject_id, progress=None):
+    """
+    Delete a subject for a user, with its categories and assignments.
 
-        # First get the subject name, ensuring it belongs to the user
-        curs.execute(f"SELECT name FROM {SUBJECTS_TABLE} WHERE id = %s AND username = %s", (subject_id, username))
-        subject = curs.fetchone()
+    The subject is hidden first (pending_delete, see _hide_subject), then its
+    assignments are removed, DELETE_BATCH_SIZE grade rows per committed
+    statement so other writers are never blocked for long, and finally the
+    subject row. progress(done, total) is called after each batch. Returns 1
+    if the subject was deleted, 0 if it doesn't exist.
+    """
+    subject_name = _hide_subject(username, subject_id)
+    if subject_name is None:
+        return 0
+    return _purge_subject(username, subject_id, subject_name, progress=progress)
 
-        if not subject:
-            return 0
+def delete_subject_in_background(username, subject_id):
+    """
+    Hide a subject now and delete it on a background job (see jobs.py).
+    Returns the Job, or None if the subject doesn't exist.
+    """
+    subject_name = _hide_subject(username, subject_id)
+    if subject_name is None:
+        return None
+    return jobs.submit('delete_subject', _purge_subject, username, subject_id, subject_name, owner=username)
+
+def resume_subject_deletes():
+    """Restart background deletes interrupted by a restart; returns their Jobs."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(f"SELECT username, id, name FROM {SUBJECTS_TABLE} WHERE pending_delete = TRUE")
+        pending = curs.fetchall()
+    finally:
+        curs.close()
+        conn.close()
+    return [jobs.submit('delete_subject', _purge_subject, username, subject_id, name, owner=username)
+            for username, subject_id, name in pending]
 
-        subject_name = subject['name']
+def _hide_subject(username, subject_id):
+    """
+    Mark a user's subject pending_delete and hide it in one transaction: the
+    subject row and its assignments are renamed to DELETED_SUBJECT_PREFIX + id
+    and its categories are deleted. Returns the new name (what _purge_subject
+    deletes by), or None if not found.
+    """
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(f"SELECT name, pending_delete FROM {SUBJECTS_TABLE} WHERE id = %s AND username = %s",
+                     (subject_id, username))
+        row = curs.fetchone()
+        if not row:
+            return None
+        name, pending = row
+        if pending:
+            return name
+        hidden_name = f"{DELETED_SUBJECT_PREFIX}{subject_id}"
+        curs.execute(f"UPDATE {SUBJECTS_TABLE} SET pending_delete = TRUE, name = %s WHERE id = %s AND username = %s",
+                     (hidden_name, subject_id, username))
+        for table in (TABLE_NAME, GRADES_ARCHIVE_TABLE):
+            curs.execute(f"UPDATE {table} SET Subject = %s WHERE username = %s AND Subject = %s",
+                         (hidden_name, username, name))
+        for table in (CATEGORIES_TABLE, CATEGORIES_ARCHIVE_TABLE):
+            curs.execute(f"DELETE FROM {table} WHERE username = %s AND Subject = %s", (username, name))
+        _bump_data_version(curs, username)
+        conn.commit()
+        return hidden_name
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        curs.close()
+        conn.close()
 
-        # Delete all assignments for this subject
-        curs.execute(f"DELETE FROM {TABLE_NAME} WHERE username = %s AND Subject = %s", (username, subject_name))
+def _purge_subject(username, subject_id, subject_name, progress=None):
+    """Delete a hidden subject's categories, assignments (in batches) and row."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        for table in (CATEGORIES_TABLE, CATEGORIES_ARCHIVE_TABLE):
+            curs.execute(f"DELETE FROM {table} WHERE username = %s AND Subject = %s", (username, subject_name))
+        counts = {}
+        for table in (TABLE_NAME, GRADES_ARCHIVE_TABLE):
+            curs.execute(f"SELECT COUNT(*) FROM {table} WHERE username = %s AND Subject = %s",
+                         (username, subject_name))
+            counts[table] = curs.fetchone()[0]
+        total = sum(counts.values())
+        conn.commit()
 
-        # Delete all categories for this subject
-        curs.execute(f"DELETE FROM {CATEGORIES_TABLE} WHERE username = %s AND Subject = %s", (username, subject_name))
+        # Archived subjects keep their grades in the archive table
+        tables = [table for table, count in counts.items() if count] or [TABLE_NAME]
+        done = 0
+        for table in tables:
+            while True:
+                deleted = storage.delete_batch(curs, table, ["username = %s", "Subject = %s"],
+                                               (username, subject_name), DELETE_BATCH_SIZE)
+                if deleted and table == TABLE_NAME:
+                    _bump_data_version(curs, username)
+                conn.commit()
+                done += deleted
+                if progress:
+                    progress(done, total)
+                if deleted < DELETE_BATCH_SIZE:
+                    break
 
-        # Delete the subject itself
         curs.execute(f"DELETE FROM {SUBJECTS_TABLE} WHERE id = %s AND username = %s", (subject_id, username))
-
         conn.commit()
         return curs.rowcount
     except Exception as e:
@@ -672,7 +1304,7 @@ def get_subject_by_name(username, name):
     conn = _connect()
     try:
         curs = _get_dict_cursor(conn)
-        curs.execute(f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s AND name = %s", (username, name))
+        curs.execute(f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s AND name = %s AND {VISIBLE_SUBJECT}", (username, name))
         result = curs.fetchone()
 
         if result:
@@ -701,10 +1333,15 @@ def rename_subject(username, old_name, new_name):
         
         # Update GRADES_TABLE
         curs.execute(f"UPDATE {TABLE_NAME} SET Subject = %s WHERE username = %s AND Subject = %s", (new_name, username, old_name))
+        _bump_data_version(curs, username)
         
         # Update CATEGORIES_TABLE
         curs.execute(f"UPDATE {CATEGORIES_TABLE} SET Subject = %s WHERE username = %s AND Subject = %s", (new_name, username, old_name))
-        
+
+        # Archived rows of a retired subject
+        for table in (GRADES_ARCHIVE_TABLE, CATEGORIES_ARCHIVE_TABLE):
+            curs.execute(f"UPDATE {table} SET Subject = %s WHERE username = %s AND Subject = %s", (new_name, username, old_name))
+
         conn.commit()
         return True
     except Exception as e:
@@ -713,3 +1350,91 @@ def rename_subject(username, old_name, new_name):
     finally:
         curs.close()
         conn.close()
+
+
+# ============================================================================
+# User Preferences (per-subject grade lock and prediction counts)
+# ============================================================================
+
+def increment_subject_prediction_count(username, subject):
+    """Increment the prediction count for a specific subject."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            storage.upsert_sql(USER_PREFERENCES_TABLE,
+                               ['username', 'subject', 'prediction_count', 'grade_lock'],
+                               ['username', 'subject'],
+                               {'prediction_count': 'COALESCE(prediction_count, 0) + 1'}),
+            (username, subject, 1, True)
+        )
+        conn.commit()
+    finally:
+        curs.close()
+        conn.close()
+
+def get_subject_prediction_counts(username):
+    """Get prediction counts per subject for a user: {subject: count}."""
+    conn = _connect()
+    try:
+        curs = _get_dict_cursor(conn)
+        curs.execute(
+            f"""SELECT subject, COALESCE(prediction_count, 0) AS count
+                FROM {USER_PREFERENCES_TABLE}
+                WHERE username = %s AND prediction_count > 0
+                ORDER BY prediction_count DESC""",
+            (username,)
+        )
+        return {row['subject']: row['count'] for row in curs.fetchall()}
+    finally:
+        curs.close()
+        conn.close()
+
+def get_grade_lock_preferences(username):
+    """
+    Get all grade lock preferences for a user.
+    Returns a dictionary: {subject: grade_lock_boolean}
+    """
+    conn = _connect()
+    try:
+        curs = _get_dict_cursor(conn)
+        curs.execute(
+            f"SELECT subject, grade_lock FROM {USER_PREFERENCES_TABLE} WHERE username = %s",
+            (username,)
+        )
+        return {row['subject']: bool(row['grade_lock']) for row in curs.fetchall()}
+    finally:
+        curs.close()
+        conn.close()
+
+def set_grade_lock_preference(username, subject, grade_lock):
+    """Create or update the grade lock preference for a subject."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            storage.upsert_sql(USER_PREFERENCES_TABLE,
+                               ['username', 'subject', 'grade_lock'],
+                               ['username', 'subject'],
+                               {'grade_lock': storage.excluded('grade_lock')}),
+            (username, subject, grade_lock)
+        )
+        conn.commit()
+    finally:
+        curs.close()
+        conn.close()
+
+def get_grade_lock_for_subject(username, subject):
+    """Grade lock preference for a subject (True if never set)."""
+    conn = _connect()
+    try:
+        curs = conn.cursor()
+        curs.execute(
+            f"SELECT grade_lock FROM {USER_PREFERENCES_TABLE} WHERE username = %s AND subject = %s",
+            (username, subject)
+        )
+        result = curs.fetchone()
+        return bool(result[0]) if result else True
+    finally:
+        curs.close()
+        conn.close()
@@ -30,7 +30,8 @@ CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
     PredictedGrade double NULL,
     Position INT NOT NULL DEFAULT 0,
     INDEX idx_user_subject_category (username, Subject, Category),
-    INDEX idx_user_position (username, Position)
+    INDEX idx_user_position (username, Position),
+    INDEX idx_user_subject_position (username, Subject, Position)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 """
 
@@ -56,8 +57,46 @@ CREATE TABLE IF NOT EXISTS {SUBJECTS_TABLE} (
     username varchar(255) NOT NULL,
     name varchar(255) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    pending_delete BOOLEAN DEFAULT FALSE,
+    is_archived BOOLEAN DEFAULT FALSE,
+    term varchar(64) NULL,
     UNIQUE KEY unique_user_subject (username, name),
-    INDEX idx_user_name (username, name)
+    INDEX idx_user_name (username, name),
+    INDEX idx_term_user (term, username)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# Cold storage for retired subjects (crud.retire_subject(archive=True)): the
+# rows keep their ids and move back to the hot tables on unretire
+GRADES_ARCHIVE_TABLE = f"{DB_USER}_grades_archive"
+CATEGORIES_ARCHIVE_TABLE = f"{DB_USER}_categories_archive"
+
+GRADES_ARCHIVE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {GRADES_ARCHIVE_TABLE} (
+    id INT PRIMARY KEY,
+    username varchar(255) NOT NULL,
+    Subject varchar(255) NOT NULL,
+    Category varchar(255) NOT NULL,
+    StudyTime double NOT NULL,
+    AssignmentName varchar(255) NOT NULL,
+    Grade double NULL,
+    Weight double NOT NULL,
+    IsPrediction BOOLEAN DEFAULT FALSE,
+    PredictedGrade double NULL,
+    Position INT NOT NULL DEFAULT 0,
+    INDEX idx_user_subject_position (username, Subject, Position)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+CATEGORIES_ARCHIVE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {CATEGORIES_ARCHIVE_TABLE} (
+    id INT PRIMARY KEY,
+    username varchar(255) NOT NULL,
+    Subject varchar(255) NOT NULL,
+    CategoryName varchar(255) NOT NULL,
+    TotalWeight double NOT NULL,
+    DefaultName varchar(255),
+    INDEX idx_user_subject (username, Subject)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 """
 
@@ -113,14 +152,23 @@ def init_db():
         cur.execute(SUBJECTS_DDL)
         cur.execute(USERS_DDL)
         cur.execute(USER_PREFERENCES_DDL)
+        cur.execute(GRADES_ARCHIVE_DDL)
+        cur.execute(CATEGORIES_ARCHIVE_DDL)
         conn.commit()
     finally:
         cur.close()
         conn.close()
 
     ensure_position_column()
+    ensure_grade_indexes()
     ensure_retired_column()
+    ensure_pending_delete_column()
+    ensure_archived_column()
+    ensure_term_column()
     ensure_predicted_grade_column()
+    ensure_prediction_run_count_column()
+    ensure_data_version_column()
+    ensure_subject_prediction_count_column()
 
     # Seed initial data if tables are empty
     seed_initial_data()
@@ -220,23 +268,12 @@ def ensure_position_column():
             cur.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN Position INT NOT NULL DEFAULT 0")
             cur.execute(f"CREATE INDEX idx_user_position ON {TABLE_NAME} (username, Position)")
 
-            # Backfill positions per user in (username, id) order
-            # We'll do it in Python to avoid multi-statement SQL hassles.
-            c2 = conn.cursor(DictCursor)
-            c2.execute(f"SELECT id, username FROM {TABLE_NAME} ORDER BY username, id")
-            pos_by_user = {}
-            updates = []
-            for row in c2:
-                u = row['username']
-                p = pos_by_user.get(u, 0)
-                updates.append((p, row['id']))
-                pos_by_user[u] = p + 1
-            c2.close()
-
-            if updates:
-                cur.executemany(f"UPDATE {TABLE_NAME} SET Position=%s WHERE id=%s", updates)
-
             conn.commit()
+
+            # Backfill positions per user in (username, id) order, one
+            # window-function UPDATE per batch of users (see storage.py)
+            from storage import MySQLStorage
+            MySQLStorage().backfill_positions(conn)
     finally:
         try:
             cur.close()
@@ -287,31 +324,21 @@ def ensure_prediction_run_count_column():
             pass
         conn.close()
 
-def increment_prediction_run_count(username):
-    """Increment the prediction run count for a user."""
+def ensure_data_version_column():
+    """Add data_version column (bumped on every grade write) to users table if missing."""
     conn = _connect()
     try:
         cur = conn.cursor()
-        cur.execute(
-            f"UPDATE {USERS_TABLE} SET prediction_run_count = COALESCE(prediction_run_count, 0) + 1 WHERE username = %s",
-            (username,)
-        )
-        conn.commit()
-    finally:
-        cur.close()
-        conn.close()
-
-def get_prediction_run_count(username):
-    """Get the prediction run count for a user."""
-    conn = _connect()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            f"SELECT COALESCE(prediction_run_count, 0) FROM {USERS_TABLE} WHERE username = %s",
-            (username,)
-        )
-        result = cur.fetchone()
-        return result[0] if result else 0
+        cur.execute(f"""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = '{DB_NAME}'
+            AND TABLE_NAME = '{USERS_TABLE}'
+            AND COLUMN_NAME = 'data_version'
+        """)
+        if cur.fetchone()[0] == 0:
+            cur.execute(f"ALTER TABLE {USERS_TABLE} ADD COLUMN data_version BIGINT NOT NULL DEFAULT 0")
+            conn.commit()
+            print(f"Added data_version column to {USERS_TABLE}")
     finally:
         cur.close()
         conn.close()
@@ -337,96 +364,80 @@ def ensure_subject_prediction_count_column():
             pass
         conn.close()
 
-def increment_subject_prediction_count(username, subject):
-    """Increment the prediction count for a specific subject."""
+def ensure_grade_indexes():
+    """Create grades indexes added after the table was first deployed."""
     conn = _connect()
     try:
         cur = conn.cursor()
-        # Use INSERT ... ON DUPLICATE KEY UPDATE to handle both new and existing rows
-        cur.execute(
-            f"""
-            INSERT INTO {USER_PREFERENCES_TABLE} (username, subject, prediction_count, grade_lock)
-            VALUES (%s, %s, 1, TRUE)
-            ON DUPLICATE KEY UPDATE prediction_count = COALESCE(prediction_count, 0) + 1
-            """,
-            (username, subject)
-        )
-        conn.commit()
-    finally:
-        cur.close()
-        conn.close()
-
-def get_subject_prediction_counts(username):
-    """Get prediction counts per subject for a user."""
-    conn = _connect()
-    try:
-        cur = conn.cursor(DictCursor)
-        cur.execute(
-            f"SELECT subject, COALESCE(prediction_count, 0) as count FROM {USER_PREFERENCES_TABLE} WHERE username = %s AND prediction_count > 0 ORDER BY prediction_count DESC",
-            (username,)
-        )
-        results = cur.fetchall()
-        return {row['subject']: row['count'] for row in results}
+        cur.execute("""
+            SELECT COUNT(*) FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s AND INDEX_NAME='idx_user_subject_position'
+        """, (DB_NAME, TABLE_NAME))
+        if cur.fetchone()[0] == 0:
+            # Keyset pages of one subject: (username, Subject) prefix, then (Position, id)
+            cur.execute(f"CREATE INDEX idx_user_subject_position ON {TABLE_NAME} (username, Subject, Position)")
+            conn.commit()
+            print(f"Added idx_user_subject_position to {TABLE_NAME}")
+    except Exception as e:
+        print(f"Warning: Could not create grades indexes: {e}")
     finally:
         cur.close()
         conn.close()
 
-def get_grade_lock_preferences(username):
-    """
-    Get all grade lock preferences for a user.
-    Returns a dictionary: {subject: grade_lock_boolean}
-    """
+def ensure_pending_delete_column():
+    """Add pending_delete column (subject being deleted in the background) if missing."""
     conn = _connect()
     try:
-        cur = conn.cursor(DictCursor)
-        cur.execute(
-            f"SELECT subject, grade_lock FROM {USER_PREFERENCES_TABLE} WHERE username = %s",
-            (username,)
-        )
-        results = cur.fetchall()
-        # Convert to dict
-        return {row['subject']: bool(row['grade_lock']) for row in results}
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = '{DB_NAME}'
+            AND TABLE_NAME = '{SUBJECTS_TABLE}'
+            AND COLUMN_NAME = 'pending_delete'
+        """)
+        if cur.fetchone()[0] == 0:
+            cur.execute(f"ALTER TABLE {SUBJECTS_TABLE} ADD COLUMN pending_delete BOOLEAN DEFAULT FALSE")
+            conn.commit()
+            print(f"Added pending_delete column to {SUBJECTS_TABLE}")
     finally:
         cur.close()
         conn.close()
 
-def set_grade_lock_preference(username, subject, grade_lock):
-    """
-    Set grade lock preference for a specific subject.
-    Uses INSERT ... ON DUPLICATE KEY UPDATE to create or update.
-    """
+def ensure_archived_column():
+    """Add is_archived column (retired subject moved to the archive tables) if missing."""
     conn = _connect()
     try:
         cur = conn.cursor()
-        cur.execute(
-            f"""
-            INSERT INTO {USER_PREFERENCES_TABLE} (username, subject, grade_lock)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE grade_lock = VALUES(grade_lock)
-            """,
-            (username, subject, grade_lock)
-        )
-        conn.commit()
+        cur.execute(f"""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = '{DB_NAME}'
+            AND TABLE_NAME = '{SUBJECTS_TABLE}'
+            AND COLUMN_NAME = 'is_archived'
+        """)
+        if cur.fetchone()[0] == 0:
+            cur.execute(f"ALTER TABLE {SUBJECTS_TABLE} ADD COLUMN is_archived BOOLEAN DEFAULT FALSE")
+            conn.commit()
+            print(f"Added is_archived column to {SUBJECTS_TABLE}")
     finally:
         cur.close()
         conn.close()
 
-def get_grade_lock_for_subject(username, subject):
-    """
-    Get grade lock preference for a specific subject.
-    Returns True by default if not set.
-    """
+def ensure_term_column():
+    """Add term column (and its index) to the subjects table if missing."""
     conn = _connect()
     try:
         cur = conn.cursor()
-        cur.execute(
-            f"SELECT grade_lock FROM {USER_PREFERENCES_TABLE} WHERE username = %s AND subject = %s",
-            (username, subject)
-        )
-        result = cur.fetchone()
-        if result:
-            return bool(result[0])
-        return True  # Default to True if not set
+        cur.execute(f"""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = '{DB_NAME}'
+            AND TABLE_NAME = '{SUBJECTS_TABLE}'
+            AND COLUMN_NAME = 'term'
+        """)
+        if cur.fetchone()[0] == 0:
+            cur.execute(f"ALTER TABLE {SUBJECTS_TABLE} ADD COLUMN term varchar(64) NULL, "
+                        f"ADD INDEX idx_term_user (term, username)")
+            conn.commit()
+            print(f"Added term column to {SUBJECTS_TABLE}")
     finally:
         cur.close()
         conn.close()
@@ -456,55 +467,3 @@ def ensure_retired_column():
         cur.close()
         conn.close()
 
-def retire_subject(username, subject_name):
-    """Mark a subject as retired."""
-    conn = _connect()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            f"UPDATE {SUBJECTS_TABLE} SET is_retired = TRUE WHERE username = %s AND name = %s",
-            (username, subject_name)
-        )
-        conn.commit()
-        return cur.rowcount > 0
-    finally:
-        cur.close()
-        conn.close()
-
-def unretire_subject(username, subject_name):
-    """Mark a subject as not retired (active)."""
-    conn = _connect()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            f"UPDATE {SUBJECTS_TABLE} SET is_retired = FALSE WHERE username = %s AND name = %s",
-            (username, subject_name)
-        )
-        conn.commit()
-        return cur.rowcount > 0
-    finally:
-        cur.close()
-        conn.close()
-
-def get_retired_subjects(username):
-    """Get all retired subjects for a user."""
-    conn = _connect()
-    try:
-        cur = conn.cursor(DictCursor)
-        cur.execute(
-            f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s AND is_retired = TRUE ORDER BY name",
-            (username,)
-        )
-        results = cur.fetchall()
-        return [
-            {
-                'id': row['id'],
-                'name': row['name'],
-                'created_at': row['created_at'],
-                'is_retired': True
-            }
-            for row in results
-        ]
-    finally:
-        cur.close()
-        conn.close()
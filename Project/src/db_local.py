@@ -1,41 +1,229 @@
 # Local SQLite database configuration for development
-# Use this when you can't access the remote MySQL server
+# Use this when you can't access the remote MySQL server, for small
+# self-hosted deployments, and for fast benchmark/test runs
 
 import sqlite3
 import os
+import pathlib
+import threading
+from functools import lru_cache
 
-# Database file location
-DB_FILE = os.path.join(os.path.dirname(__file__), 'local_dev.db')
+# Database file location (LOCAL_DB_FILE lets benchmarks/tests point at a scratch file).
+# LOCAL_DB_FILE=:memory: selects a shared-cache in-memory database: every thread's
+# connection sees the same data, which lives until the process exits.
+DB_FILE = os.getenv("LOCAL_DB_FILE") or os.path.join(os.path.dirname(__file__), 'local_dev.db')
+IN_MEMORY = DB_FILE == ':memory:'
+# Set by use_database(read_only=True): the file is opened as an immutable snapshot
+READ_ONLY = False
+MEMORY_DB_URI = "file:snowmark?mode=memory&cache=shared"
 
 # Table names
 TABLE_NAME = "grades"
 CATEGORIES_TABLE = "categories"
 SUBJECTS_TABLE = "subjects"
 USERS_TABLE = "users"
+USER_PREFERENCES_TABLE = "user_preferences"
+GRADES_ARCHIVE_TABLE = "grades_archive"
+CATEGORIES_ARCHIVE_TABLE = "categories_archive"
+
+# Seconds to wait on a locked database before raising "database is locked"
+BUSY_TIMEOUT = 30
+
+# Applied to every new connection. WAL lets readers run alongside a writer,
+# synchronous=NORMAL is safe with WAL and avoids an fsync per commit,
+# cache_size is in KiB when negative (~64 MB page cache).
+SQLITE_PRAGMAS = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -64000),
+    ("mmap_size", 256 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+    ("foreign_keys", "ON"),
+]
+# The ones that don't touch the file, for read-only snapshots
+SQLITE_READ_PRAGMAS = [("cache_size", -64000), ("mmap_size", 256 * 1024 * 1024), ("temp_store", "MEMORY")]
+
+# One connection per thread (and per process, so forked workers never share one)
+_local = threading.local()
+# Bumped by use_database() so other threads (pool workers) reopen their connection
+_generation = 0
+
+# A shared-cache in-memory database is dropped when its last connection closes,
+# so one extra connection is kept open for the life of the process
+_memory_anchor = None
+_memory_anchor_lock = threading.Lock()
+
+# Shared-cache table locks fail straight away ("database table is locked")
+# instead of honouring the busy timeout, so units of work on the in-memory
+# database run one at a time per process. Re-entrant for nested units of work
+# on the same thread.
+_memory_lock = threading.RLock()
+
+
+@lru_cache(maxsize=512)
+def _translate(query):
+    """Convert MySQL %s placeholders to SQLite ? (cached per statement text)."""
+    return query.replace('%s', '?')
+
+
+def _open_connection():
+    """Open a new SQLite connection with the tuned pragmas applied."""
+    global _memory_anchor
+    if IN_MEMORY:
+        with _memory_anchor_lock:
+            if _memory_anchor is None:
+                _memory_anchor = sqlite3.connect(MEMORY_DB_URI, uri=True, check_same_thread=False)
+        conn = sqlite3.connect(MEMORY_DB_URI, uri=True, timeout=BUSY_TIMEOUT)
+        # WAL/mmap don't apply to memory databases
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+    if READ_ONLY:
+        # immutable: no locks and no -wal/-shm files, so the snapshot is left exactly as it was
+        conn = sqlite3.connect(f"{pathlib.Path(DB_FILE).resolve().as_uri()}?mode=ro&immutable=1",
+                               uri=True, timeout=BUSY_TIMEOUT)
+        for name, value in SQLITE_READ_PRAGMAS:
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT)
+    for name, value in SQLITE_PRAGMAS:
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+def _thread_connection():
+    """Return this thread's SQLite connection, opening it on first use."""
+    pid = os.getpid()
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'pid', None) != pid or getattr(_local, 'generation', None) != _generation:
+        if conn is not None and getattr(_local, 'pid', None) == pid:
+            conn.close()
+        conn = _open_connection()
+        _local.conn = conn
+        _local.pid = pid
+        _local.generation = _generation
+    return conn
+
+
+def close_connection():
+    """Close this thread's connection (the next _connect() opens a fresh one)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and getattr(_local, 'pid', None) == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+def use_database(path, read_only=False):
+    """
+    Point this module at another SQLite file (or ':memory:') from now on.
+    read_only opens the file as an immutable snapshot that must not change
+    while it is in use (writes fail with "attempt to write a readonly database").
+    """
+    global DB_FILE, IN_MEMORY, READ_ONLY, _generation
+    close_connection()
+    DB_FILE = path
+    IN_MEMORY = path == ':memory:'
+    READ_ONLY = read_only and not IN_MEMORY
+    _generation += 1
+
+
+def begin_test_transaction():
+    """
+    Open an outer transaction on this thread's connection for a test case.
+
+    Until rollback_test_transaction() is called, each _connect() unit of work
+    runs inside a savepoint: commit() releases it into the outer transaction and
+    rollback() rolls back to it, so code under test behaves normally but nothing
+    reaches the database for real.
+    """
+    conn = _thread_connection()
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN")
+    _local.pinned = True
+
+
+def rollback_test_transaction():
+    """Discard everything written since begin_test_transaction()."""
+    _local.pinned = False
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
 
 # MySQL-compatible wrapper for SQLite
 class SQLiteConnection:
-    """Wrapper to make SQLite behave more like MySQL connector"""
+    """
+    Wrapper to make SQLite behave more like MySQL connector.
+
+    Wraps the calling thread's long-lived connection, so close() only ends the
+    current unit of work (rolling back anything left uncommitted) instead of
+    closing the underlying connection; it is also a context manager that does
+    so on exit. Inside begin_test_transaction() the unit of work is a savepoint
+    instead of a real transaction. On the in-memory database the unit of work
+    also holds _memory_lock until close(). Waiting for that lock gives up after
+    BUSY_TIMEOUT like a locked file would, and a unit of work that is dropped
+    without close() is closed when it is garbage collected, so a leaked
+    handle can't block other threads for good.
+    """
     def __init__(self, conn):
         self.conn = conn
-        self.conn.row_factory = sqlite3.Row  # Enable dict-like access
-        
+        self.serialized = False
+        self.savepoint = False
+        if IN_MEMORY:
+            if not _memory_lock.acquire(timeout=BUSY_TIMEOUT):
+                raise sqlite3.OperationalError("database is locked")
+            self.serialized = True
+        self.savepoint = getattr(_local, 'pinned', False)
+        if self.savepoint:
+            self.conn.execute("SAVEPOINT unit_of_work")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        if self.serialized:
+            try:
+                self.close()
+            except Exception:
+                pass
+
     def cursor(self, dictionary=False):
         return SQLiteCursor(self.conn.cursor(), dictionary)
-    
+
     def commit(self):
-        self.conn.commit()
-    
+        if self.savepoint:
+            # Keep the savepoint open so later statements on this handle stay undoable
+            self.conn.execute("RELEASE SAVEPOINT unit_of_work")
+            self.conn.execute("SAVEPOINT unit_of_work")
+        else:
+            self.conn.commit()
+
     def rollback(self):
-        self.conn.rollback()
-    
+        if self.savepoint:
+            self.conn.execute("ROLLBACK TO SAVEPOINT unit_of_work")
+        else:
+            self.conn.rollback()
+
     def close(self):
-        self.conn.close()
-    
+        try:
+            if self.savepoint:
+                self.conn.execute("ROLLBACK TO SAVEPOINT unit_of_work")
+                self.conn.execute("RELEASE SAVEPOINT unit_of_work")
+                self.savepoint = False
+            elif self.conn.in_transaction:
+                self.conn.rollback()
+        finally:
+            if self.serialized:
+                self.serialized = False
+                _memory_lock.release()
+
     @property
     def autocommit(self):
         return self.conn.isolation_level is None
-    
+
     @autocommit.setter
     def autocommit(self, value):
         self.conn.isolation_level = None if value else 'DEFERRED'
@@ -45,49 +233,66 @@ class SQLiteCursor:
     def __init__(self, cursor, dictionary=False):
         self.cursor = cursor
         self.dictionary = dictionary
-        
+        self._columns = None
+
     def execute(self, query, params=None):
-        # Convert MySQL %s to SQLite ?
-        if params:
-            query = query.replace('%s', '?')
-        return self.cursor.execute(query, params or [])
-    
+        self._columns = None
+        return self.cursor.execute(_translate(query), params or [])
+
     def executemany(self, query, params_list):
-        query = query.replace('%s', '?')
-        return self.cursor.executemany(query, params_list)
-    
+        self._columns = None
+        return self.cursor.executemany(_translate(query), params_list)
+
+    def _column_names(self):
+        # Built once per statement rather than once per row
+        if self._columns is None:
+            self._columns = tuple(col[0] for col in self.cursor.description)
+        return self._columns
+
     def fetchone(self):
         row = self.cursor.fetchone()
-        if row and self.dictionary:
-            return dict(row)
+        if row is not None and self.dictionary:
+            return dict(zip(self._column_names(), row))
         return row
-    
+
     def fetchall(self):
         rows = self.cursor.fetchall()
         if rows and self.dictionary:
-            return [dict(row) for row in rows]
+            columns = self._column_names()
+            return [dict(zip(columns, row)) for row in rows]
         return rows
-    
+
+    def __iter__(self):
+        if not self.dictionary:
+            return iter(self.cursor)
+        columns = self._column_names()
+        return (dict(zip(columns, row)) for row in self.cursor)
+
     def close(self):
         self.cursor.close()
-    
+
+    @property
+    def description(self):
+        return self.cursor.description
+
     @property
     def rowcount(self):
         return self.cursor.rowcount
-    
+
     @property
     def lastrowid(self):
         return self.cursor.lastrowid
 
-# SQLite DDL (slightly different from MySQL)
+# SQLite DDL (slightly different from MySQL). Text columns use NOCASE to match
+# MySQL's default case-insensitive collation (usernames, subject names, ...)
 GRADES_DDL = f"""
 CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT NOT NULL,
-    Subject TEXT NOT NULL,
-    Category TEXT NOT NULL,
+    username TEXT COLLATE NOCASE NOT NULL,
+    Subject TEXT COLLATE NOCASE NOT NULL,
+    Category TEXT COLLATE NOCASE NOT NULL,
     StudyTime REAL NOT NULL,
-    AssignmentName TEXT NOT NULL,
+    AssignmentName TEXT COLLATE NOCASE NOT NULL,
     Grade REAL,
     Weight REAL NOT NULL,
     IsPrediction INTEGER DEFAULT 0,
@@ -96,14 +301,21 @@ CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
 );
 """
 
+# Same secondary indexes as the MySQL grades table
+GRADES_INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS idx_user_subject_category ON {TABLE_NAME} (username, Subject, Category)",
+    f"CREATE INDEX IF NOT EXISTS idx_user_position ON {TABLE_NAME} (username, Position)",
+    f"CREATE INDEX IF NOT EXISTS idx_user_subject_position ON {TABLE_NAME} (username, Subject, Position)",
+]
+
 CATEGORIES_DDL = f"""
 CREATE TABLE IF NOT EXISTS {CATEGORIES_TABLE} (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT NOT NULL,
-    Subject TEXT NOT NULL,
-    CategoryName TEXT NOT NULL,
+    username TEXT COLLATE NOCASE NOT NULL,
+    Subject TEXT COLLATE NOCASE NOT NULL,
+    CategoryName TEXT COLLATE NOCASE NOT NULL,
     TotalWeight REAL NOT NULL,
-    DefaultName TEXT,
+    DefaultName TEXT COLLATE NOCASE,
     UNIQUE(username, Subject, CategoryName)
 );
 """
@@ -111,26 +323,76 @@ CREATE TABLE IF NOT EXISTS {CATEGORIES_TABLE} (
 SUBJECTS_DDL = f"""
 CREATE TABLE IF NOT EXISTS {SUBJECTS_TABLE} (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT NOT NULL,
-    name TEXT NOT NULL,
+    username TEXT COLLATE NOCASE NOT NULL,
+    name TEXT COLLATE NOCASE NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     is_retired INTEGER DEFAULT 0,
+    pending_delete INTEGER DEFAULT 0,
+    is_archived INTEGER DEFAULT 0,
+    term TEXT COLLATE NOCASE,
     UNIQUE(username, name)
 );
 """
 
+# Cold storage for retired subjects; same columns as the hot tables, ids kept
+GRADES_ARCHIVE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {GRADES_ARCHIVE_TABLE} (
+    id INTEGER PRIMARY KEY,
+    username TEXT COLLATE NOCASE NOT NULL,
+    Subject TEXT COLLATE NOCASE NOT NULL,
+    Category TEXT COLLATE NOCASE NOT NULL,
+    StudyTime REAL NOT NULL,
+    AssignmentName TEXT COLLATE NOCASE NOT NULL,
+    Grade REAL,
+    Weight REAL NOT NULL,
+    IsPrediction INTEGER DEFAULT 0,
+    PredictedGrade REAL,
+    Position INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+CATEGORIES_ARCHIVE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {CATEGORIES_ARCHIVE_TABLE} (
+    id INTEGER PRIMARY KEY,
+    username TEXT COLLATE NOCASE NOT NULL,
+    Subject TEXT COLLATE NOCASE NOT NULL,
+    CategoryName TEXT COLLATE NOCASE NOT NULL,
+    TotalWeight REAL NOT NULL,
+    DefaultName TEXT COLLATE NOCASE
+);
+"""
+
+ARCHIVE_INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS idx_archive_user_subject_position ON {GRADES_ARCHIVE_TABLE} (username, Subject, Position)",
+    f"CREATE INDEX IF NOT EXISTS idx_archive_user_subject ON {CATEGORIES_ARCHIVE_TABLE} (username, Subject)",
+]
+
 USERS_DDL = f"""
 CREATE TABLE IF NOT EXISTS {USERS_TABLE} (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT NOT NULL UNIQUE,
+    username TEXT COLLATE NOCASE NOT NULL UNIQUE,
     password_hash TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    prediction_run_count INTEGER DEFAULT 0
+);
+"""
+
+# User Preferences table DDL - stores per-subject settings like grade_lock
+USER_PREFERENCES_DDL = f"""
+CREATE TABLE IF NOT EXISTS {USER_PREFERENCES_TABLE} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT COLLATE NOCASE NOT NULL,
+    subject TEXT COLLATE NOCASE NOT NULL,
+    grade_lock INTEGER DEFAULT 1,
+    prediction_count INTEGER DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(username, subject)
 );
 """
 
 def _connect():
-    """Get SQLite connection wrapped to be MySQL-compatible"""
-    return SQLiteConnection(sqlite3.connect(DB_FILE))
+    """Get this thread's SQLite connection wrapped to be MySQL-compatible"""
+    return SQLiteConnection(_thread_connection())
 
 def ensure_retired_column():
     """Add is_retired column to subjects table if it doesn't exist (SQLite)."""
@@ -168,6 +430,77 @@ def ensure_predicted_grade_column():
         cur.close()
         conn.close()
 
+def _add_column_if_missing(table, column, ddl):
+    """Add a column to an existing SQLite table (older local_dev.db files)."""
+    conn = _connect()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in cur.cursor.fetchall()]
+        if column not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {ddl}")
+            conn.commit()
+            print(f"Added {column} column to {table}")
+            return True
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+def ensure_position_column():
+    """Add Position column to grades table if it doesn't exist, then backfill it (SQLite)."""
+    if _add_column_if_missing(TABLE_NAME, 'Position', "Position INTEGER NOT NULL DEFAULT 0"):
+        from storage import SQLiteStorage
+        conn = _connect()
+        try:
+            SQLiteStorage().backfill_positions(conn)
+        finally:
+            conn.close()
+
+def ensure_pending_delete_column():
+    """Add pending_delete column to subjects table if missing (SQLite)."""
+    _add_column_if_missing(SUBJECTS_TABLE, 'pending_delete', "pending_delete INTEGER DEFAULT 0")
+
+def ensure_archived_column():
+    """Add is_archived column to subjects table if missing (SQLite)."""
+    _add_column_if_missing(SUBJECTS_TABLE, 'is_archived', "is_archived INTEGER DEFAULT 0")
+
+def ensure_term_column():
+    """Add term column (and its index) to subjects table if missing (SQLite)."""
+    _add_column_if_missing(SUBJECTS_TABLE, 'term', "term TEXT COLLATE NOCASE")
+    conn = _connect()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_term_user ON {SUBJECTS_TABLE} (term, username)")
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def ensure_grade_indexes():
+    """Create the grades table's secondary indexes if missing (SQLite)."""
+    conn = _connect()
+    try:
+        cur = conn.cursor()
+        for ddl in GRADES_INDEXES:
+            cur.execute(ddl)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def ensure_prediction_run_count_column():
+    """Add prediction_run_count column to users table if missing (SQLite)."""
+    _add_column_if_missing(USERS_TABLE, 'prediction_run_count', "prediction_run_count INTEGER DEFAULT 0")
+
+def ensure_data_version_column():
+    """Add data_version column (bumped on every grade write) to users table if missing (SQLite)."""
+    _add_column_if_missing(USERS_TABLE, 'data_version', "data_version INTEGER NOT NULL DEFAULT 0")
+
+def ensure_subject_prediction_count_column():
+    """Add prediction_count column to user_preferences table if missing (SQLite)."""
+    _add_column_if_missing(USER_PREFERENCES_TABLE, 'prediction_count', "prediction_count INTEGER DEFAULT 0")
+
 def init_db():
     """Create database and tables if they don't exist."""
     conn = _connect()
@@ -177,6 +510,11 @@ def init_db():
         cur.execute(CATEGORIES_DDL)
         cur.execute(SUBJECTS_DDL)
         cur.execute(USERS_DDL)
+        cur.execute(USER_PREFERENCES_DDL)
+        cur.execute(GRADES_ARCHIVE_DDL)
+        cur.execute(CATEGORIES_ARCHIVE_DDL)
+        for ddl in ARCHIVE_INDEXES:
+            cur.execute(ddl)
         conn.commit()
         print(f"✓ Database initialized at {DB_FILE}")
     finally:
@@ -184,7 +522,15 @@ def init_db():
         conn.close()
     
     ensure_retired_column()
+    ensure_pending_delete_column()
+    ensure_archived_column()
+    ensure_term_column()
     ensure_predicted_grade_column()
+    ensure_position_column()
+    ensure_prediction_run_count_column()
+    ensure_data_version_column()
+    ensure_subject_prediction_count_column()
+    ensure_grade_indexes()
     seed_initial_data()
 
 def seed_initial_data():
@@ -249,59 +595,6 @@ def seed_initial_data():
         cur.close()
         conn.close()
 
-def retire_subject(username, subject_name):
-    """Mark a subject as retired."""
-    conn = _connect()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            f"UPDATE {SUBJECTS_TABLE} SET is_retired = 1 WHERE username = %s AND name = %s",
-            (username, subject_name)
-        )
-        conn.commit()
-        return cur.rowcount > 0
-    finally:
-        cur.close()
-        conn.close()
-
-def unretire_subject(username, subject_name):
-    """Mark a subject as not retired (active)."""
-    conn = _connect()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            f"UPDATE {SUBJECTS_TABLE} SET is_retired = 0 WHERE username = %s AND name = %s",
-            (username, subject_name)
-        )
-        conn.commit()
-        return cur.rowcount > 0
-    finally:
-        cur.close()
-        conn.close()
-
-def get_retired_subjects(username):
-    """Get all retired subjects for a user."""
-    conn = _connect()
-    try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            f"SELECT * FROM {SUBJECTS_TABLE} WHERE username = %s AND is_retired = 1 ORDER BY name",
-            (username,)
-        )
-        results = cur.fetchall()
-        return [
-            {
-                'id': row['id'],
-                'name': row['name'],
-                'created_at': row['created_at'],
-                'is_retired': True
-            }
-            for row in results
-        ]
-    finally:
-        cur.close()
-        conn.close()
-
 if __name__ == "__main__":
     init_db()
     print("Database setup complete!")
@@ -0,0 +1,147 @@
+# Background jobs
+#
+# Long-running maintenance work - deleting a large subject, for example - runs
+# on a small thread pool, so the request that starts it can return straight
+# away. A job's function is called with a `progress` keyword argument that it
+# calls as progress(done, total); the request (or a later one polling
+# /api/jobs/<id>) reads the job's state with get_job(). Jobs live in process
+# memory and the most recent MAX_JOBS are kept. Jobs submitted with a `key`
+# are coalesced: while one with the same name and key is still queued, it is
+# returned instead of queueing another (it will see the newer data anyway).
+#
+# Serverless hosts (Vercel, AWS Lambda) freeze or recycle the process as soon
+# as the response is sent, so work left on the pool may never run. There jobs
+# run inline: submit() runs the function in the calling request and returns
+# the finished Job, so callers and /api/jobs/<id> behave the same either way.
+#
+#   JOB_THREADS   worker threads (default 2)
+#   JOB_MODE      'background' or 'inline' (default: inline on serverless hosts)
+
+import itertools
+import os
+import threading
+from collections import OrderedDict
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_THREADS = int(os.getenv("JOB_THREADS", "2"))
+SERVERLESS = bool(os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+JOB_MODE = os.getenv("JOB_MODE") or ('inline' if SERVERLESS else 'background')
+MAX_JOBS = 100
+
+_jobs = OrderedDict()
+_queued = {}  # (name, key) -> queued Job
+_jobs_lock = threading.Lock()
+_ids = itertools.count(1)
+_pool = None
+_pool_pid = None
+
+
+class Job:
+    """State of one background job."""
+
+    def __init__(self, name, owner=None, key=None):
+        self.id = next(_ids)
+        self.name = name
+        self.owner = owner
+        self.key = key
+        self.status = 'queued'  # queued | running | done | failed
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.future = None
+
+    def report(self, done, total=None):
+        """Progress callback handed to the job function."""
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns its result (or raises its error)."""
+        return self.future.result(timeout)
+
+    def to_json(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'error': self.error,
+        }
+
+
+def _get_pool():
+    """The shared pool, created on first use (and again in a forked worker)."""
+    global _pool, _pool_pid
+    with _jobs_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=JOB_THREADS, thread_name_prefix='job')
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _run(job, fn, args, kwargs):
+    with _jobs_lock:
+        if job.key is not None and _queued.get((job.name, job.key)) is job:
+            del _queued[(job.name, job.key)]
+    job.status = 'running'
+    try:
+        job.result = fn(*args, progress=job.report, **kwargs)
+        job.status = 'done'
+        return job.result
+    except Exception as e:
+        print(f"Background job {job.name} #{job.id} failed: {e}")
+        job.error = str(e)
+        job.status = 'failed'
+        raise
+
+
+def runs_in_background():
+    """Whether submitted jobs outlive the request (False when JOB_MODE is 'inline')."""
+    return JOB_MODE != 'inline'
+
+
+def submit(name, fn, *args, owner=None, key=None, **kwargs):
+    """
+    Run fn(*args, progress=..., **kwargs) in the background; returns its Job.
+    With JOB_MODE 'inline' it runs now and the Job comes back finished (a
+    failure is recorded on the Job, not raised).
+    """
+    inline = not runs_in_background()
+    with _jobs_lock:
+        if not inline and key is not None and (name, key) in _queued:
+            return _queued[(name, key)]
+        job = Job(name, owner, key)
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+        if not inline and key is not None:
+            _queued[(name, key)] = job
+    if inline:
+        job.future = concurrent.futures.Future()
+        try:
+            job.future.set_result(_run(job, fn, args, kwargs))
+        except Exception as e:
+            job.future.set_exception(e)
+    else:
+        job.future = _get_pool().submit(_run, job, fn, args, kwargs)
+    return job
+
+
+def wait_all(timeout=None):
+    """Block until every job submitted so far has finished (errors are not raised)."""
+    with _jobs_lock:
+        futures = [job.future for job in _jobs.values() if job.future is not None]
+    concurrent.futures.wait(futures, timeout)
+
+
+def get_job(job_id, owner=None):
+    """The job with this id, or None (also None if `owner` is given and doesn't match)."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None or (owner is not None and job.owner != owner):
+        return None
+    return job
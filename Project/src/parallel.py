@@ -0,0 +1,62 @@
+# Concurrent data fetches for page renders
+#
+# A page needs several independent queries (categories, grade totals,
+# subjects, the rows on screen, the summary). Against the remote MySQL server
+# each one is a network round trip, so fetch_all() runs them on a small shared
+# thread pool and the page waits for the slowest query instead of the sum of
+# all of them. Every crud call opens its own connection, so the queries don't
+# share any state.
+#
+# SQLite queries run in-process, where threads only add overhead (and the
+# tests' rollback transaction is per thread), so by default the pool is only
+# used with the mysql backend. Settings come from the environment:
+#
+#   PARALLEL_FETCH   on | off | auto (default auto: on for DB_BACKEND=mysql)
+#   FETCH_THREADS    pool size (default 6)
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import backend_name
+
+FETCH_THREADS = int(os.getenv("FETCH_THREADS", "6"))
+
+
+def _enabled_from_env():
+    setting = os.getenv("PARALLEL_FETCH", "auto").strip().lower()
+    if setting == 'auto':
+        return backend_name() == 'mysql'
+    return setting in ('on', 'true', '1')
+
+
+ENABLED = _enabled_from_env()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """The shared pool, created on first use (and again in a forked worker)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=FETCH_THREADS, thread_name_prefix='fetch')
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def fetch_all(**calls):
+    """
+    Run independent zero-argument callables and return {name: result}.
+
+    With ENABLED the calls run concurrently on the pool; otherwise they run
+    one after another in the calling thread. Either way the first exception
+    raised by a call propagates to the caller.
+    """
+    if not ENABLED or len(calls) < 2:
+        return {name: fn() for name, fn in calls.items()}
+    pool = _get_pool()
+    futures = {name: pool.submit(fn) for name, fn in calls.items()}
+    return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,136 @@
+# Prediction response cache and counters
+#
+# Users ask /predict for the same inputs over and over as they tab between
+# rows. Responses are kept in a bounded LRU keyed on the request's inputs plus
+# the user's data version (crud.get_data_version), which every write to their
+# grades bumps. A grade change therefore invalidates the user's entries with
+# no bookkeeping: they are never looked up again and age out of the LRU. The
+# cache is per process; the version lives in the users table, so with several
+# workers each one's cache still sees the other workers' writes. It is read
+# with the user row flask-login loads anyway, so a hit costs no query.
+#
+# The prediction counters shown on the stats page would otherwise cost two
+# writes per /predict call, hit or not. PredictionCounts buffers them and
+# writes them in one batch every PREDICT_COUNT_FLUSH_SECONDS (checked on the
+# next call, not by a timer), before the counts are read, and at exit. A
+# process that is killed, or a serverless instance that is recycled, loses
+# at most that interval's counts.
+#
+#   PREDICT_CACHE_SIZE            entries kept (default 1024); 0 disables the cache
+#   PREDICT_COUNT_FLUSH_SECONDS   longest a count waits in the buffer (default 10); 0 writes each one
+#
+# Hit and miss counters are served at /api/predict_cache.
+
+import atexit
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+PREDICT_CACHE_SIZE = int(os.getenv("PREDICT_CACHE_SIZE", "1024"))
+PREDICT_COUNT_FLUSH_SECONDS = float(os.getenv("PREDICT_COUNT_FLUSH_SECONDS", "10"))
+
+
+class PredictionCache:
+    """LRU of prediction responses, bounded by entry count."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+
+class PredictionCounts:
+    """
+    Buffered prediction counters. `write(run_counts, subject_counts)` stores a
+    batch (crud.add_prediction_counts); a batch that fails to write is kept
+    for the next flush.
+    """
+
+    def __init__(self, write, flush_seconds):
+        self.write = write
+        self.flush_seconds = flush_seconds
+        self._runs = Counter()
+        self._subjects = Counter()
+        self._since = None
+        self._lock = threading.Lock()
+
+    def add(self, username, subject=None):
+        with self._lock:
+            self._runs[username] += 1
+            if subject:
+                self._subjects[(username, subject)] += 1
+            if self._since is None:
+                self._since = time.monotonic()
+            due = time.monotonic() - self._since >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered counts now."""
+        with self._lock:
+            runs, subjects = self._runs, self._subjects
+            if not runs:
+                return
+            self._runs, self._subjects, self._since = Counter(), Counter(), None
+        try:
+            self.write(dict(runs), dict(subjects))
+        except Exception as e:
+            print(f"Warning: Failed to write prediction counts: {e}")
+            with self._lock:
+                self._runs.update(runs)
+                self._subjects.update(subjects)
+                if self._since is None:
+                    self._since = time.monotonic()
+
+    def pending(self):
+        with self._lock:
+            return sum(self._runs.values())
+
+
+def _write_counts(run_counts, subject_counts):
+    import crud
+    crud.add_prediction_counts(run_counts, subject_counts)
+
+
+prediction_cache = PredictionCache(PREDICT_CACHE_SIZE)
+prediction_counts = PredictionCounts(_write_counts, PREDICT_COUNT_FLUSH_SECONDS)
+atexit.register(prediction_counts.flush)
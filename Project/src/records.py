@@ -0,0 +1,100 @@
+# Grade records
+#
+# GradeRecord is the row type returned by the crud grade queries. It is built
+# straight from a tuple cursor row (no intermediate DictCursor dict) and keeps
+# its fields in __slots__, so a 10k-row gradebook costs a fraction of the
+# memory of one dict per row. It still behaves like the dicts it replaced:
+# record['grade'], record.get('grade'), 'grade' in record and dict(record)
+# all work, as does attribute access (record.grade) in Python and Jinja.
+# to_json() gives the plain dict used for JSON responses.
+
+GRADE_FIELDS = ('id', 'subject', 'category', 'study_time', 'assignment_name',
+                'grade', 'weight', 'is_prediction', 'predicted_grade', 'position')
+
+
+class GradeRecord:
+    """One assessment row; see the module comment for the supported access styles."""
+    __slots__ = GRADE_FIELDS
+
+    def __init__(self, id, subject, category, study_time, assignment_name, grade, weight,
+                 is_prediction=False, predicted_grade=None, position=0):
+        self.id = id
+        self.subject = subject
+        self.category = category
+        self.study_time = study_time
+        self.assignment_name = assignment_name
+        self.grade = grade
+        self.weight = weight
+        self.is_prediction = is_prediction
+        self.predicted_grade = predicted_grade
+        self.position = position
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a tuple in GRADE_COLUMNS order (extra trailing columns are ignored)."""
+        record = cls.__new__(cls)
+        (record.id, record.subject, record.category, record.study_time, record.assignment_name,
+         record.grade, record.weight, is_prediction, record.predicted_grade, record.position) = row[:10]
+        record.is_prediction = bool(is_prediction)
+        return record
+
+    # --- mapping-style access -------------------------------------------------
+
+    def __getitem__(self, key):
+        if key not in GRADE_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in GRADE_FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in GRADE_FIELDS
+
+    def get(self, key, default=None):
+        if key not in GRADE_FIELDS:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return GRADE_FIELDS
+
+    def __iter__(self):
+        return iter(GRADE_FIELDS)
+
+    def __len__(self):
+        return len(GRADE_FIELDS)
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in GRADE_FIELDS]
+
+    # --- serialization --------------------------------------------------------
+
+    def to_json(self):
+        """Plain dict with the same keys the JSON responses always had."""
+        return {
+            'id': self.id,
+            'subject': self.subject,
+            'category': self.category,
+            'study_time': self.study_time,
+            'assignment_name': self.assignment_name,
+            'grade': self.grade,
+            'weight': self.weight,
+            'is_prediction': self.is_prediction,
+            'predicted_grade': self.predicted_grade,
+            'position': self.position,
+        }
+
+    def __eq__(self, other):
+        if isinstance(other, GradeRecord):
+            return self.to_json() == other.to_json()
+        if isinstance(other, dict):
+            return self.to_json() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"GradeRecord({self.to_json()!r})"
@@ -0,0 +1,380 @@
+# Storage backends
+#
+# crud.py (and through it app.py) talks to the database through the backend
+# returned by get_storage(). Each backend wraps one driver module - db.py for
+# MySQL, db_local.py for SQLite - and implements the pieces whose SQL differs
+# between the two: schema introspection, upserts and bulk writes. Everything
+# else in crud.py is portable SQL written with %s placeholders.
+#
+# Select a backend with DB_BACKEND:
+#   mysql   - remote MySQL server (default)
+#   sqlite  - local SQLite file (LOCAL_DB_FILE, default src/local_dev.db)
+#   memory  - shared-cache in-memory SQLite database (tests, benchmarks)
+# USE_LOCAL_DB=true is still honoured and means "sqlite".
+
+import os
+import importlib
+import re
+import sqlite3
+from abc import ABC, abstractmethod
+
+
+class Storage(ABC):
+    """
+    Interface shared by all storage backends.
+
+    Subclasses provide the driver module and the dialect-specific SQL (the
+    abstract methods); callers only use the methods and table names defined here.
+    """
+    name = None
+    driver = None  # name of the driver module (db / db_local)
+
+    # Largest number of ids bound into one IN (...) list
+    MAX_IN_PARAMS = 1000
+
+    def __init__(self):
+        self.module = importlib.import_module(self.driver)
+        self.TABLE_NAME = self.module.TABLE_NAME
+        self.CATEGORIES_TABLE = self.module.CATEGORIES_TABLE
+        self.SUBJECTS_TABLE = self.module.SUBJECTS_TABLE
+        self.USERS_TABLE = self.module.USERS_TABLE
+        self.USER_PREFERENCES_TABLE = self.module.USER_PREFERENCES_TABLE
+        self.GRADES_ARCHIVE_TABLE = self.module.GRADES_ARCHIVE_TABLE
+        self.CATEGORIES_ARCHIVE_TABLE = self.module.CATEGORIES_ARCHIVE_TABLE
+
+    # --- connections & schema -------------------------------------------------
+
+    def connect(self):
+        """Return a DB-API connection (callers close it when done)."""
+        return self.module._connect()
+
+    def init_db(self):
+        """Create tables, run column migrations and seed sample data."""
+        self.module.init_db()
+
+    @abstractmethod
+    def dict_cursor(self, conn):
+        """Cursor whose rows are dicts keyed by column name."""
+
+    @abstractmethod
+    def column_exists(self, conn, table, column):
+        """Whether `table` has a column named `column`."""
+
+    # --- dialect helpers ------------------------------------------------------
+
+    @abstractmethod
+    def excluded(self, column):
+        """Expression for the would-be-inserted value of `column` inside an upsert."""
+
+    @abstractmethod
+    def upsert_sql(self, table, columns, conflict_columns, updates):
+        """
+        INSERT ... that updates the existing row when `conflict_columns` clash.
+
+        `updates` maps column -> SQL expression; use excluded(col) to refer to
+        the value that was being inserted.
+        """
+
+    # --- bulk operations ------------------------------------------------------
+
+    def insert_many(self, cur, table, columns, rows):
+        """Insert many rows with a single executemany call."""
+        if not rows:
+            return 0
+        placeholders = ', '.join(['%s'] * len(columns))
+        cur.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            rows
+        )
+        return cur.rowcount
+
+    def delete_by_ids(self, cur, table, username, ids):
+        """Delete a user's rows by id, binding at most MAX_IN_PARAMS ids per statement."""
+        deleted = 0
+        ids = list(ids)
+        for start in range(0, len(ids), self.MAX_IN_PARAMS):
+            chunk = ids[start:start + self.MAX_IN_PARAMS]
+            placeholders = ','.join(['%s'] * len(chunk))
+            cur.execute(
+                f"DELETE FROM {table} WHERE id IN ({placeholders}) AND username = %s",
+                tuple(chunk) + (username,)
+            )
+            deleted += cur.rowcount
+        return deleted
+
+    @abstractmethod
+    def update_by_id(self, cur, table, username, column, values):
+        """Set `column` per row from (id, value) pairs, for the user's rows in `table`."""
+
+    @abstractmethod
+    def delete_batch(self, cur, table, conditions, params, limit):
+        """Delete at most `limit` rows of `table` matching the AND-ed `conditions`."""
+
+    def update_positions(self, cur, username, ids):
+        """Set Position = 0..n-1 following `ids` for the user's grade rows."""
+        return self.update_by_id(cur, self.TABLE_NAME, username, 'Position',
+                                 [(_id, pos) for pos, _id in enumerate(ids)])
+
+    # --- migrations -----------------------------------------------------------
+
+    # Users renumbered per statement (and commit) by backfill_positions
+    BACKFILL_BATCH_USERS = 200
+
+    def users_needing_positions(self, cur):
+        """
+        Users whose grade Positions need renumbering: any value out of range,
+        or every row still at the column default 0 (the column was just added).
+        """
+        cur.execute(f"""
+            SELECT username FROM {self.TABLE_NAME}
+            GROUP BY username
+            HAVING SUM(CASE WHEN Position NOT BETWEEN 0 AND 1000000 THEN 1 ELSE 0 END) > 0
+                OR (COUNT(*) > 1 AND MIN(Position) = 0 AND MAX(Position) = 0)
+        """)
+        return [row[0] for row in cur.fetchall()]
+
+    def renumber_positions(self, cur, usernames):
+        """
+        Set Position = 0..n-1 in (Position, id) order for each of `usernames`.
+
+        Portable fallback for servers without window functions: read the ids,
+        then one executemany.
+        """
+        placeholders = ','.join(['%s'] * len(usernames))
+        cur.execute(
+            f"""SELECT id, username FROM {self.TABLE_NAME}
+                WHERE username IN ({placeholders})
+                ORDER BY username, Position, id""",
+            tuple(usernames)
+        )
+        next_position = {}
+        updates = []
+        for _id, username in cur.fetchall():
+            pos = next_position.get(username, 0)
+            updates.append((pos, _id))
+            next_position[username] = pos + 1
+        if updates:
+            cur.executemany(f"UPDATE {self.TABLE_NAME} SET Position = %s WHERE id = %s", updates)
+        return len(updates)
+
+    def _ranked_positions(self, placeholders):
+        """Subquery numbering the listed users' rows 0..n-1 per user."""
+        return f"""SELECT id, ROW_NUMBER() OVER (PARTITION BY username ORDER BY Position, id) - 1 AS pos
+                   FROM {self.TABLE_NAME}
+                   WHERE username IN ({placeholders})"""
+
+    def backfill_positions(self, conn, usernames=None, progress=print):
+        """
+        Renumber grade Positions for `usernames` (default: users_needing_positions()).
+
+        Works through BACKFILL_BATCH_USERS users per UPDATE and commits after
+        each batch, so it can run against a live table: only the rows of the
+        batch being renumbered are locked, and only briefly. Returns the
+        number of users renumbered.
+        """
+        cur = conn.cursor()
+        try:
+            if usernames is None:
+                usernames = self.users_needing_positions(cur)
+            usernames = list(usernames)
+            for start in range(0, len(usernames), self.BACKFILL_BATCH_USERS):
+                batch = usernames[start:start + self.BACKFILL_BATCH_USERS]
+                self.renumber_positions(cur, batch)
+                conn.commit()
+                if progress:
+                    progress(f"  Position backfill: {start + len(batch)}/{len(usernames)} users")
+            return len(usernames)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    # --- test support ---------------------------------------------------------
+
+    def begin_test_transaction(self):
+        """Start a per-test transaction, if the backend supports it."""
+
+    def rollback_test_transaction(self):
+        """Undo everything since begin_test_transaction()."""
+
+
+def supports_window_functions(version):
+    """
+    Whether a MySQL VERSION() string is MySQL 8+ or MariaDB 10.2+, the first
+    releases with window functions. MariaDB reports 10.x (possibly behind a
+    "5.5.5-" prefix) with a "-MariaDB" suffix.
+    """
+    mariadb = re.search(r"(\d+)\.(\d+)[\d.]*-MariaDB", version, re.IGNORECASE)
+    if mariadb:
+        return (int(mariadb.group(1)), int(mariadb.group(2))) >= (10, 2)
+    mysql = re.match(r"(\d+)\.", version)
+    return bool(mysql) and int(mysql.group(1)) >= 8
+
+
+class MySQLStorage(Storage):
+    name = 'mysql'
+    driver = 'db'
+
+    def dict_cursor(self, conn):
+        from pymysql.cursors import DictCursor
+        return conn.cursor(DictCursor)
+
+    def column_exists(self, conn, table, column):
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT COUNT(*)
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE()
+                  AND TABLE_NAME = %s
+                  AND COLUMN_NAME = %s
+            """, (table, column))
+            return cur.fetchone()[0] > 0
+        finally:
+            cur.close()
+
+    def excluded(self, column):
+        return f"VALUES({column})"
+
+    def delete_batch(self, cur, table, conditions, params, limit):
+        cur.execute(f"DELETE FROM {table} WHERE {' AND '.join(conditions)} LIMIT %s", (*params, limit))
+        return cur.rowcount
+
+    def _has_window_functions(self, cur):
+        """Whether the server supports ROW_NUMBER() OVER (...) (checked once)."""
+        if not hasattr(self, '_window_functions'):
+            cur.execute("SELECT VERSION()")
+            self._window_functions = supports_window_functions(cur.fetchone()[0])
+        return self._window_functions
+
+    def renumber_positions(self, cur, usernames):
+        if not self._has_window_functions(cur):
+            return super().renumber_positions(cur, usernames)
+        # The derived table is materialized before the update, so it may read the target table
+        placeholders = ','.join(['%s'] * len(usernames))
+        cur.execute(
+            f"""UPDATE {self.TABLE_NAME} AS g
+                JOIN ({self._ranked_positions(placeholders)}) AS r ON g.id = r.id
+                SET g.Position = r.pos""",
+            tuple(usernames)
+        )
+        return cur.rowcount
+
+    def upsert_sql(self, table, columns, conflict_columns, updates):
+        # MySQL resolves the conflict from the table's UNIQUE keys
+        placeholders = ', '.join(['%s'] * len(columns))
+        assignments = ', '.join(f"{col} = {expr}" for col, expr in updates.items())
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON DUPLICATE KEY UPDATE {assignments}")
+
+    def update_by_id(self, cur, table, username, column, values):
+        # One round trip per chunk: UPDATE ... SET col = CASE id WHEN <id> THEN <value> ... END
+        # (PyMySQL's executemany only batches INSERTs; UPDATEs would be one statement per row)
+        updated = 0
+        for start in range(0, len(values), self.MAX_IN_PARAMS):
+            chunk = values[start:start + self.MAX_IN_PARAMS]
+            case_frag = " ".join(["WHEN %s THEN %s"] * len(chunk))
+            in_placeholders = ",".join(["%s"] * len(chunk))
+            params = []
+            for _id, value in chunk:
+                params.extend([_id, value])
+            params.append(username)
+            params.extend(_id for _id, _value in chunk)
+            cur.execute(
+                f"""UPDATE {table}
+                    SET {column} = CASE id {case_frag} END
+                    WHERE username = %s AND id IN ({in_placeholders})""",
+                params
+            )
+            updated += cur.rowcount
+        return updated
+
+
+class SQLiteStorage(Storage):
+    name = 'sqlite'
+    driver = 'db_local'
+
+    def __init__(self, db_file=None):
+        super().__init__()
+        if db_file:
+            self.module.use_database(db_file)
+
+    def dict_cursor(self, conn):
+        return conn.cursor(dictionary=True)
+
+    def column_exists(self, conn, table, column):
+        cur = conn.cursor()
+        try:
+            cur.execute(f"PRAGMA table_info({table})")
+            return any(row[1] == column for row in cur.fetchall())
+        finally:
+            cur.close()
+
+    def excluded(self, column):
+        return f"excluded.{column}"
+
+    def delete_batch(self, cur, table, conditions, params, limit):
+        # DELETE ... LIMIT is a compile-time option in SQLite
+        cur.execute(
+            f"""DELETE FROM {table} WHERE id IN
+                (SELECT id FROM {table} WHERE {' AND '.join(conditions)} LIMIT %s)""",
+            (*params, limit)
+        )
+        return cur.rowcount
+
+    def renumber_positions(self, cur, usernames):
+        # UPDATE ... FROM needs SQLite 3.33
+        if sqlite3.sqlite_version_info < (3, 33, 0):
+            return super().renumber_positions(cur, usernames)
+        placeholders = ','.join(['%s'] * len(usernames))
+        cur.execute(
+            f"""UPDATE {self.TABLE_NAME} SET Position = r.pos
+                FROM ({self._ranked_positions(placeholders)}) AS r
+                WHERE {self.TABLE_NAME}.id = r.id""",
+            tuple(usernames)
+        )
+        return cur.rowcount
+
+    def upsert_sql(self, table, columns, conflict_columns, updates):
+        placeholders = ', '.join(['%s'] * len(columns))
+        assignments = ', '.join(f"{col} = {expr}" for col, expr in updates.items())
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON CONFLICT({', '.join(conflict_columns)}) DO UPDATE SET {assignments}")
+
+    def update_by_id(self, cur, table, username, column, values):
+        # Statements are cheap in-process; executemany over the primary key
+        # avoids a CASE expression with two bound parameters per row
+        cur.executemany(
+            f"UPDATE {table} SET {column} = %s WHERE id = %s AND username = %s",
+            [(value, _id, username) for _id, value in values]
+        )
+        return cur.rowcount
+
+    def begin_test_transaction(self):
+        self.module.begin_test_transaction()
+
+    def rollback_test_transaction(self):
+        self.module.rollback_test_transaction()
+
+
+def backend_name():
+    """Backend selected by the environment (DB_BACKEND, then legacy USE_LOCAL_DB)."""
+    name = os.getenv("DB_BACKEND", "").strip().lower()
+    if name:
+        return name
+    if os.getenv("USE_LOCAL_DB", "").lower() == "true":
+        return 'sqlite'
+    return 'mysql'
+
+
+def get_storage(name=None):
+    """Create the storage backend called `name` (default: from the environment)."""
+    name = name or backend_name()
+    if name == 'mysql':
+        return MySQLStorage()
+    if name == 'sqlite':
+        return SQLiteStorage()
+    if name == 'memory':
+        return SQLiteStorage(db_file=':memory:')
+    raise ValueError(f"Unknown DB_BACKEND '{name}' (expected mysql, sqlite or memory)")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Term rollover
+#
+# Closes a term for a whole cohort at the end of a semester: each user's
+# subjects tagged with the term are retired and their rows moved to the
+# archive tables (crud.close_term, one transaction per user), so the hot
+# tables shrink back every term. On MySQL, users are spread over a process
+# pool; each worker opens its own connections, so a large cohort isn't
+# limited to one connection's round trips. SQLite has a single writer, so
+# there the users run inline unless --processes asks otherwise.
+#
+#   python3 src/term_rollover.py F25                        # every user with open F25 subjects
+#   python3 src/term_rollover.py F25 --users alice bob --processes 4
+#   python3 src/term_rollover.py F25 --no-archive           # retire only
+#
+#   TERM_PROCESSES   default pool size on MySQL (default: CPU count, at most 8)
+#
+# The in-memory backend lives in one process, so it always runs inline.
+
+import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import crud
+
+TERM_PROCESSES = int(os.getenv("TERM_PROCESSES", str(min(8, os.cpu_count() or 1))))
+
+
+def _init_worker(db_file):
+    """Point a worker at the parent's SQLite file (it may have been switched with use_database)."""
+    if db_file:
+        crud.storage.module.use_database(db_file)
+
+
+def _close_term(username, term, archive):
+    return crud.close_term(username, term, archive=archive)
+
+
+def close_term_for_users(term, usernames=None, archive=True, processes=None):
+    """
+    Close `term` for every user in `usernames` (default: every user with open
+    subjects in the term). Returns {username: [subjects retired]}.
+    """
+    if usernames is None:
+        usernames = crud.get_term_users(term)
+    if processes is None:
+        processes = TERM_PROCESSES if crud.storage.name == 'mysql' else 1
+    processes = min(processes, len(usernames))
+    in_memory = getattr(crud.storage.module, 'IN_MEMORY', False)
+    if processes <= 1 or in_memory:
+        return {username: _close_term(username, term, archive) for username in usernames}
+
+    db_file = crud.storage.module.DB_FILE if crud.storage.name == 'sqlite' else None
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(db_file,)) as pool:
+        chunksize = max(1, len(usernames) // (processes * 4))
+        results = pool.map(_close_term, usernames, repeat(term), repeat(archive), chunksize=chunksize)
+        return dict(zip(usernames, results))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retire and archive every subject of a term for a cohort.")
+    parser.add_argument('term', help="Term to close, e.g. F25.")
+    parser.add_argument('--users', nargs='+', help="Only these users (default: everyone with open subjects in the term).")
+    parser.add_argument('--processes', type=int, help=f"Worker processes (default {TERM_PROCESSES} on MySQL, 1 on SQLite).")
+    parser.add_argument('--no-archive', action='store_true', help="Retire the subjects but keep their rows in the hot tables.")
+    args = parser.parse_args(argv)
+
+    results = close_term_for_users(args.term, args.users, archive=not args.no_archive, processes=args.processes)
+    for username, subjects in results.items():
+        print(f"  {username}: {len(subjects)} subject(s) retired")
+    print(f"✓ Closed term {args.term} for {len(results)} user(s), "
+          f"{sum(len(subjects) for subjects in results.values())} subject(s)")
+
+
+if __name__ == "__main__":
+    main()
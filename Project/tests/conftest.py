@@ -0,0 +1,67 @@
+"""
+Shared pytest configuration.
+
+By default the suite runs against a shared-cache in-memory SQLite database
+(DB_BACKEND=memory, see storage.py), so it needs no network access and
+finishes in seconds.
+Every test runs inside a transaction that is rolled back afterwards; data
+created in setup_class is committed as before.
+
+Set TEST_DB=mysql (or sqlite) to run against the MySQL server configured in
+src/.env (or the local SQLite file).
+"""
+
+import os
+import sys
+
+import pytest
+
+os.environ["DB_BACKEND"] = os.getenv("TEST_DB", "memory").lower()
+if os.environ["DB_BACKEND"] != "mysql":
+    # Full-strength pbkdf2 costs ~0.5s per user; the tests create dozens
+    os.environ.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+# A background refresh job's connection can't see the test's uncommitted
+# writes; the tests that cover background refreshes opt in (scratch_db)
+os.environ["PREDICTION_REFRESH"] = "inline"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+
+@pytest.fixture(autouse=True)
+def db_transaction():
+    """Roll back everything a test writes (a no-op on backends without support)."""
+    from crud import storage
+    from prediction_cache import prediction_cache, prediction_counts
+    storage.begin_test_transaction()
+    try:
+        yield
+    finally:
+        # Buffered prediction counts are written into the test's transaction
+        prediction_counts.flush()
+        storage.rollback_test_transaction()
+        # Rolled-back data versions are handed out again with other data
+        prediction_cache.clear()
+
+
+@pytest.fixture
+def scratch_db(tmp_path):
+    """
+    Point the SQLite backend at an empty file for the duration of a test.
+
+    For tests that need real commits (threads, other connections), so they run
+    outside the per-test rollback transaction.
+    """
+    from crud import storage, init_db
+    if storage.name != 'sqlite':
+        pytest.skip("needs the SQLite backend")
+    storage.rollback_test_transaction()
+    previous = storage.module.DB_FILE
+    storage.module.use_database(str(tmp_path / 'scratch.db'))
+    try:
+        init_db()
+        yield
+    finally:
+        # Let background jobs finish against this file before switching back
+        import jobs
+        jobs.wait_all(timeout=30)
+        storage.module.use_database(previous)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test Aggregates - subject/category totals rolled up from crud.get_grade_totals().
+"""
+
+import sys
+import os
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from aggregates import GradeAggregate, Totals
+
+
+def totals(count, graded_count, study_time, graded_weight, weighted_grade):
+    return {'count': count, 'graded_count': graded_count, 'study_time': study_time,
+            'graded_weight': graded_weight, 'weighted_grade': weighted_grade}
+
+
+# crud.get_grade_totals() output for: Math/Homework 2h graded 80 (weight 10)
+# and 1h ungraded, Math/Exam 3h graded 90 (30), Physics/Lab 4h graded 60 (50)
+TOTALS = {
+    ('Math', 'Homework'): totals(2, 1, 3.0, 10.0, 800.0),
+    ('Math', 'Exam'): totals(1, 1, 3.0, 30.0, 2700.0),
+    ('Physics', 'Lab'): totals(1, 1, 4.0, 50.0, 3000.0),
+}
+
+
+class TestGradeAggregate:
+    """Tests for GradeAggregate"""
+
+    def test_agg_001_category_totals(self):
+        """Category groups keep the SQL totals"""
+        homework = GradeAggregate.from_totals(TOTALS).category('Math', 'Homework')
+        assert (homework.count, homework.graded_count) == (2, 1)
+        assert homework.study_time == pytest.approx(3.0)
+        assert homework.graded_weight == pytest.approx(10)
+        assert homework.average_grade == pytest.approx(80)
+
+    def test_agg_002_rollups(self):
+        """Subject and overall totals roll up from the categories"""
+        aggregate = GradeAggregate.from_totals(TOTALS)
+        math = aggregate.subject('Math')
+        assert math.count == 3
+        assert math.study_time == pytest.approx(6.0)
+        assert math.average_grade == pytest.approx((80 * 10 + 90 * 30) / 40)
+        assert aggregate.overall.count == 4
+        assert aggregate.overall.study_time == pytest.approx(10.0)
+
+    def test_agg_003_missing_groups(self):
+        """Unknown subjects/categories give empty totals with no average"""
+        aggregate = GradeAggregate.from_totals(TOTALS)
+        assert aggregate.subject('History').count == 0
+        assert aggregate.category('Math', 'Quiz').average_grade is None
+        assert GradeAggregate.from_totals({}).overall.average_grade is None
+
+    def test_agg_004_totals_objects(self):
+        """Groups, subjects and overall are Totals"""
+        aggregate = GradeAggregate.from_totals(TOTALS)
+        assert isinstance(aggregate.category('Math', 'Exam'), Totals)
+        assert isinstance(aggregate.overall, Totals)
+        assert aggregate.subject('Physics').average_grade == pytest.approx(60)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test ASGI - the async entry point and async CRUD over the aiosqlite stand-in.
+
+The async driver uses its own connections, so like the concurrency tests these
+run on a scratch SQLite file with real commits.
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+pytest.importorskip("asgiref")
+pytest.importorskip("aiosqlite")
+
+import app as app_module
+import asgi
+import async_crud
+import crud
+from crud import create_user, add_subject, add_category, add_grade
+
+PASSWORD = "testpassword123"
+USERNAME = "TEST_ASGI_user"
+
+
+@pytest.fixture
+def gradebook(scratch_db):
+    """A user with two subjects, categories, grades and a preference."""
+    create_user(USERNAME, PASSWORD)
+    for subject in ('Math', 'Physics'):
+        add_subject(USERNAME, subject)
+        add_category(USERNAME, subject, 'Homework', 40, 'HW #')
+        add_category(USERNAME, subject, 'Exam', 60, 'Exam #')
+        for i in range(6):
+            add_grade(USERNAME, subject, 'Homework', 1.5 + i, f'HW {i}', 60 + 5 * i if i < 5 else None, 8)
+    crud.set_grade_lock_preference(USERNAME, 'Math', False)
+    return USERNAME
+
+
+def run(coro):
+    """Run a coroutine on a fresh event loop, closing the async pool afterwards."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await async_crud.close_pool()
+    return asyncio.run(main())
+
+
+def session_cookie(username):
+    client = app_module.app.test_client()
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    return client.get_cookie('session').value
+
+
+async def call(method, path, query=b'', body=b'', cookie=None, headers=()):
+    """Send one HTTP request through the ASGI app; returns (status, headers, body)."""
+    raw_headers = [(name.encode(), value.encode()) for name, value in headers]
+    if cookie:
+        raw_headers.append((b'cookie', f'session={cookie}'.encode()))
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': query, 'root_path': '', 'headers': raw_headers,
+        'client': ('127.0.0.1', 1234), 'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi.application(scope, receive, send)
+    start = messages[0]
+    return (start['status'], {k.decode(): v.decode() for k, v in start['headers']},
+            b''.join(m.get('body', b'') for m in messages[1:]))
+
+
+class TestAsyncCrud:
+    """Async CRUD returns what the sync crud functions return"""
+
+    def test_asgi_001_reads_match_sync(self, gradebook):
+        """Grades, categories, subjects and preferences read the same rows"""
+        async def reads():
+            return (
+                await async_crud.get_grades(gradebook, subject='Math'),
+                await async_crud.get_grades_page(gradebook, 4, sort='grade', descending=True),
+                await async_crud.get_categories_as_dict(gradebook),
+                await async_crud.get_all_subjects(gradebook),
+                await async_crud.get_subject_names(gradebook),
+                await async_crud.get_grade_lock_preferences(gradebook),
+            )
+
+        grades, page, categories, subjects, names, preferences = run(reads())
+        assert grades == crud.get_grades(gradebook, subject='Math')
+        assert page == crud.get_grades_page(gradebook, 4, sort='grade', descending=True)
+        assert categories == crud.get_categories_as_dict(gradebook)
+        assert subjects == crud.get_all_subjects(gradebook)
+        assert names == ['Math', 'Physics']
+        assert preferences == {'Math': False}
+
+    def test_asgi_002_writes(self, gradebook):
+        """Async preference writes are visible to the sync crud functions"""
+        run(async_crud.set_grade_lock_preference(gradebook, 'Math', True))
+        run(async_crud.set_grade_lock_preference(gradebook, 'Physics', False))
+        assert crud.get_grade_lock_preferences(gradebook) == {'Math': True, 'Physics': False}
+
+    def test_asgi_007_backend_must_implement_pool(self):
+        """An async backend missing a pool method can't be instantiated"""
+        from async_storage import AsyncStorage, AsyncSQLiteStorage
+
+        class Incomplete(AsyncStorage):
+            async def _open_pool(self):
+                return None
+
+        with pytest.raises(TypeError, match="connection"):
+            Incomplete()
+        assert isinstance(AsyncSQLiteStorage(), AsyncStorage)
+
+    def test_asgi_008_memory_database_takes_memory_lock(self):
+        """On the in-memory database async statements wait for sync units of work"""
+        import threading
+        import time
+        import db_local
+        if not db_local.IN_MEMORY:
+            pytest.skip("needs the in-memory backend")
+        held, release = threading.Event(), threading.Event()
+
+        def sync_unit_of_work():
+            with db_local._memory_lock:
+                held.set()
+                release.wait(5)
+
+        worker = threading.Thread(target=sync_unit_of_work)
+        worker.start()
+        held.wait(5)
+
+        async def timed_read():
+            started = time.monotonic()
+            asyncio.get_running_loop().call_later(0.2, release.set)
+            row = await async_crud.storage.fetchone("SELECT 1")
+            return row, time.monotonic() - started
+
+        row, waited = run(timed_read())
+        worker.join()
+        assert tuple(row) == (1,)
+        assert waited >= 0.2
+
+
+
+class TestASGIApp:
+    """The ASGI application"""
+
+    def test_asgi_003_native_routes_match_flask(self, gradebook):
+        """Native handlers answer like the Flask routes"""
+        cookie = session_cookie(gradebook)
+        client = app_module.app.test_client()
+        client.post('/login', data={'username': gradebook, 'password': PASSWORD})
+
+        status, headers, body = run(call('GET', '/api/grades', query=b'limit=5&sort=grade', cookie=cookie))
+        assert status == 200
+        assert app_module.app.json.loads(body) == client.get('/api/grades?limit=5&sort=grade').get_json()
+
+        status, _, body = run(call('GET', '/api/grades', query=b'limit=zero', cookie=cookie))
+        assert status == 400
+        assert app_module.app.json.loads(body)['message'] == 'limit must be an integer.'
+
+        status, _, _ = run(call('POST', '/api/grade_lock/set', body=b'{"subject": "Physics", "grade_lock": false}',
+                                cookie=cookie))
+        assert status == 200
+        status, _, body = run(call('GET', '/api/grade_lock/get', cookie=cookie))
+        assert app_module.app.json.loads(body)['preferences'] == {'Math': False, 'Physics': False}
+
+    def test_asgi_004_compression(self, gradebook):
+        """Large native responses are gzip-compressed for clients that accept it"""
+        import gzip
+        cookie = session_cookie(gradebook)
+        status, headers, body = run(call('GET', '/api/grades', cookie=cookie,
+                                         headers=[('accept-encoding', 'gzip')]))
+        assert status == 200
+        assert headers['content-encoding'] == 'gzip'
+        assert len(app_module.app.json.loads(gzip.decompress(body))['grades']) == 12
+
+    def test_asgi_005_falls_back_to_flask(self, gradebook):
+        """Other routes and requests without a session are served by the Flask app"""
+        status, _, _ = run(call('GET', '/login'))
+        assert status == 200
+        status, headers, _ = run(call('GET', '/api/grades'))
+        assert status == 302
+        assert headers['location'].startswith('/login')
+        status, _, _ = run(call('GET', '/api/grades', cookie='forged.cookie.value'))
+        assert status == 302
+
+    def test_asgi_006_concurrent_requests(self, gradebook):
+        """Many in-flight requests on one event loop all succeed"""
+        cookie = session_cookie(gradebook)
+
+        async def many():
+            return await asyncio.gather(*[
+                call('GET', '/api/grades', query=f'limit={n % 12 + 1}'.encode(), cookie=cookie)
+                for n in range(50)
+            ])
+
+        results = run(many())
+        assert [status for status, _, _ in results] == [200] * 50
+        assert [len(app_module.app.json.loads(body)['grades']) for _, _, body in results] == \
+            [n % 12 + 1 for n in range(50)]
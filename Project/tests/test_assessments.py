@@ -16,9 +16,10 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
 from crud import (
     create_user, add_subject, add_category, add_grade, update_grade,
-    delete_grade, delete_grades_bulk, get_all_grades, recalculate_and_update_weights
+    delete_grade, delete_grades_bulk, get_all_grades, recalculate_and_update_weights,
+    get_grades, get_grade_totals, get_grade_by_id, get_grades_by_ids, get_grades_page
 )
-from db import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
+from crud import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
 
 
 class TestAssessmentCreation:
@@ -600,5 +601,116 @@ class TestAssessmentPosition:
         assert names == ["First", "Last"], "Order should be preserved after deletion"
 
 
+
+class TestGradeQueries:
+    """Tests for the SQL-filtered grade queries"""
+
+    @classmethod
+    def setup_class(cls):
+        """Initialize database and create a user with two subjects."""
+        init_db()
+        cls.test_username = "TEST_ASMNT_query_user"
+        create_user(cls.test_username, "testpassword123")
+        add_subject(cls.test_username, "Math")
+        add_subject(cls.test_username, "Physics")
+
+    @classmethod
+    def teardown_class(cls):
+        """Clean up test user and data."""
+        conn = _connect()
+        try:
+            curs = conn.cursor()
+            curs.execute(f"DELETE FROM {TABLE_NAME} WHERE username = %s", (cls.test_username,))
+            curs.execute(f"DELETE FROM {CATEGORIES_TABLE} WHERE username = %s", (cls.test_username,))
+            curs.execute(f"DELETE FROM {SUBJECTS_TABLE} WHERE username = %s", (cls.test_username,))
+            curs.execute(f"DELETE FROM {USERS_TABLE} WHERE username = %s", (cls.test_username,))
+            conn.commit()
+        finally:
+            curs.close()
+            conn.close()
+
+    def teardown_method(self):
+        """Clean up grades after each test."""
+        conn = _connect()
+        try:
+            curs = conn.cursor()
+            curs.execute(f"DELETE FROM {TABLE_NAME} WHERE username = %s", (self.test_username,))
+            conn.commit()
+        finally:
+            curs.close()
+            conn.close()
+
+    def setup_method(self):
+        """Graded, ungraded and prediction rows across two subjects."""
+        u = self.test_username
+        self.hw = add_grade(u, "Math", "Homework", 2.0, "HW 1", 80, 10)
+        self.quiz = add_grade(u, "Math", "Quiz", 1.0, "Quiz 1", 90, 30)
+        self.todo = add_grade(u, "Math", "Homework", 0, "HW 2", None, 10)
+        self.pred = add_grade(u, "Math", "Homework", 3.0, "HW 3", 70, 10, is_prediction=True)
+        self.lab = add_grade(u, "Physics", "Lab", 4.0, "Lab 1", 60, 50)
+
+    def _ids(self, grades):
+        return [g['id'] for g in grades]
+
+    def test_query_subject_and_category(self):
+        """Subject and category filters narrow the rows, keeping display order"""
+        u = self.test_username
+        assert self._ids(get_grades(u, subject="Math")) == [self.hw, self.quiz, self.todo, self.pred]
+        assert self._ids(get_grades(u, subject="Math", category="Homework")) == [self.hw, self.todo, self.pred]
+        assert self._ids(get_grades(u)) == self._ids(get_all_grades(u))
+
+    def test_query_graded_and_predictions(self):
+        """Graded/ungraded, prediction and exclude_id filters"""
+        u = self.test_username
+        assert self._ids(get_grades(u, graded_only=True, include_predictions=False)) == [self.hw, self.quiz, self.lab]
+        assert self._ids(get_grades(u, graded_only=True, exclude_id=self.hw)) == [self.quiz, self.pred, self.lab]
+        assert self._ids(get_grades(u, ungraded_only=True, include_predictions=False)) == [self.todo]
+
+    def test_query_totals(self):
+        """Per-category totals match the rows"""
+        totals = get_grade_totals(self.test_username)
+        homework = totals[("Math", "Homework")]
+        assert homework['count'] == 3
+        assert homework['study_time'] == pytest.approx(5.0)
+        assert homework['graded_weight'] == pytest.approx(20)
+        assert homework['weighted_grade'] == pytest.approx(80 * 10 + 70 * 10)
+        assert totals[("Physics", "Lab")]['count'] == 1
+
+    def test_query_by_id(self):
+        """Point lookups return the row only for its owner"""
+        grade = get_grade_by_id(self.test_username, self.quiz)
+        assert grade['assignment_name'] == "Quiz 1"
+        assert grade['grade'] == 90
+        assert get_grade_by_id("TEST_ASMNT_someone_else", self.quiz) is None
+        assert get_grade_by_id(self.test_username, self.lab + 1000) is None
+
+    def test_query_by_ids(self):
+        """Multi-id lookups skip missing ids and keep display order"""
+        grades = get_grades_by_ids(self.test_username, [self.lab, self.hw, self.lab + 1000, self.hw])
+        assert self._ids(grades) == [self.hw, self.lab]
+        assert get_grades_by_ids(self.test_username, []) == []
+
+    def test_query_pages(self):
+        """Keyset pages walk the rows in order without gaps or repeats"""
+        seen = []
+        after = None
+        while True:
+            page, after = get_grades_page(self.test_username, 2, after=after)
+            seen.extend(self._ids(page))
+            if after is None:
+                break
+        assert seen == self._ids(get_all_grades(self.test_username))
+
+    def test_query_pages_sorted(self):
+        """Pages sorted by grade descending, ungraded rows last"""
+        page, after = get_grades_page(self.test_username, 3, sort='grade', descending=True)
+        assert self._ids(page) == [self.quiz, self.hw, self.pred]
+        page, after = get_grades_page(self.test_username, 3, after=after, sort='grade', descending=True)
+        assert self._ids(page) == [self.lab, self.todo]
+        assert after is None
+        with pytest.raises(ValueError):
+            get_grades_page(self.test_username, 3, sort='password')
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
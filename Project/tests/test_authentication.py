@@ -15,7 +15,7 @@ from dotenv import load_dotenv
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
 from crud import create_user, verify_user, user_exists, add_subject, get_all_subjects, delete_subject, add_grade, get_all_grades
-from db import _connect, init_db, USERS_TABLE
+from crud import _connect, init_db, USERS_TABLE
 
 
 class TestUserRegistration:
@@ -222,7 +222,7 @@ class TestUserIsolation:
     
     def teardown_method(self):
         """Clean up test data after each test."""
-        from db import SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
+        from crud import SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
         conn = _connect()
         try:
             curs = conn.cursor()
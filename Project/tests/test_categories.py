@@ -19,7 +19,7 @@ from crud import (
     get_category_by_id, update_category, delete_category, get_total_weight_for_subject,
     add_grade, get_all_grades, recalculate_and_update_weights, update_assignment_names_for_category
 )
-from db import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
+from crud import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
 
 
 class TestCategoryCreation:
@@ -358,6 +358,44 @@ class TestCategoryUpdate:
         assert "Test 2" in names, "Quiz 2 should become Test 2"
         assert "Test 3" in names, "Quiz 3 should become Test 3"
 
+    def test_update_category_renames_in_same_transaction(self):
+        """update_category(rename_from=...) renames matching assignments only"""
+        category_id = add_category(self.test_username, self.test_subject, "RenameCat", 40, "Quiz # (online)")
+        add_grade(self.test_username, self.test_subject, "RenameCat", 1.0, "Quiz 1 (online)", 80, 10)
+        add_grade(self.test_username, self.test_subject, "RenameCat", 1.0, " quiz 12 (ONLINE) ", 80, 10)
+        add_grade(self.test_username, self.test_subject, "RenameCat", 1.0, "Bonus quiz", 80, 10)
+
+        rows, renamed = update_category(self.test_username, category_id, self.test_subject, "RenameCat", 40,
+                                        "Test #", rename_from="Quiz # (online)")
+
+        assert (rows, renamed) == (1, 2)
+        names = sorted(g['assignment_name'] for g in get_all_grades(self.test_username)
+                       if g['category'] == "RenameCat")
+        assert names == ["Bonus quiz", "Test 1", "Test 12"]
+        assert get_category_by_id(self.test_username, category_id)['default_name'] == "Test #"
+
+    def test_rename_statement_count(self, monkeypatch):
+        """Renaming a 200-quiz category is a couple of statements, not one per row"""
+        import db_local
+        from crud import storage
+        if storage.name != 'sqlite':
+            pytest.skip("counts SQLite statements")
+        category_id = add_category(self.test_username, self.test_subject, "QuizCat", 20, "Quiz #")
+        for i in range(200):
+            add_grade(self.test_username, self.test_subject, "QuizCat", 0.5, f"Quiz {i + 1}", 70, 0.1)
+
+        statements = []
+        for name in ('execute', 'executemany'):
+            original = getattr(db_local.SQLiteCursor, name)
+            monkeypatch.setattr(db_local.SQLiteCursor, name,
+                                lambda cursor, *args, _original=original, _name=name:
+                                statements.append(_name) or _original(cursor, *args))
+
+        rows, renamed = update_category(self.test_username, category_id, self.test_subject, "QuizCat", 20,
+                                        "Check #", rename_from="Quiz #")
+        assert (rows, renamed) == (1, 200)
+        assert statements == ['execute', 'execute', 'executemany']
+
 
 class TestCategoryDeletion:
     """Tests for category deletion functionality"""
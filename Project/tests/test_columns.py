@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test Columns - columnar grade data, group-by helpers and k samples.
+"""
+
+import sys
+import os
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import columns
+from columns import GradeColumns
+from records import GradeRecord
+from app import estimate_k, estimate_k_columns
+
+# Tuple rows in crud.GRADE_COLUMNS order
+ROWS = [
+    (1, 'Math', 'Homework', 2.0, 'HW1', 80, 10.0, 0, 75.0, 0),
+    (2, 'Math', 'Homework', 1.0, 'HW2', None, 10.0, 0, None, 1),
+    (3, 'Math', 'Exam', 3.0, 'Midterm', 90, 30.0, 0, None, 2),
+    (4, 'Physics', 'Lab', 4.0, 'Lab 1', 60, 0.0, 0, 70.0, 3),
+    (5, 'Physics', 'Lab', 5.0, 'Lab 2', 95, 20.0, 1, None, 4),
+]
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    """Run each test with and without the numpy fast path."""
+    if request.param == 'numpy':
+        if columns.np is None:
+            pytest.skip("numpy not installed")
+    else:
+        monkeypatch.setattr(columns, 'np', None)
+    return request.param
+
+
+class TestGradeColumns:
+    """Tests for GradeColumns"""
+
+    def test_columns_001_build(self):
+        """Tuple rows and GradeRecords give the same columns"""
+        from_rows = GradeColumns.from_rows(ROWS)
+        from_records = GradeColumns.from_records([GradeRecord.from_row(row) for row in ROWS])
+        for name in ('ids', 'hours', 'weights', 'is_prediction', 'subject_codes', 'category_codes'):
+            assert getattr(from_rows, name) == getattr(from_records, name)
+        assert from_rows.subjects == ['Math', 'Physics']
+        assert from_rows.categories == [('Math', 'Homework'), ('Math', 'Exam'), ('Physics', 'Lab')]
+        assert len(GradeColumns.from_rows([])) == 0
+
+    def test_columns_002_rows(self, backend):
+        """rows() filters like crud.get_grades"""
+        data = GradeColumns.from_rows(ROWS)
+        ids = lambda rows: [data.ids[i] for i in rows]
+        assert ids(data.rows()) == [1, 2, 3, 4, 5]
+        assert ids(data.rows(subject='Math', category='Homework')) == [1, 2]
+        assert ids(data.rows(graded_only=True, include_predictions=False)) == [1, 3, 4]
+        assert ids(data.rows(subject='History')) == []
+
+    def test_columns_003_group_by(self, backend):
+        """Grouped sums and grade totals per subject and category"""
+        data = GradeColumns.from_rows(ROWS)
+        actual = data.rows(include_predictions=False)
+        assert data.group_sum('hours', actual) == pytest.approx({'Math': 6.0, 'Physics': 4.0})
+        math_grades = data.group_grades(actual)['Math']
+        assert math_grades['count'] == 2
+        assert math_grades['weighted_sum'] / math_grades['weight_sum'] == pytest.approx((800 + 2700) / 40)
+        # Zero weights are left out of the weighted sums
+        lab = data.group_grades(actual, by='category')[('Physics', 'Lab')]
+        assert (lab['count'], lab['grade_sum'], lab['weight_sum']) == (1, 60.0, 0.0)
+
+    def test_columns_004_totals(self, backend):
+        """totals() over the selected rows"""
+        data = GradeColumns.from_rows(ROWS)
+        totals = data.totals(data.rows())
+        assert (totals.count, totals.graded_count) == (5, 4)
+        assert totals.study_time == pytest.approx(15.0)
+        assert totals.average_grade == pytest.approx((800 + 2700 + 0 + 1900) / 60)
+
+    def test_columns_005_k_matches_estimate_k(self, backend):
+        """Column-wise k estimation agrees with estimate_k on the same rows"""
+        data = GradeColumns.from_rows(ROWS)
+        graded = [row for row in ROWS if row[5] is not None]
+        expected = estimate_k([r[3] for r in graded], [r[5] for r in graded], [r[6] / 100 for r in graded], 100)
+        assert estimate_k_columns(data, data.rows(graded_only=True)) == pytest.approx(expected)
+        assert estimate_k_columns(data, data.rows(subject='History')) == 0.3
+
+
+class TestSortedColumn:
+    """Tests for SortedColumn nearest-value lookups"""
+
+    def test_columns_006_nearest_matches_scan(self):
+        """nearest() orders positions like a sort on (distance, position)"""
+        import random
+        rng = random.Random(7)
+        values = [float(rng.randint(0, 20)) / 2 for _ in range(200)]
+        index = columns.SortedColumn(values)
+        for target in [rng.uniform(-2, 12) for _ in range(50)] + [0.0, 5.0, 5.25, 10.0]:
+            expected = sorted(range(len(values)), key=lambda i: (abs(values[i] - target), i))
+            assert index.nearest(target, 10) == expected[:10]
+            assert index.nearest(target)[0] == min(range(len(values)), key=lambda i: abs(values[i] - target))
+            within = [i for i in expected if abs(values[i] - target) < 1.0]
+            assert index.nearest(target, len(values), within=1.0) == within
+
+    def test_columns_007_nearest_edges(self):
+        """Empty columns, short columns and equidistant ties"""
+        assert columns.SortedColumn([]).nearest(3.0, 5) == []
+        assert columns.SortedColumn([4.0, 2.0]).nearest(3.0, 5) == [0, 1]
+        assert columns.SortedColumn([4.0, 2.0, 2.0]).nearest(3.0, 2, within=0.5) == []
+
+
+class TestPredictionPaths:
+    """The prediction code paths, with and without numpy"""
+
+    def test_columns_008_system_predictor_excludes_row(self, backend):
+        """SystemPredictor's exclude_id selections work with the column helpers"""
+        from app import SystemPredictor
+        data = GradeColumns.from_rows(ROWS)
+        graded = GradeColumns.from_rows([row for row in ROWS if row[5] is not None and row[0] != 1])
+        predictor = SystemPredictor(data)
+        # Row 2 is ungraded: an exclude_id history must match one without row 1
+        without_first = SystemPredictor(GradeColumns.from_rows([r for r in ROWS if r[0] != 1]))
+        assert predictor('Math', 'Homework', 2.0, 10.0, exclude_id=1) == \
+            without_first('Math', 'Homework', 2.0, 10.0)
+        assert predictor('Math', 'Homework', 2.0, 10.0) is not None
+        assert estimate_k_columns(data, [2, 3]) == estimate_k_columns(graded, graded.rows()[:2])
+
+    def test_columns_009_helpers_accept_lists(self, backend):
+        """Row selections may be plain lists as well as array('l')"""
+        data = GradeColumns.from_rows(ROWS)
+        rows = [0, 2, 3]
+        fields = lambda t: [getattr(t, name) for name in t.__slots__]
+        assert fields(data.totals(rows)) == pytest.approx(fields(data.totals(columns.array('l', rows))))
+        assert data.group_sum('hours', rows) == data.group_sum('hours', columns.array('l', rows))
+        assert data.k_values(rows) == pytest.approx(data.k_values(columns.array('l', rows)))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test Compression - gzip/brotli negotiation, thresholds, streaming and the ETag cache.
+"""
+
+import sys
+import os
+import gzip
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from flask import Flask, Response, jsonify, send_from_directory
+
+import compression
+from compression import Compressor
+
+BIG = {'rows': [{'id': i, 'name': f'Assignment {i}', 'grade': 80} for i in range(200)]}
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'static')
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['COMPRESS_STREAM_THRESHOLD'] = 50 * 1024
+    Compressor(app)
+
+    @app.route('/big')
+    def big():
+        return jsonify(BIG)
+
+    @app.route('/small')
+    def small():
+        return jsonify({'status': 'ok'})
+
+    @app.route('/huge')
+    def huge():
+        return Response('x' * (200 * 1024), mimetype='text/html')
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'line {i}\n' for i in range(5000)), mimetype='text/plain')
+
+    @app.route('/binary')
+    def binary():
+        return Response(b'\0' * 5000, mimetype='application/octet-stream')
+
+    @app.route('/file/<path:name>')
+    def file(name):
+        return send_from_directory(STATIC_DIR, name)
+
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class TestCompression:
+    """Tests for the Compressor after_request hook"""
+
+    def test_compress_001_gzip_json(self, client):
+        """Large JSON is gzipped when the client accepts it"""
+        response = client.get('/big', headers=GZIP)
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(response.get_data()) == client.get('/big').get_data()
+
+    def test_compress_002_not_accepted(self, client):
+        """No Accept-Encoding (or q=0) means an uncompressed body"""
+        assert 'Content-Encoding' not in client.get('/big').headers
+        response = client.get('/big', headers={'Accept-Encoding': 'gzip;q=0'})
+        assert 'Content-Encoding' not in response.headers
+
+    def test_compress_003_threshold_and_allowlist(self, client):
+        """Small bodies and non-allowlisted types are left alone"""
+        assert 'Content-Encoding' not in client.get('/small', headers=GZIP).headers
+        assert 'Content-Encoding' not in client.get('/binary', headers=GZIP).headers
+
+    def test_compress_004_streaming(self, client):
+        """Generator bodies and bodies over the stream threshold are compressed in chunks"""
+        for path in ('/stream', '/huge'):
+            response = client.get(path, headers=GZIP)
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'Content-Length' not in response.headers
+            plain = client.get(path).get_data()
+            assert gzip.decompress(response.get_data()) == plain
+
+    def test_compress_005_etag_cache(self, app, client):
+        """Static files with an ETag are compressed once, then served from the cache"""
+        cache = app.extensions['compression'].cache
+        name = next(n for n in sorted(os.listdir(os.path.join(STATIC_DIR, 'css'))) if n.endswith('.css'))
+        first = client.get(f'/file/css/{name}', headers=GZIP)
+        second = client.get(f'/file/css/{name}', headers=GZIP)
+        first.close()
+        second.close()
+        assert first.headers['Content-Encoding'] == 'gzip'
+        assert second.get_data() == first.get_data()
+        assert (cache.misses, cache.hits) == (1, 1)
+        # The compressed representation carries a weak validator that still revalidates
+        assert first.headers['ETag'].startswith('W/')
+        revalidated = client.get(f'/file/css/{name}', headers={**GZIP, 'If-None-Match': first.headers['ETag']})
+        revalidated.close()
+        assert revalidated.status_code == 304
+
+    def test_compress_006_cache_bounded(self):
+        """The body cache evicts least recently used entries past its byte budget"""
+        cache = compression.CompressedBodyCache(10)
+        cache.put(('a', 'gzip'), b'12345')
+        cache.put(('b', 'gzip'), b'12345')
+        cache.get(('a', 'gzip'))
+        cache.put(('c', 'gzip'), b'12345')
+        assert cache.get(('b', 'gzip')) is None
+        assert cache.get(('a', 'gzip')) == b'12345'
+        assert cache.size == 10
+
+    @pytest.mark.skipif(compression.brotli is None, reason="brotli not installed")
+    def test_compress_007_brotli_preferred(self, client):
+        """brotli wins over gzip when both are accepted"""
+        response = client.get('/big', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert compression.brotli.decompress(response.get_data()) == client.get('/big').get_data()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Test Concurrency - concurrent requests through the Flask test client.
+
+Simulates a threaded worker (gunicorn gthread): several threads send requests
+at the same time, each with its own test client and database connection.
+These tests need real commits visible across threads, so they run outside the
+per-test rollback transaction, on a scratch SQLite file where they write
+through the routes.
+"""
+
+import sys
+import os
+import time
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import app as app_module
+import crud
+import jobs
+from crud import storage, create_user, add_subject, add_category, get_all_grades
+
+THREADS = 8
+REQUESTS_PER_THREAD = 5
+PASSWORD = "testpassword123"
+
+
+def make_user(username, subject='Math'):
+    create_user(username, PASSWORD)
+    add_subject(username, subject)
+    add_category(username, subject, 'Homework', 100, 'HW #')
+
+
+def logged_in_client(username):
+    client = app_module.app.test_client()
+    response = client.post('/login', data={'username': username, 'password': PASSWORD})
+    assert response.status_code in (200, 302)
+    return client
+
+
+def run_threads(fn):
+    """Call fn(n) on THREADS threads released together; return the results."""
+    barrier = threading.Barrier(THREADS)
+
+    def start(n):
+        barrier.wait()
+        return fn(n)
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        return list(pool.map(start, range(THREADS)))
+
+
+class TestConcurrentRequests:
+    """Stress tests for threaded workers"""
+
+    def test_concurrency_001_schema_init_once(self, monkeypatch):
+        """Concurrent first requests run the schema bootstrap exactly once"""
+        calls = []
+
+        def slow_init_db():
+            calls.append(threading.get_ident())
+            time.sleep(0.05)
+
+        monkeypatch.setattr(app_module, 'init_db', slow_init_db)
+        monkeypatch.setattr(app_module, '_schema_initialized', False)
+        statuses = run_threads(lambda n: app_module.app.test_client().get('/login').status_code)
+        assert len(calls) == 1
+        assert statuses == [200] * THREADS
+
+    def test_concurrency_002_concurrent_adds(self, scratch_db):
+        """Concurrent adds for one user keep every row with a distinct position"""
+        username = "TEST_CONC_adds"
+        make_user(username)
+
+        def add_rows(n):
+            client = logged_in_client(username)
+            return [
+                client.post('/add', data={
+                    'subject': 'Math', 'category': 'Homework', 'assignment_name': f'HW {n}-{i}',
+                    'study_time': '2', 'grade': '80', 'current_filter': 'Math',
+                }).status_code
+                for i in range(REQUESTS_PER_THREAD)
+            ]
+
+        statuses = run_threads(add_rows)
+        assert all(status == 200 for thread in statuses for status in thread)
+        grades = get_all_grades(username)
+        assert len(grades) == THREADS * REQUESTS_PER_THREAD
+        assert sorted(g['position'] for g in grades) == list(range(len(grades)))
+
+    def test_concurrency_003_mixed_users(self, scratch_db):
+        """Readers and writers for different users don't see each other's rows or fail"""
+        usernames = [f"TEST_CONC_user{n}" for n in range(THREADS)]
+        for username in usernames:
+            make_user(username)
+
+        def session(n):
+            username = usernames[n]
+            client = logged_in_client(username)
+            statuses = []
+            for i in range(REQUESTS_PER_THREAD):
+                statuses.append(client.post('/add', data={
+                    'subject': 'Math', 'category': 'Homework', 'assignment_name': f'HW {i}',
+                    'study_time': str(1 + i), 'grade': str(70 + i), 'current_filter': 'Math',
+                }).status_code)
+                statuses.append(client.get('/subject/Math').status_code)
+                statuses.append(client.post('/predict', data={
+                    'subject': 'Math', 'category': 'Homework', 'weight': '10', 'hours': '3',
+                }).status_code)
+                statuses.append(client.get('/api/grades?limit=2').status_code)
+            return statuses, len(client.get('/api/grades?limit=100').get_json()['grades'])
+
+        results = run_threads(session)
+        for statuses, visible_rows in results:
+            assert all(status == 200 for status in statuses)
+            assert visible_rows == REQUESTS_PER_THREAD
+        for username in usernames:
+            assert len(get_all_grades(username)) == REQUESTS_PER_THREAD
+
+    def test_concurrency_004_memory_backend_writers(self):
+        """Concurrent writers on the in-memory database wait for each other instead of failing"""
+        if storage.name != 'sqlite' or not storage.module.IN_MEMORY:
+            pytest.skip("in-memory SQLite backend only")
+        storage.rollback_test_transaction()
+        crud.init_db()
+        username = "TEST_CONC_memory"
+
+        def add_rows(n):
+            return [crud.add_grade(username, 'Math', 'Homework', 1.0, f'HW {n}-{i}', 80, 1)
+                    for i in range(REQUESTS_PER_THREAD)]
+
+        try:
+            ids = [grade_id for thread in run_threads(add_rows) for grade_id in thread]
+            assert len(set(ids)) == THREADS * REQUESTS_PER_THREAD
+            positions = sorted(g['position'] for g in get_all_grades(username))
+            assert positions == list(range(THREADS * REQUESTS_PER_THREAD))
+        finally:
+            conn = crud._connect()
+            try:
+                curs = conn.cursor()
+                curs.execute(f"DELETE FROM {crud.TABLE_NAME} WHERE username = %s", (username,))
+                conn.commit()
+            finally:
+                conn.close()
+
+
+class TestBackgroundSubjectDelete:
+    """Subject deletes handed to a background job"""
+
+    def test_concurrency_005_background_subject_delete(self, scratch_db, monkeypatch):
+        """The route hides the subject at once and the job deletes it in batches"""
+        monkeypatch.setattr(crud, 'DELETE_BATCH_SIZE', 7)
+        username = "TEST_CONC_delete"
+        make_user(username)
+        add_subject(username, 'Physics')
+        for i in range(30):
+            crud.add_grade(username, 'Math', 'Homework', 1.0, f'HW {i}', 80, 1)
+        crud.add_grade(username, 'Physics', 'Lab', 1.0, 'Lab 1', 90, 10)
+        client = logged_in_client(username)
+
+        response = client.post('/delete_subject', data={'subject_name': 'Math'})
+        assert response.status_code == 200
+        job_id = response.get_json()['job_id']
+        assert crud.get_subject_names(username) == ['Physics']
+
+        assert jobs.get_job(job_id).wait(timeout=10) == 1
+        status = client.get(f'/api/jobs/{job_id}').get_json()['job']
+        assert (status['status'], status['done'], status['total']) == ('done', 30, 30)
+        assert [g['subject'] for g in get_all_grades(username)] == ['Physics']
+        # Other users can't see the job
+        make_user("TEST_CONC_other")
+        assert logged_in_client("TEST_CONC_other").get(f'/api/jobs/{job_id}').status_code == 404
+
+    def test_concurrency_006_resume_interrupted_delete(self, scratch_db):
+        """Deletes left pending by a restart are picked up again"""
+        username = "TEST_CONC_resume"
+        make_user(username)
+        for i in range(3):
+            crud.add_grade(username, 'Math', 'Homework', 1.0, f'HW {i}', 80, 1)
+        crud._hide_subject(username, crud.get_all_subjects(username)[0]['id'])
+
+        resumed = crud.resume_subject_deletes()
+        assert [job.wait(timeout=10) for job in resumed] == [1]
+        assert get_all_grades(username) == []
+        assert crud.resume_subject_deletes() == []
+
+    def test_concurrency_009_recreate_subject_during_delete(self, scratch_db):
+        """A deleted subject's name can be added again before its job has run"""
+        username = "TEST_CONC_recreate"
+        make_user(username)
+        crud.add_grade(username, 'Math', 'Homework', 1.0, 'Old', 60, 10)
+        crud._hide_subject(username, crud.get_all_subjects(username)[0]['id'])
+        client = logged_in_client(username)
+
+        response = client.post('/add_subject', data={'subject_name': 'Math'})
+        assert response.status_code == 200
+        new_id = crud.add_grade(username, 'Math', 'Homework', 1.0, 'New', 90, 10)
+        assert [job.wait(timeout=10) for job in crud.resume_subject_deletes()] == [1]
+        assert [g['id'] for g in get_all_grades(username)] == [new_id]
+        assert crud.get_subject_names(username) == ['Math']
+
+    def test_concurrency_010_inline_subject_delete(self, scratch_db, monkeypatch):
+        """With JOB_MODE=inline (serverless) the delete has finished when the route returns"""
+        monkeypatch.setattr(jobs, 'JOB_MODE', 'inline')
+        monkeypatch.setattr(crud, 'DELETE_BATCH_SIZE', 2)
+        username = "TEST_CONC_inline_delete"
+        make_user(username)
+        for i in range(5):
+            crud.add_grade(username, 'Math', 'Homework', 1.0, f'HW {i}', 80, 1)
+        client = logged_in_client(username)
+
+        response = client.post('/delete_subject', data={'subject_name': 'Math'})
+        assert response.status_code == 200
+        status = client.get(f"/api/jobs/{response.get_json()['job_id']}").get_json()['job']
+        assert (status['status'], status['done'], status['total']) == ('done', 5, 5)
+        assert get_all_grades(username) == []
+        assert crud.resume_subject_deletes() == []
+
+
+class TestTermRollover:
+    """Closing a term for a cohort on a process pool"""
+
+    def test_concurrency_007_close_term_for_cohort(self, scratch_db):
+        """Worker processes close every user's term against the same database file"""
+        import term_rollover
+        usernames = [f"TEST_CONC_term_{n}" for n in range(4)]
+        for username in usernames:
+            create_user(username, PASSWORD)
+            for subject in ('Math', 'Physics'):
+                add_subject(username, subject, term='F25')
+                crud.add_grade(username, subject, 'Exam', 2.0, 'Final', 85, 50)
+            add_subject(username, 'Art', term='W26')
+            crud.add_grade(username, 'Art', 'Project', 1.0, 'Sketch', 90, 10)
+
+        assert crud.get_term_users('F25') == sorted(usernames)
+        results = term_rollover.close_term_for_users('F25', processes=2)
+        assert results == {username: ['Math', 'Physics'] for username in sorted(usernames)}
+        for username in usernames:
+            assert [g['subject'] for g in get_all_grades(username)] == ['Art']
+            assert len(crud.get_grades(username, include_archived=True)) == 3
+        assert crud.get_term_users('F25') == []
+
+
+class TestBacktest:
+    """Backtesting predictions on a process pool"""
+
+    def test_concurrency_008_backtest_on_process_pool(self, scratch_db):
+        """Worker processes replay users from the same database file as the inline run"""
+        import backtest
+        usernames = [f"TEST_CONC_backtest_{n}" for n in range(3)]
+        for n, username in enumerate(usernames):
+            create_user(username, PASSWORD)
+            for i in range(6):
+                crud.add_grade(username, 'Math', 'Homework', 1.0 + i, f'HW {i}', 60 + 5 * i + n, 10)
+        settings = [(5, 5, 0.2), (3, 3, 0.0)]
+
+        inline = backtest.backtest(settings, usernames, processes=1)
+        pooled = backtest.backtest(settings, usernames, processes=2)
+        assert pooled.keys() == inline.keys()
+        for key in inline:
+            assert pooled[key] == pytest.approx(inline[key])
+        assert sum(inline[key][0] for key in inline if key[0] == settings[0]) == 3 * 5
+
+    def test_concurrency_011_backtest_leaves_snapshot_untouched(self, scratch_db, tmp_path, capsys):
+        """The CLI opens the snapshot read-only: no -wal/-shm files, same bytes"""
+        import sqlite3
+        import backtest
+        username = "TEST_CONC_snapshot"
+        create_user(username, PASSWORD)
+        for i in range(6):
+            crud.add_grade(username, 'Math', 'Homework', 1.0 + i, f'HW {i}', 60 + 5 * i, 10)
+        snapshot_dir = tmp_path / 'snapshot'
+        snapshot_dir.mkdir()
+        snapshot = snapshot_dir / 'snapshot.db'
+        target = sqlite3.connect(snapshot)
+        sqlite3.connect(storage.module.DB_FILE).backup(target)
+        target.execute("PRAGMA journal_mode=DELETE")
+        target.close()
+        before = snapshot.read_bytes()
+
+        backtest.main([str(snapshot), '--users', username, '--processes', '2'])
+        assert 'Backtested 1 setting(s)' in capsys.readouterr().out
+        # Checked while this thread's connection to the snapshot is still open
+        assert sorted(p.name for p in snapshot_dir.iterdir()) == ['snapshot.db']
+        assert snapshot.read_bytes() == before
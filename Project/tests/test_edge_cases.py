@@ -19,7 +19,7 @@ from crud import (
     create_user, add_subject, add_category, add_grade, update_grade,
     delete_grade, get_all_grades, get_total_weight_for_subject
 )
-from db import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
+from crud import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
 
 
 class TestBoundaryConditions:
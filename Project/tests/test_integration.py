@@ -20,7 +20,7 @@ from crud import (
     get_all_grades, recalculate_and_update_weights, get_subject_by_name,
     rename_subject
 )
-from db import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
+from crud import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
 
 
 class TestFullUserJourney:
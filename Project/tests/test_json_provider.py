@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test JSON Provider - the orjson-backed provider must match Flask's stdlib provider.
+"""
+
+import sys
+import os
+import datetime
+import decimal
+import json
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import json_provider
+from json_provider import FastJSONProvider
+
+PAYLOAD = {
+    'status': 'success',
+    'updated_assignments': [
+        {'id': 2, 'subject': 'Math', 'grade': None, 'weight': 12.5, 'is_prediction': False},
+        {'id': 1, 'subject': 'Français', 'grade': 91.25, 'weight': 10, 'is_prediction': True},
+    ],
+    'summary': {'total_hours': 3.5, 'average_grade': 91.25},
+    'created_at': datetime.datetime(2024, 9, 1, 12, 30),
+    'total': decimal.Decimal('12.50'),
+}
+
+requires_orjson = pytest.mark.skipif(json_provider.orjson is None, reason="orjson not installed")
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+
+@pytest.fixture
+def providers(app):
+    # Providers hold a weak reference to the app; the app fixture keeps it alive
+    return app.json, DefaultJSONProvider(app)
+
+
+class TestFastJSONProvider:
+    """Tests for FastJSONProvider"""
+
+    def test_json_001_same_document(self, providers):
+        """Serializes to the same JSON document as the stdlib provider"""
+        fast, default = providers
+        assert json.loads(fast.dumps(PAYLOAD)) == json.loads(default.dumps(PAYLOAD))
+
+    @requires_orjson
+    def test_json_002_sorted_keys(self, providers):
+        """Keys are sorted like Flask's default"""
+        fast, _ = providers
+        assert fast.dumps({'b': 1, 'a': 2}) == '{"a":2,"b":1}'
+
+    def test_json_003_response(self, providers):
+        """response() builds a JSON response with the same body"""
+        fast, default = providers
+        body = fast.response(PAYLOAD).get_data()
+        assert body.endswith(b"\n")
+        assert json.loads(body) == json.loads(default.dumps(PAYLOAD))
+
+    def test_json_004_stdlib_fallbacks(self, providers):
+        """Values and options orjson cannot handle go through the stdlib"""
+        fast, _ = providers
+        assert fast.dumps({'n': 2 ** 70}) == '{"n": 1180591620717411303424}'
+        assert fast.dumps([1, 2], indent=2) == '[\n  1,\n  2\n]'
+        assert fast.loads('{"x": NaN}')['x'] != fast.loads('{"x": NaN}')['x']
+        assert fast.loads(b'{"a": [1, 2]}') == {'a': [1, 2]}
+
+    def test_json_005_disabled(self, monkeypatch):
+        """JSON_SERIALIZER=stdlib turns orjson off"""
+        monkeypatch.setenv("JSON_SERIALIZER", "stdlib")
+        assert FastJSONProvider(Flask(__name__)).use_orjson is False
+        monkeypatch.setattr(json_provider, "orjson", None)
+        monkeypatch.delenv("JSON_SERIALIZER")
+        assert FastJSONProvider(Flask(__name__)).use_orjson is False
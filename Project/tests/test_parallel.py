@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Test Parallel - concurrent page data fetches.
+"""
+
+import sys
+import os
+import time
+import threading
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import parallel
+from parallel import fetch_all
+
+
+class TestFetchAll:
+    """Tests for fetch_all"""
+
+    def test_parallel_001_sequential_when_disabled(self, monkeypatch):
+        """Disabled: every call runs in the calling thread"""
+        monkeypatch.setattr(parallel, 'ENABLED', False)
+        caller = threading.get_ident()
+        results = fetch_all(a=threading.get_ident, b=threading.get_ident)
+        assert results == {'a': caller, 'b': caller}
+
+    def test_parallel_002_concurrent_when_enabled(self, monkeypatch):
+        """Enabled: slow calls overlap, so the total is about the slowest one"""
+        monkeypatch.setattr(parallel, 'ENABLED', True)
+
+        def slow(value):
+            time.sleep(0.1)
+            return value
+
+        started = time.perf_counter()
+        results = fetch_all(**{name: (lambda v=name: slow(v)) for name in ('a', 'b', 'c', 'd')})
+        elapsed = time.perf_counter() - started
+        assert results == {'a': 'a', 'b': 'b', 'c': 'c', 'd': 'd'}
+        assert elapsed < 0.3
+
+    def test_parallel_003_exceptions_propagate(self, monkeypatch):
+        """A failing call raises in the caller"""
+        monkeypatch.setattr(parallel, 'ENABLED', True)
+
+        def fail():
+            raise ValueError("query failed")
+
+        with pytest.raises(ValueError, match="query failed"):
+            fetch_all(ok=lambda: 1, bad=fail)
@@ -21,7 +21,7 @@ from app import estimate_k, predict_grade, required_hours, calculate_system_pred
 from crud import (
     create_user, add_subject, add_category, add_grade, get_all_grades
 )
-from db import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
+from crud import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
 
 
 class TestEstimateK:
@@ -499,6 +499,340 @@ class TestPredictionAccuracy:
         assert mae is not None, "Should be able to calculate MAE"
         assert mae < 10, "MAE should be reasonable (< 10)"
 
+    def _client(self):
+        import app as app_module
+        client = app_module.app.test_client()
+        client.post('/login', data={'username': self.test_username, 'password': self.password})
+        return client
+
+    def _add_history(self):
+        for hours, grade in ((2.0, 70), (4.0, 85), (6.0, 92)):
+            add_grade(self.test_username, self.test_subject, self.test_category,
+                      hours, f"H{hours}", grade, 20)
+
+    def _stored(self, name):
+        return [g for g in get_all_grades(self.test_username) if g['assignment_name'] == name][0]
+
+    def test_prediction_snapshot_kept_when_grade_entered(self, monkeypatch):
+        """An assessment's prediction is stored at /add and kept when its grade is entered"""
+        import app as app_module
+        self._add_history()
+        client = self._client()
+        client.post('/add', data={'subject': self.test_subject, 'category': self.test_category,
+                                  'assignment_name': "Upcoming", 'study_time': '3'})
+        row = self._stored("Upcoming")
+        expected = calculate_system_prediction(self.test_username, self.test_subject, self.test_category,
+                                               3.0, row['weight'])
+        assert row['grade'] is None and row['predicted_grade'] == expected
+
+        # Entering the grade writes the row only - nothing is predicted again
+        def no_predictions(columns):
+            raise AssertionError("prediction recomputed")
+        monkeypatch.setattr(app_module, 'SystemPredictor', no_predictions)
+        response = client.post(f"/update/{row['id']}", data={
+            'subject': self.test_subject, 'category': self.test_category,
+            'assignment_name': "Upcoming", 'study_time': '3', 'grade': '88'})
+        assert response.get_json()['status'] == 'success'
+        row = self._stored("Upcoming")
+        assert (row['grade'], row['predicted_grade']) == (88, expected)
+
+    def test_grade_entry_skips_refresh_of_other_assessments(self, monkeypatch):
+        """With another upcoming assessment, entering a grade still predicts nothing inline"""
+        import app as app_module
+        self._add_history()
+        client = self._client()
+        for name, hours in (("Upcoming", '3'), ("Later", '5')):
+            client.post('/add', data={'subject': self.test_subject, 'category': self.test_category,
+                                      'assignment_name': name, 'study_time': hours})
+        later = self._stored("Later")['predicted_grade']
+        assert later is not None
+
+        def no_refresh(*args, **kwargs):
+            raise AssertionError("predictions refreshed")
+        monkeypatch.setattr(app_module, 'refresh_system_predictions', no_refresh)
+        row = self._stored("Upcoming")
+        response = client.post(f"/update/{row['id']}", data={
+            'subject': self.test_subject, 'category': self.test_category,
+            'assignment_name': "Upcoming", 'study_time': '3', 'grade': '88'})
+        assert response.get_json()['status'] == 'success'
+        assert self._stored("Upcoming")['grade'] == 88
+        assert self._stored("Later")['predicted_grade'] == later
+
+    def test_prediction_for_graded_add_excludes_own_grade(self):
+        """A graded /add stores the prediction made without its own grade"""
+        self._add_history()
+        self._client().post('/add', data={'subject': self.test_subject, 'category': self.test_category,
+                                          'assignment_name': "Done", 'study_time': '5', 'grade': '60'})
+        row = self._stored("Done")
+        assert row['predicted_grade'] == calculate_system_prediction(
+            self.test_username, self.test_subject, self.test_category, 5.0, row['weight'], exclude_id=row['id'])
+        assert row['predicted_grade'] is not None
+
+    def test_prediction_refreshed_when_inputs_change(self):
+        """Changing an ungraded assessment's study time refreshes its stored prediction"""
+        self._add_history()
+        client = self._client()
+        client.post('/add', data={'subject': self.test_subject, 'category': self.test_category,
+                                  'assignment_name': "Upcoming", 'study_time': '1'})
+        row = self._stored("Upcoming")
+        before = row['predicted_grade']
+        client.post(f"/update/{row['id']}", data={
+            'subject': self.test_subject, 'category': self.test_category,
+            'assignment_name': "Upcoming", 'study_time': '8', 'grade': '95'})
+        row = self._stored("Upcoming")
+        assert row['predicted_grade'] == calculate_system_prediction(
+            self.test_username, self.test_subject, self.test_category, 8.0, row['weight'], exclude_id=row['id'])
+        assert row['predicted_grade'] != before
+
+    def test_graded_rows_not_backfilled(self):
+        """A graded row without a stored prediction never gets one from later grades"""
+        client = self._client()
+        client.post('/add', data={'subject': self.test_subject, 'category': self.test_category,
+                                  'assignment_name': "A1", 'study_time': '3', 'grade': '60'})
+        assert self._stored("A1")['predicted_grade'] is None  # no history to predict from
+        client.post('/add', data={'subject': self.test_subject, 'category': self.test_category,
+                                  'assignment_name': "A2", 'study_time': '3', 'grade': '98'})
+        row = self._stored("A1")
+        client.post(f"/update/{row['id']}", data={
+            'subject': self.test_subject, 'category': self.test_category,
+            'assignment_name': "A1 renamed", 'study_time': '3', 'grade': '60'})
+        assert self._stored("A1 renamed")['predicted_grade'] is None
+
+    def test_predict_lists_similar_assessments(self):
+        """/predict returns the closest past assessments, as does SystemPredictor.similar"""
+        import app as app_module
+        self._add_history()
+        client = self._client()
+        form = {'subject': self.test_subject, 'category': self.test_category, 'weight': '20'}
+        response = client.post('/predict', data=dict(form, hours='4.5')).get_json()
+        assert [a['study_time'] for a in response['similar_assessments']] == [4.0, 6.0]
+        assert response['similar_example'].startswith("Previously: 4.0h")
+
+        response = client.post('/predict', data=dict(form, target_grade='88')).get_json()
+        assert [a['grade'] for a in response['similar_assessments']] == [85, 92]
+
+        predictor = app_module.SystemPredictor(app_module.get_grade_columns(self.test_username, graded_only=True))
+        assert [a['study_time'] for a in predictor.similar(self.test_subject, self.test_category, 4.5)] == [4.0, 6.0]
+        assert predictor.confidence(self.test_subject, self.test_category, 4.5, 20) == 45
+
+
+class TestBackgroundPredictionRefresh:
+    """Stored predictions refreshed on a background job"""
+
+    def test_background_refresh(self, scratch_db, monkeypatch):
+        """/add schedules a job that stores the new assessment's prediction"""
+        import app as app_module
+        import jobs
+        monkeypatch.setattr(app_module, 'PREDICTION_REFRESH', 'background')
+        username = "TEST_PRED_background"
+        create_user(username, "testpassword123")
+        add_subject(username, "Math")
+        add_category(username, "Math", "Homework", 100)
+        for hours, grade in ((2.0, 70), (4.0, 85)):
+            add_grade(username, "Math", "Homework", hours, f"H{hours}", grade, 20)
+        client = app_module.app.test_client()
+        client.post('/login', data={'username': username, 'password': "testpassword123"})
+
+        client.post('/add', data={'subject': "Math", 'category': "Homework",
+                                  'assignment_name': "Upcoming", 'study_time': '3'})
+        jobs.wait_all(timeout=10)
+        row = [g for g in get_all_grades(username) if g['assignment_name'] == "Upcoming"][0]
+        assert row['predicted_grade'] == calculate_system_prediction(username, "Math", "Homework", 3.0, row['weight'])
+        assert row['predicted_grade'] is not None
+
+    def test_refresh_without_persistent_worker(self, scratch_db, monkeypatch):
+        """With JOB_MODE=inline (serverless) the refresh has run when /add returns"""
+        import app as app_module
+        import jobs
+        monkeypatch.setattr(app_module, 'PREDICTION_REFRESH', 'background')
+        monkeypatch.setattr(jobs, 'JOB_MODE', 'inline')
+        username = "TEST_PRED_serverless"
+        create_user(username, "testpassword123")
+        add_subject(username, "Math")
+        add_category(username, "Math", "Homework", 100)
+        for hours, grade in ((2.0, 70), (4.0, 85)):
+            add_grade(username, "Math", "Homework", hours, f"H{hours}", grade, 20)
+        client = app_module.app.test_client()
+        client.post('/login', data={'username': username, 'password': "testpassword123"})
+
+        client.post('/add', data={'subject': "Math", 'category': "Homework",
+                                  'assignment_name': "Upcoming", 'study_time': '3'})
+        row = [g for g in get_all_grades(username) if g['assignment_name'] == "Upcoming"][0]
+        assert row['predicted_grade'] == calculate_system_prediction(username, "Math", "Homework", 3.0, row['weight'])
+
+
+class TestPredictionCache:
+    """Cached /predict responses"""
+
+    def _client(self, username):
+        import app as app_module
+        create_user(username, "testpassword123")
+        add_subject(username, "Math")
+        add_category(username, "Math", "Homework", 100)
+        for hours, grade in ((2.0, 70), (4.0, 85), (6.0, 92)):
+            add_grade(username, "Math", "Homework", hours, f"H{hours}", grade, 20)
+        client = app_module.app.test_client()
+        client.post('/login', data={'username': username, 'password': "testpassword123"})
+        return client
+
+    def test_repeat_prediction_served_from_cache(self):
+        """The same inputs hit the cache until a grade changes"""
+        client = self._client("TEST_PRED_cache_user")
+        form = {'subject': "Math", 'category': "Homework", 'weight': '20', 'hours': '3'}
+        first = client.post('/predict', data=form)
+        assert first.headers['X-Prediction-Cache'] == 'miss'
+        second = client.post('/predict', data=dict(form, hours='3.0'))
+        assert second.headers['X-Prediction-Cache'] == 'hit'
+        assert second.get_json() == first.get_json()
+        assert client.post('/predict', data=dict(form, hours='4')).headers['X-Prediction-Cache'] == 'miss'
+
+        # A new grade bumps the data version, so the old entry is not used
+        add_grade("TEST_PRED_cache_user", "Math", "Homework", 3.0, "H3", 40, 20)
+        third = client.post('/predict', data=form)
+        assert third.headers['X-Prediction-Cache'] == 'miss'
+        assert third.get_json()['predicted_grade'] != first.get_json()['predicted_grade']
+
+        stats = client.get('/api/predict_cache').get_json()['cache']
+        assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 3, 0.25)
+
+    def test_grade_writes_bump_data_version(self):
+        """Every write to a user's grade rows changes their data version"""
+        import crud
+        username = "TEST_PRED_version_user"
+        self._client(username)
+        grade_id = add_grade(username, "Math", "Homework", 1.0, "V1", 50, 20)
+        writes = [
+            lambda: crud.update_grade(username, grade_id, "Math", "Homework", 2.0, "V1", 55, 20),
+            lambda: crud.recalculate_and_update_weights(username, "Math", "Homework"),
+            lambda: crud.rename_subject(username, "Math", "Maths"),
+            lambda: crud.retire_subject(username, "Maths", archive=True),
+            lambda: crud.unretire_subject(username, "Maths"),
+            lambda: crud.delete_grade(username, grade_id),
+        ]
+        versions = [crud.get_data_version(username)]
+        for write in writes:
+            write()
+            versions.append(crud.get_data_version(username))
+        assert versions == sorted(set(versions))
+
+    def test_cache_hit_runs_no_extra_queries(self):
+        """A hit only runs the session's user lookup: no version read, no counter writes"""
+        import app as app_module
+        from crud import storage
+        if storage.name != 'sqlite':
+            pytest.skip("traces statements on the SQLite connection")
+        client = self._client("TEST_PRED_cache_queries")
+        form = {'subject': "Math", 'category': "Homework", 'weight': '20', 'hours': '3'}
+        client.post('/predict', data=form)
+
+        conn = storage.module._thread_connection()
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            response = client.post('/predict', data=form)
+        finally:
+            conn.set_trace_callback(None)
+        assert response.headers['X-Prediction-Cache'] == 'hit'
+        queries = [sql for sql in statements if not sql.startswith(('SAVEPOINT', 'RELEASE', 'ROLLBACK TO'))]
+        assert len(queries) == 1 and queries[0].startswith("SELECT id, username")
+
+    def test_prediction_counts_are_buffered(self, monkeypatch):
+        """Counts are written in a batch, and before the stats page reads them"""
+        import app as app_module
+        from prediction_cache import prediction_counts
+        from crud import get_prediction_run_count, get_subject_prediction_counts
+        monkeypatch.setattr(prediction_counts, 'flush_seconds', 3600)
+        username = "TEST_PRED_counts_user"
+        client = self._client(username)
+        form = {'subject': "Math", 'category': "Homework", 'weight': '20', 'hours': '3'}
+        for _ in range(3):
+            client.post('/predict', data=form)
+        assert get_prediction_run_count(username) == 0
+        assert prediction_counts.pending() == 3
+
+        stats = app_module.calculate_stats(username)
+        assert stats['predictions']['total'] == 3
+        assert stats['predictions']['top_subject'] == {'subject': "Math", 'count': 3}
+        assert get_subject_prediction_counts(username) == {"Math": 3}
+        assert prediction_counts.pending() == 0
+
+    def test_prediction_counts_kept_when_write_fails(self):
+        """A batch that fails to write is retried with the next flush"""
+        from prediction_cache import PredictionCounts
+        written = []
+
+        def write(runs, subjects):
+            if not written:
+                written.append(None)
+                raise RuntimeError("database is locked")
+            written.append((runs, subjects))
+
+        counts = PredictionCounts(write, flush_seconds=3600)
+        counts.add("alice", "Math")
+        counts.add("alice")
+        counts.flush()
+        assert counts.pending() == 2
+        counts.add("bob", "Math")
+        counts.flush()
+        assert written[1] == ({"alice": 2, "bob": 1}, {("alice", "Math"): 1, ("bob", "Math"): 1})
+        assert counts.pending() == 0
+
+    def test_cache_is_bounded_lru(self):
+        """The least recently used entry is evicted first"""
+        from prediction_cache import PredictionCache
+        cache = PredictionCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+        assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+        assert cache.stats()['entries'] == 2
+
+
+class TestBacktest:
+    """Replaying a user's history (backtest.py)"""
+
+    def test_backtest_replays_history_in_order(self):
+        """Each assessment is predicted from the earlier ones, as SystemPredictor would"""
+        import backtest
+        from app import SystemPredictor, SUBJECT_THRESHOLD, CATEGORY_THRESHOLD, K_TRIM_FRACTION
+        from columns import GradeColumns
+        from crud import get_graded_users
+        username = "TEST_PRED_backtest_user"
+        create_user(username, "testpassword123")
+        history = [("Math", "Homework", 2.0, 70, 10), ("Math", "Homework", 4.0, 85, 10),
+                   ("Math", "Exam", 6.0, 80, 30), ("Physics", "Lab", 3.0, 90, 5),
+                   ("Math", "Homework", 3.0, 78, 10), ("Math", "Homework", 0.0, 50, 10),
+                   ("Math", "Exam", 5.0, 72, 30)]
+        for n, (subject, category, hours, grade, weight) in enumerate(history):
+            add_grade(username, subject, category, hours, f"A{n}", grade, weight)
+        add_grade(username, "Math", "Homework", 2.0, "Upcoming", None, 10)
+        assert username in get_graded_users()
+
+        current = (SUBJECT_THRESHOLD, CATEGORY_THRESHOLD, K_TRIM_FRACTION)
+        other = (3, 3, 0.0)
+        results = backtest.backtest_user(username, [current, other])
+
+        errors = []
+        for n, (subject, category, hours, grade, weight) in enumerate(history):
+            earlier = GradeColumns(range(n), [h[0] for h in history[:n]], [h[1] for h in history[:n]],
+                                   [h[2] for h in history[:n]], [h[3] for h in history[:n]],
+                                   [h[4] for h in history[:n]])
+            predicted = SystemPredictor(earlier)(subject, category, hours, weight)
+            if predicted is not None:
+                errors.append(predicted - grade)
+        count = sum(results[key][0] for key in results if key[0] == current)
+        abs_sum = sum(results[key][1] for key in results if key[0] == current)
+        # The first assessment has no history and the 0-hour one isn't predicted
+        assert count == len(errors) == 5
+        assert abs_sum / count == pytest.approx(sum(map(abs, errors)) / len(errors), abs=0.01)
+        assert sum(results[key][0] for key in results if key[0] == other) == 5
+
+        rows = backtest.summarize(backtest.backtest([current, other], usernames=[username]), [current, other])
+        assert {row['setting'] for row in rows} == {current, other}
+        assert rows[0]['mae'] <= rows[1]['mae']
+        assert sum(scope['count'] for scope in rows[0]['scopes'].values()) == 5
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
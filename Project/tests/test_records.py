@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test Records - GradeRecord access styles and JSON serialization.
+"""
+
+import sys
+import os
+import json
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from flask import Flask, render_template_string
+
+from records import GradeRecord, GRADE_FIELDS
+from json_provider import FastJSONProvider
+
+ROW = (7, 'Math', 'Exam', 2.5, 'Midterm', 88, 30.0, 0, None, 3)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+
+class TestGradeRecord:
+    """Tests for GradeRecord"""
+
+    def test_record_001_from_row(self):
+        """Tuple rows map onto the fields; IsPrediction becomes a bool"""
+        record = GradeRecord.from_row(ROW + ('sort key',))
+        assert record.id == 7
+        assert record.assignment_name == 'Midterm'
+        assert record.is_prediction is False
+        assert not hasattr(record, '__dict__')
+
+    def test_record_002_mapping_access(self):
+        """Records still support the dict-style access app.py uses"""
+        record = GradeRecord.from_row(ROW)
+        assert record['grade'] == 88
+        assert record.get('predicted_grade') is None
+        assert record.get('missing', 'x') == 'x'
+        assert 'subject' in record and 'Subject' not in record
+        assert dict(record) == record.to_json()
+        with pytest.raises(KeyError):
+            record['Subject']
+        record['grade'] = 90
+        assert record.grade == 90
+
+    def test_record_003_equality(self):
+        """Records compare equal to each other and to the equivalent dict"""
+        record = GradeRecord.from_row(ROW)
+        assert record == GradeRecord.from_row(ROW)
+        assert record == dict(zip(GRADE_FIELDS, ROW[:7] + (False, None, 3)))
+
+    @pytest.mark.parametrize('serializer', ['orjson', 'stdlib'])
+    def test_record_004_json(self, app, serializer):
+        """jsonify and the tojson filter serialize records through to_json()"""
+        app.json.use_orjson = app.json.use_orjson and serializer == 'orjson'
+        record = GradeRecord.from_row(ROW)
+        with app.test_request_context():
+            body = json.loads(app.json.response([record]).get_data())
+            rendered = render_template_string('{{ rows|tojson }}', rows=[record])
+        assert body == [record.to_json()]
+        assert json.loads(rendered) == [record.to_json()]
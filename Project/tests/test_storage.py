@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Test Storage - backend selection and the bulk/upsert helpers crud.py relies on.
+"""
+
+import sys
+import os
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from storage import get_storage, backend_name
+from crud import (storage, init_db, create_user, add_subject, add_grade, get_all_grades,
+                  delete_grades_bulk, reorder_grades, set_grade_lock_preference,
+                  get_grade_lock_preferences, get_grade_lock_for_subject,
+                  increment_subject_prediction_count, get_subject_prediction_counts,
+                  get_user_by_id, get_user_by_username)
+
+USERNAME = "TEST_STORAGE_user"
+OTHER_USERNAME = "TEST_STORAGE_other"
+
+
+class TestBackendSelection:
+    """Tests for choosing a backend from the environment."""
+
+    def test_storage_001_db_backend_wins(self, monkeypatch):
+        """DB_BACKEND takes precedence over USE_LOCAL_DB"""
+        monkeypatch.setenv("DB_BACKEND", "Memory")
+        monkeypatch.setenv("USE_LOCAL_DB", "false")
+        assert backend_name() == "memory"
+
+    def test_storage_002_legacy_switch(self, monkeypatch):
+        """USE_LOCAL_DB=true still selects SQLite"""
+        monkeypatch.delenv("DB_BACKEND", raising=False)
+        monkeypatch.setenv("USE_LOCAL_DB", "true")
+        assert backend_name() == "sqlite"
+
+    def test_storage_003_unknown_backend(self):
+        """Unknown backend names are rejected"""
+        with pytest.raises(ValueError):
+            get_storage("oracle")
+
+    def test_storage_010_backend_must_implement_dialect(self):
+        """A backend missing a dialect method can't be instantiated"""
+        from storage import Storage, SQLiteStorage
+
+        class Incomplete(Storage):
+            driver = "db_local"
+
+        with pytest.raises(TypeError, match="delete_batch"):
+            Incomplete()
+        assert isinstance(SQLiteStorage(), Storage)
+
+    @pytest.mark.parametrize("version, expected", [
+        ("8.0.36", True), ("8.4.0-commercial", True), ("5.7.44-log", False),
+        ("10.1.48-MariaDB", False), ("10.2.44-MariaDB-log", True), ("11.4.2-MariaDB", True),
+        ("5.5.5-10.1.48-MariaDB-0ubuntu0.18.04.1", False), ("5.5.5-10.6.16-MariaDB", True),
+    ])
+    def test_storage_011_window_function_versions(self, version, expected):
+        """MySQL 8+ and MariaDB 10.2+ get the window-function renumbering"""
+        from storage import supports_window_functions
+        assert supports_window_functions(version) is expected
+
+
+class TestMemoryLock:
+    """Units of work on the in-memory database run one at a time"""
+
+    @staticmethod
+    def _in_thread(fn):
+        """Run fn() on a new thread; returns its result or exception (None if it hangs)."""
+        import threading
+        result = []
+
+        def target():
+            try:
+                result.append(fn())
+            except Exception as e:
+                result.append(e)
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+        return result[0] if result else None
+
+    def _other_unit_of_work(self):
+        with storage.connect() as conn:
+            curs = conn.cursor()
+            curs.execute("SELECT 1")
+            return curs.fetchone()[0]
+
+    def test_storage_012_leaked_connection_does_not_block(self):
+        """A unit of work dropped without close() releases the lock"""
+        if not getattr(storage.module, 'IN_MEMORY', False):
+            pytest.skip("needs the in-memory backend")
+
+        def leak():
+            conn = storage.connect()
+            conn.cursor().execute("SELECT 1")
+            return 'leaked'
+
+        assert self._in_thread(leak) == 'leaked'
+        assert self._in_thread(self._other_unit_of_work) == 1
+
+    def test_storage_013_lock_wait_times_out(self, monkeypatch):
+        """Waiting on a unit of work that never ends fails like a locked database"""
+        import sqlite3
+        import threading
+        if not getattr(storage.module, 'IN_MEMORY', False):
+            pytest.skip("needs the in-memory backend")
+        monkeypatch.setattr(storage.module, 'BUSY_TIMEOUT', 0.1)
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with storage.connect():
+                held.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        held.wait(5)
+        try:
+            assert isinstance(self._in_thread(self._other_unit_of_work), sqlite3.OperationalError)
+        finally:
+            release.set()
+            holder.join()
+        assert self._in_thread(self._other_unit_of_work) == 1
+
+
+class TestBulkOperations:
+    """Tests for the chunked and dialect-specific storage operations."""
+
+    @classmethod
+    def setup_class(cls):
+        init_db()
+
+    def setup_method(self):
+        create_user(USERNAME, "password123")
+        add_subject(USERNAME, "Math")
+        self.ids = [
+            add_grade(USERNAME, "Math", "Homework", 1, f"HW {i}", 80, 1)
+            for i in range(5)
+        ]
+
+    def teardown_method(self):
+        """Clean up the users' rows (backends without a test transaction keep them)."""
+        from crud import (_connect, TABLE_NAME, CATEGORIES_TABLE, SUBJECTS_TABLE, USERS_TABLE,
+                          USER_PREFERENCES_TABLE)
+        conn = _connect()
+        try:
+            curs = conn.cursor()
+            for table in (TABLE_NAME, CATEGORIES_TABLE, SUBJECTS_TABLE, USER_PREFERENCES_TABLE, USERS_TABLE):
+                curs.execute(f"DELETE FROM {table} WHERE username IN (%s, %s)", (USERNAME, OTHER_USERNAME))
+            conn.commit()
+        finally:
+            curs.close()
+            conn.close()
+
+    def test_storage_004_delete_in_chunks(self, monkeypatch):
+        """Bulk delete splits long id lists across statements"""
+        monkeypatch.setattr(storage, "MAX_IN_PARAMS", 2)
+        assert delete_grades_bulk(USERNAME, self.ids[:3]) == 3
+        assert [g['id'] for g in get_all_grades(USERNAME)] == self.ids[3:]
+
+    def test_storage_005_reorder(self):
+        """Reordering writes Position 0..n-1 in the given order"""
+        order = list(reversed(self.ids))
+        assert reorder_grades(USERNAME, order) == len(order)
+        assert [g['id'] for g in get_all_grades(USERNAME)] == order
+
+    def test_storage_006_reorder_foreign_ids(self):
+        """Reordering rejects ids the user does not own"""
+        with pytest.raises(ValueError):
+            reorder_grades(USERNAME, self.ids + [max(self.ids) + 1000])
+
+    def test_storage_007_upserts(self):
+        """Preference upserts insert once and then update in place"""
+        assert get_grade_lock_for_subject(USERNAME, "Math") is True
+        set_grade_lock_preference(USERNAME, "Math", False)
+        set_grade_lock_preference(USERNAME, "Math", False)
+        increment_subject_prediction_count(USERNAME, "Math")
+        increment_subject_prediction_count(USERNAME, "Math")
+        assert get_grade_lock_preferences(USERNAME) == {"Math": False}
+        assert get_subject_prediction_counts(USERNAME) == {"Math": 2}
+
+    def test_storage_008_user_lookups(self):
+        """Users can be looked up by id and by username"""
+        user = get_user_by_username(USERNAME)
+        assert user['username'] == USERNAME
+        assert get_user_by_id(user['id']) == user
+        assert get_user_by_username("TEST_STORAGE_missing") is None
+
+    @pytest.mark.parametrize("set_based", [True, False])
+    def test_storage_009_backfill_positions(self, monkeypatch, capsys, set_based):
+        """Position backfill renumbers unset/out-of-range users in batches"""
+        from crud import ensure_schema, _connect, TABLE_NAME
+        from storage import Storage
+        if not set_based:
+            monkeypatch.setattr(storage, "renumber_positions",
+                                lambda cur, usernames: Storage.renumber_positions(storage, cur, usernames))
+        monkeypatch.setattr(storage, "BACKFILL_BATCH_USERS", 1)
+        other = OTHER_USERNAME
+        create_user(other, "password123")
+        other_ids = [add_grade(other, "Math", "Homework", 1, f"HW {i}", 80, 1) for i in range(3)]
+        conn = _connect()
+        try:
+            curs = conn.cursor()
+            # USERNAME: column default everywhere; other: out of range, in reverse id order
+            curs.execute(f"UPDATE {TABLE_NAME} SET Position = 0 WHERE username = %s", (USERNAME,))
+            for pos, _id in zip((-5, 2000000, -7), other_ids):
+                curs.execute(f"UPDATE {TABLE_NAME} SET Position = %s WHERE id = %s", (pos, _id))
+            conn.commit()
+            assert set(storage.users_needing_positions(curs)) >= {USERNAME, other}
+        finally:
+            curs.close()
+            conn.close()
+
+        capsys.readouterr()
+        ensure_schema()
+        messages = capsys.readouterr().out.splitlines()
+
+        assert [(g['id'], g['position']) for g in get_all_grades(USERNAME)] == list(zip(self.ids, range(5)))
+        assert [g['id'] for g in get_all_grades(other)] == [other_ids[2], other_ids[0], other_ids[1]]
+        assert sorted(g['position'] for g in get_all_grades(other)) == [0, 1, 2]
+        assert len(messages) >= 2 and messages[-1].endswith(f"{len(messages)}/{len(messages)} users")
@@ -19,7 +19,7 @@ from crud import (
     delete_subject, rename_subject, get_retired_subjects,
     add_category, add_grade, get_all_grades, get_all_categories
 )
-from db import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
+from crud import _connect, init_db, USERS_TABLE, SUBJECTS_TABLE, TABLE_NAME, CATEGORIES_TABLE
 
 
 class TestSubjectCreation:
@@ -321,6 +321,65 @@ class TestSubjectDeletion:
         
         assert rows_deleted == 0, "Should return 0 for non-existent subject"
 
+    def test_subj_delete_in_batches(self, monkeypatch):
+        """Assignments are deleted in bounded batches with progress reports"""
+        import crud
+        monkeypatch.setattr(crud, "DELETE_BATCH_SIZE", 2)
+        subject_id = add_subject(self.test_username, "BatchSubject")
+        add_category(self.test_username, "BatchSubject", "Homework", 100)
+        for i in range(5):
+            add_grade(self.test_username, "BatchSubject", "Homework", 1.0, f"HW {i}", 80, 20)
+        add_subject(self.test_username, "KeptSubject")
+        kept_id = add_grade(self.test_username, "KeptSubject", "Homework", 1.0, "HW", 80, 20)
+
+        reports = []
+        assert delete_subject(self.test_username, subject_id, progress=lambda done, total: reports.append((done, total))) == 1
+        assert reports == [(2, 5), (4, 5), (5, 5)]
+        assert [g['id'] for g in get_all_grades(self.test_username)] == [kept_id]
+        assert get_all_categories(self.test_username, "BatchSubject") == []
+
+    def test_subj_hidden_while_deleting(self):
+        """A subject marked for deletion is hidden from every subject list"""
+        from crud import _hide_subject, get_subject_names, DELETED_SUBJECT_PREFIX
+        subject_id = add_subject(self.test_username, "HiddenSubject")
+        assert _hide_subject(self.test_username, subject_id) == f"{DELETED_SUBJECT_PREFIX}{subject_id}"
+        assert get_subject_by_name(self.test_username, "HiddenSubject") is None
+        assert "HiddenSubject" not in get_subject_names(self.test_username)
+        assert all(s['name'] != "HiddenSubject" for s in get_all_subjects(self.test_username, include_retired=True))
+        assert _hide_subject(self.test_username, 999999) is None
+
+    def test_subj_hidden_grades_not_listed(self):
+        """The assignments and categories of a subject being deleted disappear with it"""
+        from crud import _hide_subject, get_grade_totals
+        subject_id = add_subject(self.test_username, "HiddenGrades")
+        add_category(self.test_username, "HiddenGrades", "Homework", 100)
+        add_grade(self.test_username, "HiddenGrades", "Homework", 1.0, "HW", 80, 20)
+        _hide_subject(self.test_username, subject_id)
+
+        assert get_all_grades(self.test_username) == []
+        assert get_grade_totals(self.test_username) == {}
+        assert get_all_categories(self.test_username) == []
+
+    def test_subj_recreate_while_deleting(self):
+        """A subject can be re-created while its delete is pending; the purge leaves the new one alone"""
+        from crud import _hide_subject, _purge_subject
+        subject_id = add_subject(self.test_username, "Recreated")
+        add_category(self.test_username, "Recreated", "Homework", 100)
+        for i in range(3):
+            add_grade(self.test_username, "Recreated", "Homework", 1.0, f"Old {i}", 60, 20)
+        hidden_name = _hide_subject(self.test_username, subject_id)
+
+        new_id = add_subject(self.test_username, "Recreated")
+        assert get_subject_by_name(self.test_username, "Recreated")['id'] == new_id
+        add_category(self.test_username, "Recreated", "Homework", 100)
+        new_grade = add_grade(self.test_username, "Recreated", "Homework", 1.0, "New", 90, 20)
+        assert [g['id'] for g in get_all_grades(self.test_username)] == [new_grade]
+
+        assert _purge_subject(self.test_username, subject_id, hidden_name) == 1
+        assert get_subject_by_name(self.test_username, "Recreated")['id'] == new_id
+        assert [g['id'] for g in get_all_grades(self.test_username)] == [new_grade]
+        assert len(get_all_categories(self.test_username, "Recreated")) == 1
+
 
 class TestSubjectRename:
     """Tests for subject rename functionality (SUBJ-011 to SUBJ-012)"""
@@ -556,6 +615,103 @@ class TestSubjectRetire:
         categories = get_all_categories(self.test_username, subject_name)
         assert len(categories) > 0, "Category data should be preserved"
 
+    def test_retire_subject_to_archive(self):
+        """Archiving moves a retired subject's rows out of the hot tables; unretire restores them"""
+        from crud import retire_subject, unretire_subject, get_grades, get_grade_totals, get_categories_as_dict
+        add_subject(self.test_username, "ArchivedSubject")
+        add_category(self.test_username, "ArchivedSubject", "Exams", 100)
+        ids = [add_grade(self.test_username, "ArchivedSubject", "Exams", 2.0, f"Exam {i}", 70 + i, 50)
+               for i in range(2)]
+        add_subject(self.test_username, "ActiveSubject")
+        active_id = add_grade(self.test_username, "ActiveSubject", "Labs", 1.0, "Lab", 90, 10)
+
+        assert retire_subject(self.test_username, "ArchivedSubject", archive=True)
+        retired = get_retired_subjects(self.test_username)
+        assert [(s['name'], s['is_archived']) for s in retired] == [("ArchivedSubject", True)]
+        assert [g['id'] for g in get_all_grades(self.test_username)] == [active_id]
+        assert get_all_categories(self.test_username, "ArchivedSubject") == []
+
+        # Read paths that need the rows opt in
+        archived = get_grades(self.test_username, subject="ArchivedSubject", include_archived=True)
+        assert [g['id'] for g in archived] == ids
+        assert get_grade_totals(self.test_username, include_archived=True)[("ArchivedSubject", "Exams")]['count'] == 2
+        assert ("ArchivedSubject", "Exams") not in get_grade_totals(self.test_username)
+        assert get_categories_as_dict(self.test_username, include_archived=True)["ArchivedSubject"][0]['name'] == "Exams"
+
+        assert unretire_subject(self.test_username, "ArchivedSubject")
+        assert [g['id'] for g in get_grades(self.test_username, subject="ArchivedSubject")] == ids
+        assert len(get_all_categories(self.test_username, "ArchivedSubject")) == 1
+        assert get_grades(self.test_username, include_archived=True) == get_all_grades(self.test_username)
+        assert not get_all_subjects(self.test_username)[0]['is_archived']
+        assert not unretire_subject(self.test_username, "NoSuchSubject")
+
+    def test_archived_subject_rename_and_delete(self):
+        """Renaming and deleting an archived subject cover its archived rows"""
+        from crud import retire_subject, get_grades
+        subject_id = add_subject(self.test_username, "OldArchive")
+        add_category(self.test_username, "OldArchive", "Essays", 100)
+        add_grade(self.test_username, "OldArchive", "Essays", 3.0, "Essay", 88, 100)
+        retire_subject(self.test_username, "OldArchive", archive=True)
+
+        rename_subject(self.test_username, "OldArchive", "NewArchive")
+        assert [g['subject'] for g in get_grades(self.test_username, include_archived=True)] == ["NewArchive"]
+        assert get_all_categories(self.test_username, "NewArchive", include_archived=True)[0]['name'] == "Essays"
+
+        reports = []
+        assert delete_subject(self.test_username, subject_id, progress=lambda done, total: reports.append((done, total))) == 1
+        assert reports == [(1, 1)]
+        assert get_grades(self.test_username, include_archived=True) == []
+        assert get_all_categories(self.test_username, include_archived=True) == []
+
+    def test_archived_subject_pages(self):
+        """The retire route archives on request; the subject page and stats still show the rows"""
+        import app as app_module
+        add_subject(self.test_username, "PageArchive")
+        add_category(self.test_username, "PageArchive", "Quizzes", 100)
+        add_grade(self.test_username, "PageArchive", "Quizzes", 1.5, "Archived Quiz", 91, 100)
+        client = app_module.app.test_client()
+        client.post('/login', data={'username': self.test_username, 'password': self.password})
+
+        response = client.post('/retire_subject', data={'subject_name': "PageArchive", 'archive': 'true'})
+        assert response.get_json()['status'] == 'success'
+        assert get_retired_subjects(self.test_username)[0]['is_archived']
+        assert get_all_grades(self.test_username) == []
+
+        assert b"Archived Quiz" in client.get('/subject/PageArchive').data
+        stats = app_module.calculate_stats(self.test_username)
+        assert stats['overall']['assignment_count'] == 1
+
+    def test_close_term(self):
+        """Closing a term retires and archives all of its subjects at once"""
+        from crud import close_term, set_subject_term, get_grades
+        for name in ("Calculus", "Physics"):
+            add_subject(self.test_username, name, term="F25")
+            add_category(self.test_username, name, "Exams", 100)
+            add_grade(self.test_username, name, "Exams", 2.0, f"{name} Final", 80, 100)
+        add_subject(self.test_username, "Ethics")
+        ethics_id = add_grade(self.test_username, "Ethics", "Essays", 1.0, "Essay", 75, 20)
+        assert set_subject_term(self.test_username, "Ethics", "W26")
+
+        assert close_term(self.test_username, "F25") == ["Calculus", "Physics"]
+        assert [s['name'] for s in get_all_subjects(self.test_username)] == ["Ethics"]
+        assert all(s['is_archived'] and s['term'] == "F25" for s in get_retired_subjects(self.test_username))
+        assert [g['id'] for g in get_all_grades(self.test_username)] == [ethics_id]
+        assert len(get_grades(self.test_username, include_archived=True)) == 3
+        assert close_term(self.test_username, "F25") == []
+
+    def test_close_term_route(self):
+        """/close_term closes the logged-in user's term"""
+        import app as app_module
+        client = app_module.app.test_client()
+        client.post('/login', data={'username': self.test_username, 'password': self.password})
+        assert client.post('/add_subject', data={'subject_name': "Algebra", 'term': "S25"}).get_json()['status'] == 'success'
+        assert get_subject_by_name(self.test_username, "Algebra") is not None
+        assert client.post('/close_term', data={}).status_code == 400
+
+        response = client.post('/close_term', data={'term': "S25", 'archive': 'false'}).get_json()
+        assert response['subjects'] == ["Algebra"]
+        assert [(s['name'], s['is_archived']) for s in get_retired_subjects(self.test_username)] == [("Algebra", False)]
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])